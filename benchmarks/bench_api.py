@@ -0,0 +1,77 @@
+"""
+API latency under concurrent load, against a real server on a fake Resolve
+
+Each round has ``CLIENTS`` keep-alive clients make ``REQUESTS`` requests each,
+all at once. Per-request p50/p95 are recorded alongside the round timings.
+
+Usage:
+    pytest benchmarks/bench_api.py
+"""
+
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+CLIENTS = 16
+REQUESTS = 25
+
+
+@pytest.fixture(scope="module")
+def server():
+    import uvicorn
+    from rex.app.api import app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    while not server.started:
+        time.sleep(0.01)
+
+    yield f"http://127.0.0.1:{port}"
+
+    server.should_exit = True
+    thread.join()
+
+
+def load(url: str) -> list:
+    """Latencies of every request, in ms"""
+
+    def client(_):
+        timings = []
+        with requests.Session() as session:
+            for _ in range(REQUESTS):
+                start = time.perf_counter()
+                session.get(url).raise_for_status()
+                timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    with ThreadPoolExecutor(CLIENTS) as pool:
+        return [x for timings in pool.map(client, range(CLIENTS)) for x in timings]
+
+
+@pytest.mark.parametrize(
+    "route", ["/", "/info", "/projects", "/backups", "/jobs", "/metrics"]
+)
+def test_latency(benchmark, server, route):
+
+    latencies = []
+    benchmark.pedantic(
+        lambda: latencies.extend(load(server + route)), rounds=3, warmup_rounds=1
+    )
+
+    latencies.sort()
+    benchmark.extra_info["requests"] = len(latencies)
+    benchmark.extra_info["p50_ms"] = round(statistics.median(latencies), 2)
+    benchmark.extra_info["p95_ms"] = round(latencies[int(len(latencies) * 0.95)], 2)
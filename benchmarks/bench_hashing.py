@@ -0,0 +1,80 @@
+"""
+Checksum throughput: the legacy 4096-byte md5 loop vs the hashing engine
+
+Usage:
+    python benchmarks/bench_hashing.py [--size-mb 256] [--files 8]
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from rex.app import hashing
+
+
+def legacy_md5(filepath):
+    hash_md5 = hashlib.md5()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(4096), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def throughput(label, total_bytes, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {total_bytes / elapsed / 1024 ** 2:>10.1f} MB/s")
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--files", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(tmp_dir, f"backup_{i}.drp")
+            with open(path, "wb") as f:
+                for _ in range(args.size_mb // args.files or 1):
+                    f.write(os.urandom(1024 * 1024))
+            paths.append(path)
+
+        one_file = os.path.getsize(paths[0])
+        all_files = sum(os.path.getsize(x) for x in paths)
+
+        throughput("legacy md5 (4KiB reads)", one_file, lambda: legacy_md5(paths[0]))
+
+        for algorithm in hashing.ALGORITHMS:
+            throughput(
+                f"engine {algorithm}",
+                one_file,
+                lambda: hashing.hash_file(paths[0], (algorithm,)),
+            )
+
+        throughput(
+            "engine md5+blake2b (one pass)",
+            one_file,
+            lambda: hashing.hash_file(paths[0], ("md5", "blake2b")),
+        )
+
+        throughput(
+            f"legacy md5, {len(paths)} files serial",
+            all_files,
+            lambda: [legacy_md5(x) for x in paths],
+        )
+        throughput(
+            f"engine blake2b, {len(paths)} files parallel",
+            all_files,
+            lambda: list(hashing.hash_files(paths, ("blake2b",))),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+'rex info' latency: five separate requests vs one /info call on a keep-alive session
+
+Needs a running Rex server.
+
+Usage:
+    python benchmarks/bench_info.py [--url http://127.0.0.1:8000] [--runs 50]
+"""
+
+import argparse
+import statistics
+import time
+
+import requests
+
+ROUTES = (
+    "/resolve_version",
+    "/databases",
+    "/current_database",
+    "/projects",
+    "/current_project",
+)
+
+
+def five_requests(url):
+    for route in ROUTES:
+        requests.get(f"{url}{route}").json()
+
+
+def aggregated(session, url):
+    session.get(f"{url}/info").json()
+
+
+def report(label, func, runs):
+
+    func()  # Warm up, fills the server's cache
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    print(
+        f"{label:<36} median {statistics.median(timings):7.2f} ms"
+        f"   p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:7.2f} ms"
+    )
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    session = requests.Session()
+
+    report(
+        "5 requests, new connection each", lambda: five_requests(args.url), args.runs
+    )
+    report(
+        "/info, keep-alive session", lambda: aggregated(session, args.url), args.runs
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Backup pipeline throughput against a fake Resolve: a whole backup per storage
+mode, staged backups, bulk backups with overlapped exports, and checksum MB/s
+per algorithm, and through the load-aware throttle while Resolve's idle, and
+content-defined chunking with and without numpy
+
+Usage:
+    pytest benchmarks/bench_pipeline.py
+"""
+
+import os
+
+import pytest
+
+from conftest import mb_per_sec
+from rex.app import hashing, store
+from rex.app.activity import ActivityMonitor, IOThrottle
+from rex.app.bulk import BulkBackup
+from rex.app.fake_resolve import FakeResolve
+from rex.app.main import Backup, get_promoter
+from rex.app.planner import DatabasePlanner
+from rex.app.progress import ByteCounter
+
+STORAGE = {
+    "drp": dict(deduplicate=False, compression=False),
+    "manifest": dict(deduplicate=True, compression=False),
+    "zst": dict(deduplicate=False, compression=True),
+    "manifest+zst": dict(deduplicate=True, compression=True),
+}
+
+
+@pytest.mark.parametrize("storage", STORAGE)
+def test_backup(benchmark, configure, storage):
+
+    options = STORAGE[storage]
+    configure("backup", deduplicate=options["deduplicate"], skip_unchanged=False)
+    configure("compression", enabled=options["compression"])
+
+    resolve = FakeResolve(projects=1, size_mb=32, change_rate=0.05)
+    sizes = []
+
+    def backup():
+        backup = Backup(resolve=resolve)
+        assert backup.run()
+        sizes.append(backup.size)
+
+    # The first backup of a project stores every chunk, later ones mostly reuse them
+    backup()
+    benchmark.pedantic(backup, rounds=5)
+    mb_per_sec(benchmark, sizes[-1])
+
+
+def test_staged_backup(benchmark, configure, tmp_path):
+    """How long a backup holds the job, moving it into the store in the background"""
+
+    configure("backup", deduplicate=False, skip_unchanged=False)
+    configure("compression", enabled=False)
+    configure("staging", enabled=True, dir=str(tmp_path / "staging"))
+
+    resolve = FakeResolve(projects=1, size_mb=32, change_rate=0.05)
+    sizes = []
+
+    def backup():
+        backup = Backup(resolve=resolve)
+        assert backup.run()
+        sizes.append(backup.size)
+
+    benchmark.pedantic(backup, rounds=5)
+    mb_per_sec(benchmark, sizes[-1])
+    assert get_promoter().wait(60)
+
+
+@pytest.mark.parametrize("latency", [0.0, 0.5])
+def test_bulk_backup(benchmark, configure, latency):
+
+    configure("backup", skip_unchanged=False)
+    resolve = FakeResolve(
+        projects=8, folders=1, size_mb=4, change_rate=0.05, export_latency=latency
+    )
+
+    def bulk():
+        report = BulkBackup(resolve=resolve).run()
+        assert report["failed"] == 0
+
+    benchmark.pedantic(bulk, rounds=3)
+    benchmark.extra_info["projects"] = 16
+
+
+def test_database_cycle(benchmark, configure):
+    """Three databases, each taking a second to switch to"""
+
+    configure("backup", skip_unchanged=False)
+    resolve = FakeResolve(databases=3, projects=4, size_mb=2, switch_latency=1.0)
+
+    def cycle():
+        report = DatabasePlanner(resolve=resolve).run()
+        assert report["failed"] == 0
+        # One per database, including switching back
+        assert report["switches"] == 3
+
+    benchmark.pedantic(cycle, rounds=3)
+
+
+@pytest.mark.parametrize("algorithm", sorted(hashing.ALGORITHMS))
+def test_checksum(benchmark, drp_file, algorithm):
+
+    benchmark(hashing.hash_file, drp_file, [algorithm])
+    mb_per_sec(benchmark, os.path.getsize(drp_file))
+
+
+def test_checksum_all(benchmark, drp_file):
+    """Every configured algorithm in one pass, as backups are hashed"""
+
+    benchmark(hashing.hash_file, drp_file, ["md5", "sha256", "blake2b"])
+    mb_per_sec(benchmark, os.path.getsize(drp_file))
+
+
+def test_checksum_throttled(benchmark, drp_file):
+    """The throttle's overhead on every block when there's nothing to hold back for"""
+
+    throttle = IOThrottle(ActivityMonitor())
+
+    def checksum():
+        counter = ByteCounter(lambda **event: None, "checksum", throttle=throttle)
+        hashing.hash_file(drp_file, ["md5", "sha256", "blake2b"], progress=counter)
+
+    benchmark(checksum)
+    mb_per_sec(benchmark, os.path.getsize(drp_file))
+
+
+@pytest.mark.parametrize("vectorised", [True, False], ids=["numpy", "python"])
+def test_chunking(benchmark, drp_file, monkeypatch, vectorised):
+
+    if vectorised and store.numpy is None:
+        pytest.skip("numpy isn't installed")
+    if not vectorised:
+        monkeypatch.setattr(store, "numpy", None)
+
+    chunker = store.Chunker()
+
+    def chunk():
+        with open(drp_file, "rb") as file:
+            for _ in chunker.chunks(file):
+                pass
+
+    benchmark.pedantic(chunk, rounds=3)
+    mb_per_sec(benchmark, os.path.getsize(drp_file))
@@ -0,0 +1,63 @@
+"""
+Scheduler overhead: dispatching due runs, and working out when runs are next due
+
+Usage:
+    pytest benchmarks/bench_scheduler.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from rex.app.schedules import CronSchedule, Scheduler
+
+RUNS = 2000
+
+
+class AlwaysDue:
+    """Due again as soon as it's run, so nothing is timed but the dispatching"""
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment
+
+
+@pytest.mark.parametrize("entries", [1, 100])
+def test_dispatch(benchmark, entries):
+    """Time to start ``RUNS`` no-op runs of entries that are always due"""
+
+    lags = []
+
+    async def dispatch():
+
+        scheduler = Scheduler()
+        done = asyncio.Event()
+        count = 0
+
+        async def noop():
+            nonlocal count
+            count += 1
+            if count == RUNS:
+                done.set()
+
+        for i in range(entries):
+            scheduler.add(f"entry {i}", AlwaysDue(), noop)
+
+        task = asyncio.ensure_future(scheduler.run())
+        await done.wait()
+        task.cancel()
+
+        lags.extend(x.last_lag for x in scheduler.entries if x.last_lag is not None)
+
+    benchmark.pedantic(lambda: asyncio.run(dispatch()), rounds=5)
+    benchmark.extra_info["runs"] = RUNS
+    benchmark.extra_info["max_lag_ms"] = round(max(lags) * 1000, 3)
+
+
+@pytest.mark.parametrize("expression", ["*/15 * * * *", "0 9-17 * * 1-5", "0 0 29 2 *"])
+def test_cron_next(benchmark, expression):
+
+    schedule = CronSchedule(expression)
+    moments = [datetime(2022, 1, 1) + timedelta(minutes=37 * i) for i in range(100)]
+
+    benchmark(lambda: [schedule.next_after(x) for x in moments])
@@ -0,0 +1,76 @@
+"""
+CLI cold start: wall time and `python -X importtime` breakdown of `rex` commands
+
+`rex backup` is timed with no server listening, so it covers everything up to the
+first request, which is what startup costs a script calling `rex`.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--top 10]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = (
+    ["--help"],
+    ["backup"],
+)
+
+
+def run(args, importtime=False):
+
+    python = [sys.executable, "-X", "importtime"] if importtime else [sys.executable]
+    start = time.perf_counter()
+    result = subprocess.run(
+        python + ["-m", "rex.app.cli"] + args,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+    )
+    return (time.perf_counter() - start) * 1000, result.stderr
+
+
+def slowest_imports(stderr, top):
+    """Top-level imports by cumulative microseconds, from `-X importtime` output"""
+
+    imports = []
+    for line in stderr.splitlines():
+
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not name.startswith("  "):  # Direct imports only, indented are nested
+            imports.append((int(cumulative), name.strip()))
+
+    return sorted(imports, reverse=True)[:top]
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for command in COMMANDS:
+
+        run(command)  # Warm up the filesystem and bytecode caches
+        timings = [run(command)[0] for _ in range(args.runs)]
+
+        print(f"\nrex {' '.join(command)}")
+        print(
+            f"  wall time: median {statistics.median(timings):.0f} ms, "
+            f"min {min(timings):.0f} ms"
+        )
+
+        _, stderr = run(command, importtime=True)
+        for cumulative, name in slowest_imports(stderr, args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Shared setup for the pytest-benchmark suite
+
+Everything runs against a ``FakeResolve`` with a throwaway static dir, catalog and
+settings file, so it runs on any machine, Resolve or not. See ``rex.testing``.
+
+Usage:
+    pytest benchmarks/ [--benchmark-autosave] [--benchmark-compare]
+"""
+
+import os
+
+import pytest
+
+# Fixtures and hooks, used by name
+from rex.testing import configure, isolate_settings, pytest_sessionfinish  # noqa: F401
+
+# Before anything imports the settings, which are loaded once per process
+WORK_DIR = isolate_settings("rex-bench-", "projects=4,size_mb=4")
+
+
+@pytest.fixture(scope="session")
+def drp_file():
+    """A synthetic 64 MB (before zip compression) .drp"""
+
+    from rex.app.fake_resolve import BLOCK_SIZE, make_drp
+
+    path = os.path.join(WORK_DIR, "synthetic.drp")
+    make_drp(path, [0] * (64 * 1024**2 // BLOCK_SIZE), seed="checksum")
+    return path
+
+
+def mb_per_sec(benchmark, size: int) -> float:
+    """Throughput of the benchmark's median round, recorded with its results"""
+
+    if benchmark.stats is None:  # --benchmark-disable
+        return None
+
+    rate = size / 1024**2 / benchmark.stats.stats.median
+    benchmark.extra_info["mb_per_sec"] = round(rate, 1)
+    return rate
@@ -0,0 +1,245 @@
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+
+from rex.settings.manager import SettingsManager
+from rex.app import metrics
+from rex.app.throttle import TokenBucket
+
+settings = SettingsManager()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings["app"]["loglevel"])
+
+# Samples any closer together than this are served from the last one
+MIN_SAMPLE_INTERVAL = 1.0
+
+# Measured over when Resolve's first found
+FIRST_SAMPLE_SECONDS = 0.5
+
+
+def idle_seconds() -> float:
+    """Seconds since the last keyboard or mouse input, or ``None`` if we can't tell"""
+
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            class LASTINPUTINFO(ctypes.Structure):
+                _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+            info = LASTINPUTINFO()
+            info.cbSize = ctypes.sizeof(info)
+            if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+                return None
+            millis = ctypes.windll.kernel32.GetTickCount() - info.dwTime
+            return millis / 1000
+
+        if sys.platform == "darwin":
+            output = subprocess.run(
+                ["ioreg", "-c", "IOHIDSystem", "-d", "4"],
+                capture_output=True,
+                text=True,
+                timeout=5,
+            ).stdout
+            for line in output.splitlines():
+                if "HIDIdleTime" in line:
+                    return int(line.split("=")[-1]) / 1e9
+            return None
+
+        # X11 only, and only if it's installed
+        if shutil.which("xprintidle") and os.environ.get("DISPLAY"):
+            output = subprocess.run(
+                ["xprintidle"], capture_output=True, text=True, timeout=5
+            ).stdout
+            return int(output) / 1000
+
+    except (OSError, ValueError, subprocess.SubprocessError):
+        pass
+
+    return None
+
+
+class ActivityMonitor:
+    """
+    Samples how busy Resolve and the user are, to keep backups out of their way
+
+    Resolve counts as busy when its CPU use or media read rate is over the
+    ``activity`` thresholds, as they are during playback and renders. GPU use isn't
+    sampled, so a GPU-heavy render only shows up through the decoding and reading
+    it does. With ``activity.min_idle_seconds``, recent keyboard or mouse input
+    counts as busy too.
+    """
+
+    def __init__(self):
+        self._process = None
+        self._last = None
+        # Which Resolve process's read bytes were last counted, when, and how many
+        self._last_io = None
+        self._lock = threading.Lock()
+
+    def _find_resolve(self) -> psutil.Process:
+
+        if self._process is not None and self._process.is_running():
+            return self._process
+
+        names = {x.lower() for x in settings["activity"]["process_names"]}
+        for process in psutil.process_iter(["name"]):
+            if (process.info["name"] or "").lower() in names:
+                # CPU and I/O are measured between samples, so take a first one
+                self._read_rate(process, time.monotonic())
+                process.cpu_percent(None)
+                time.sleep(FIRST_SAMPLE_SECONDS)
+                self._process = process
+                return process
+
+        self._process = None
+        return None
+
+    def sample(self) -> dict:
+        """
+        Returns:
+            dict: ``resolve_running``, ``resolve_cpu_percent`` (share of all cores),
+            ``resolve_read_mb_per_sec``, ``idle_seconds`` (``None`` if unknown),
+            ``busy`` and the ``reasons`` it's busy
+        """
+
+        with self._lock:
+
+            now = time.monotonic()
+            if self._last and now - self._last["at"] < MIN_SAMPLE_INTERVAL:
+                return self._last
+
+            thresholds = settings["activity"]
+            sample = {
+                "at": now,
+                "resolve_running": False,
+                "resolve_cpu_percent": 0.0,
+                "resolve_read_mb_per_sec": 0.0,
+                "idle_seconds": None,
+                "busy": False,
+                "reasons": [],
+            }
+
+            try:
+                process = self._find_resolve()
+                if process is not None:
+                    sample["resolve_running"] = True
+                    sample["resolve_cpu_percent"] = round(
+                        process.cpu_percent(None) / (psutil.cpu_count() or 1), 1
+                    )
+                    sample["resolve_read_mb_per_sec"] = self._read_rate(
+                        process, time.monotonic()
+                    )
+
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self._process = None
+
+            if thresholds["min_idle_seconds"]:
+                sample["idle_seconds"] = idle_seconds()
+
+            reasons = sample["reasons"]
+            if sample["resolve_cpu_percent"] > thresholds["resolve_cpu_percent"]:
+                reasons.append(f"Resolve at {sample['resolve_cpu_percent']}% CPU")
+            if (
+                thresholds["resolve_read_mb_per_sec"]
+                and sample["resolve_read_mb_per_sec"]
+                > thresholds["resolve_read_mb_per_sec"]
+            ):
+                reasons.append(
+                    f"Resolve reading {sample['resolve_read_mb_per_sec']} MB/s"
+                )
+            if (
+                sample["idle_seconds"] is not None
+                and sample["idle_seconds"] < thresholds["min_idle_seconds"]
+            ):
+                reasons.append(f"input {sample['idle_seconds']:.0f}s ago")
+            sample["busy"] = bool(reasons)
+
+            metrics.RESOLVE_CPU.set(sample["resolve_cpu_percent"])
+            self._last = sample
+            return sample
+
+    def _read_rate(self, process: psutil.Process, now: float) -> float:
+
+        # Not available on macOS
+        if not hasattr(process, "io_counters"):
+            return 0.0
+
+        read = process.io_counters().read_bytes
+        last, self._last_io = self._last_io, (process.pid, now, read)
+        # A restarted Resolve counts from zero again
+        if last is None or last[0] != process.pid or now <= last[1]:
+            return 0.0
+        return round((read - last[2]) / 1024**2 / (now - last[1]), 1)
+
+    def busy(self) -> bool:
+        return settings["activity"]["enabled"] and self.sample()["busy"]
+
+
+class IOThrottle:
+    """
+    Holds the backup pipeline's post-export I/O down while Resolve is busy
+
+    While ``ActivityMonitor.busy``, everything through ``consume`` shares
+    ``activity.busy_io_mb_per_sec``. Otherwise it's unlimited. Load is checked
+    every ``check_interval`` seconds as bytes flow, so no thread of its own.
+    """
+
+    def __init__(self, monitor: ActivityMonitor, check_interval: float = 2.0):
+        self.monitor = monitor
+        self.check_interval = check_interval
+        self.bucket = TokenBucket(0)
+        self._next_check = 0
+        self._lock = threading.Lock()
+
+    def _adjust(self):
+
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+
+            rate = 0
+            if self.monitor.busy():
+                rate = settings["activity"]["busy_io_mb_per_sec"] * 1024**2
+
+            if rate != self.bucket.rate:
+                self.bucket.set_rate(rate)
+                metrics.IO_RATE_LIMIT.set(rate)
+                if rate:
+                    logger.info(
+                        f"Resolve is busy, slowing backups to "
+                        f"{settings['activity']['busy_io_mb_per_sec']} MB/s"
+                    )
+
+    def consume(self, amount: int):
+        self._adjust()
+        self.bucket.consume(amount)
+
+
+_monitor = ActivityMonitor()
+_throttle = IOThrottle(_monitor)
+
+
+def get_monitor() -> ActivityMonitor:
+    return _monitor
+
+
+def get_io_throttle() -> IOThrottle:
+    """The shared post-export I/O throttle, or ``None`` if throttling is off"""
+
+    activity = settings["activity"]
+    if not activity["enabled"] or not activity["busy_io_mb_per_sec"]:
+        return None
+    return _throttle
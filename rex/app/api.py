@@ -1,10 +1,186 @@
-from fastapi import FastAPI
-from pydavinci import davinci
-from rex.app.main import Backup
+import asyncio
+import json
+import os
+import time
+from typing import Optional
 
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from rex.app.main import (
+    Backup,
+    get_catalog,
+    get_promoter,
+    get_resolve,
+    shutdown_promoter,
+    staging_dir,
+    train_dictionary,
+)
+from rex.app.bulk import BulkBackup
+from rex.app.cache import cached, metadata_cache
+from rex.app.jobs import JobQueue, call_resolve
+from rex.app.planner import run_database_cycle
+from rex.app import metrics
+from rex.app.restore import restore
+from rex.app.retention import run_retention
+from rex.app import timelines
+from rex.app.upload import run_upload
+from rex.app.verify import run_verification
+from rex.settings.manager import SettingsManager
 
 app = FastAPI()
-resolve = davinci.Resolve()
+resolve = get_resolve()
+settings = SettingsManager()
+
+# Jobs that never call Resolve, so run alongside backups rather than behind them
+BACKGROUND_KINDS = {"upload", "verify"}
+
+# Blocking Resolve work runs here, never on the event loop
+jobs = JobQueue(background_kinds=BACKGROUND_KINDS)
+metrics.gauge("rex_jobs_queued", "Jobs waiting or running", func=jobs.depth)
+
+# Seconds between comments on an idle event stream, e.g. through a long export,
+# so proxies and clients don't take it for dead
+KEEPALIVE_SECONDS = 15
+
+
+def backup_job(job) -> dict:
+    backup = Backup(job.params.get("project"), resolve=resolve, progress=job.emit)
+    success = backup.run()
+    return {
+        "success": success,
+        "status": backup.status,
+        "backup_id": backup.backup_id,
+        "timings": backup.timings,
+    }
+
+
+def backup_all_job(job) -> dict:
+    try:
+        return BulkBackup(
+            resolve=resolve, cancel_event=job.cancel_event, progress=job.emit
+        ).run()
+    finally:
+        # The run moves the project manager between folders
+        metadata_cache.invalidate("current_folder", "projects")
+
+
+def backup_databases_job(job) -> dict:
+    try:
+        report = run_database_cycle(job.cancel_event, job.emit)
+    finally:
+        # The cycle switches databases and folders
+        metadata_cache.invalidate(
+            "current_database", "current_folder", "projects", "current_project"
+        )
+    if report is None:
+        raise RuntimeError("A cross-database backup is already running")
+    return report
+
+
+def prune_job(job) -> dict:
+    # Queued with backups, so a chunk is never pruned while a backup is reusing it
+    return run_retention(job.params.get("dry_run", False), job.cancel_event)
+
+
+def restore_job(job) -> dict:
+    params = job.params
+    report = restore(
+        resolve,
+        params.get("project"),
+        at=params.get("at"),
+        db_name=params.get("database"),
+        verified_only=params.get("verified_only", False),
+        backup_id=params.get("backup_id"),
+        import_project=not params.get("stage_only", False),
+    )
+    # A new project in the current folder
+    metadata_cache.invalidate("projects")
+    return report
+
+
+def upload_job(job) -> dict:
+    report = run_upload(job.cancel_event, job.emit)
+    if report is None:
+        raise RuntimeError("An upload is already running")
+    return report
+
+
+def verify_job(job) -> dict:
+    report = run_verification(job.cancel_event, job.emit)
+    if report is None:
+        raise RuntimeError("Verification is already running")
+    return report
+
+
+def index_timelines_job(job) -> dict:
+    # Queued with backups, so it never competes with an export for the disk
+    max_seconds = job.params.get("max_seconds")
+    return timelines.backfill(
+        300 if max_seconds is None else max_seconds,
+        cancel_event=job.cancel_event,
+        progress=job.emit,
+    )
+
+
+JOB_KINDS = {
+    "backup": backup_job,
+    "backup_all": backup_all_job,
+    "backup_databases": backup_databases_job,
+    "prune": prune_job,
+    "restore": restore_job,
+    "upload": upload_job,
+    "verify": verify_job,
+    "index_timelines": index_timelines_job,
+}
+
+
+class JobRequest(BaseModel):
+    kind: str = "backup"
+    project: Optional[str] = None
+    dry_run: bool = False
+    # Restores
+    at: Optional[float] = None
+    database: Optional[str] = None
+    backup_id: Optional[int] = None
+    verified_only: bool = False
+    stage_only: bool = False
+    # Timeline indexing
+    max_seconds: Optional[float] = None
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+
+    # By route template, not path, so ids don't each get their own series
+    route = request.scope.get("route")
+    metrics.HTTP_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code,
+    )
+    return response
+
+
+@app.on_event("startup")
+async def watch_settings():
+    # Apply edits to the settings file without restarting. Changing ip/port still needs one.
+    settings.watch()
+
+
+@app.on_event("startup")
+def resume_promotion():
+    # Backups left in staging by the last run, even if staging's since been disabled
+    if settings["staging"]["enabled"] or os.path.isdir(staging_dir()):
+        get_promoter().resume()
+
+
+@app.on_event("shutdown")
+def stop_promotion():
+    shutdown_promoter()
 
 
 @app.get("/")
@@ -12,35 +188,94 @@ async def welcome():
     return {"Greeting": "Welcome to Rex REST API! - check out docs @ '/docs'"}
 
 
+def resolve_cached(name: str, func, *key_parts):
+    """``cached``, with misses calling Resolve through ``call_resolve``"""
+    return cached(name, lambda: call_resolve(func), *key_parts)
+
+
 @app.get("/resolve_version")
-async def get_resolve_version() -> str:
-    return resolve.version
+def get_resolve_version() -> str:
+    return resolve_cached("resolve_version", lambda: resolve.version)
 
 
 @app.get("/databases")
-async def get_databases() -> list[dict[str, str]]:
-    return resolve.project_manager.db_list
+def get_databases() -> list[dict[str, str]]:
+    return resolve_cached("databases", lambda: resolve.project_manager.db_list)
 
 
 @app.get("/current_database")
-async def current_database() -> dict[str, str]:
-    return resolve.project_manager.db
+def current_database() -> dict[str, str]:
+    return resolve_cached("current_database", lambda: resolve.project_manager.db)
 
 
 @app.get("/projects")
-async def all_projects() -> list[str]:
+def all_projects() -> list[str]:
     """
     A list of all project names in current project manager folder
 
     Returns:
         list[str]: project names
     """
-    return resolve.project_manager.projects
+    db_name = current_database()["DbName"]
+    folder = resolve_cached(
+        "current_folder", lambda: resolve.project_manager.current_folder
+    )
+    return resolve_cached(
+        "projects", lambda: resolve.project_manager.projects, db_name, folder
+    )
 
 
 @app.get("/current_project")
-async def current_project_info() -> str:
-    return resolve.project.name
+def current_project_info() -> str:
+    return resolve_cached("current_project", lambda: resolve.project.name)
+
+
+def _environment_info() -> dict:
+
+    projects = all_projects()
+    return {
+        "resolve_version": get_resolve_version(),
+        "databases": get_databases(),
+        "current_database": current_database(),
+        "project_count": len(projects),
+        "current_project": current_project_info(),
+    }
+
+
+@app.get("/info")
+async def environment_info() -> dict:
+    """
+    Everything ``rex info`` shows, in one request
+
+    The Resolve probes run in turn holding ``resolve_lock``, so never alongside
+    a job or another route's. Most are cache hits anyway.
+
+    Returns:
+        dict: ``resolve_version``, ``databases``, ``current_database``,
+        ``project_count`` and ``current_project``
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        None, call_resolve, _environment_info
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Counters and latency histograms, in Prometheus text format"""
+    return Response(metrics.render(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+@app.get("/cache")
+async def cache_stats() -> dict:
+    """Hit and miss counts for the Resolve metadata cache"""
+    return metadata_cache.stats()
+
+
+@app.delete("/cache")
+async def clear_cache() -> dict:
+    """Drop all cached Resolve metadata, e.g. after switching database in Resolve"""
+    metadata_cache.invalidate()
+    return metadata_cache.stats()
 
 
 @app.get("/backup")
@@ -48,10 +283,240 @@ async def backup_current_project() -> bool:
     """
     Backup the active Resolve project now
 
+    Waits for the backup to finish. Use ``POST /jobs`` to queue one without waiting.
+
     Returns:
         bool: ``True`` if successful, ``False`` otherwise
     """
-    backup = Backup()
-    if not backup.run():
-        return False
-    return True
+    job = jobs.submit("backup", backup_job)
+    await asyncio.wrap_future(job.future)
+    return bool(job.result and job.result["success"])
+
+
+@app.get("/backup_all")
+async def backup_all_projects() -> dict:
+    """
+    Backup every project in the current database, including those in folders
+
+    Waits for the run to finish. Use ``POST /jobs`` to queue one without waiting.
+
+    Returns:
+        dict: Run summary with per-project results
+    """
+    job = jobs.submit("backup_all", backup_all_job)
+    await asyncio.wrap_future(job.future)
+    if job.error:
+        raise HTTPException(500, job.error)
+    return job.result
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest) -> dict:
+    """
+    Queue a backup job and return immediately
+
+    Kinds are "backup" (the active project, or ``project`` in the current folder),
+    "backup_all", "backup_databases" (a cycle across databases), "prune" (set ``dry_run`` to only report what it would delete),
+    "restore" (``project`` as of ``at``, or ``backup_id``, imported under a new name)
+    "upload" (backups not in the configured bucket yet), "verify" (a sweep over backups
+    due a check) and "index_timelines" (older backups' timelines, for up to ``max_seconds``).
+    Uploads and verification run alongside any backup.
+    Poll ``GET /jobs/{id}`` for progress.
+
+    Returns:
+        dict: The queued job
+    """
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(422, f"Unknown job kind '{request.kind}'")
+
+    job = jobs.submit(
+        request.kind, JOB_KINDS[request.kind], **request.dict(exclude={"kind"})
+    )
+    return job.to_dict()
+
+
+@app.get("/jobs")
+async def list_jobs() -> list[dict]:
+    """Queued, running and recently finished jobs, oldest first"""
+    return [x.to_dict() for x in jobs.list()]
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> dict:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"No job '{job_id}'")
+    return job.to_dict()
+
+
+def _sse(event: str, data, event_id: int = None) -> str:
+    lines = [f"event: {event}", f"data: {json.dumps(data, default=str)}"]
+    if event_id is not None:
+        lines.insert(0, f"id: {event_id}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _job_events(job, after: int):
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def notify():
+        loop.call_soon_threadsafe(wake.set)
+
+    job.listen(notify)
+    try:
+        while True:
+
+            wake.clear()
+            # Checked first, so nothing emitted before it finished is missed
+            done = job.done
+
+            for event in job.events_since(after):
+                after = event["seq"]
+                yield _sse(event["type"], event, after)
+
+            if done:
+                yield _sse("done", job.to_dict())
+                return
+
+            try:
+                await asyncio.wait_for(wake.wait(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+
+    finally:
+        job.unlisten(notify)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    after: int = 0,
+    last_event_id: Optional[int] = Header(None),
+) -> StreamingResponse:
+    """
+    Stream a job's progress as Server-Sent Events, until it finishes
+
+    Each event's name is its ``type``: "state", "stage", "stage_done", "bytes"
+    (with ``total`` and ``mb_per_sec``), "status", "database", "upload"
+    (a backup uploaded, or its ``error``), "verify" (a backup's verification ``state``)
+    or "index" (a backup's timelines indexed, or its ``error``). The data is JSON
+    with a ``seq`` number. The stream ends with a "done" event holding the finished job.
+
+    Args:
+        after (int): Only events after this ``seq``, to resume a dropped stream.
+            ``Last-Event-ID`` does the same.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"No job '{job_id}'")
+
+    return StreamingResponse(
+        _job_events(job, last_event_id or after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str) -> dict:
+    """
+    Cancel a queued or running job
+
+    A running job stops at its next checkpoint. An export already underway finishes first.
+    """
+    if not jobs.cancel(job_id):
+        raise HTTPException(
+            409, f"Job '{job_id}' doesn't exist or has already finished"
+        )
+    return jobs.get(job_id).to_dict()
+
+
+@app.get("/backups")
+def list_backups(
+    project: Optional[str] = None,
+    database: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = 50,
+) -> list[dict]:
+    """
+    Catalogued backups, most recent first
+
+    Args:
+        since, until (float, optional): Unix timestamps to filter by
+
+    Returns:
+        list[dict]: backup records, including digests and verification state
+    """
+    return get_catalog().list_backups(project, database, since, until, limit)
+
+
+@app.get("/backups/projects")
+def backed_up_projects() -> list[dict]:
+    """Every catalogued project with its backup count and latest backup time"""
+    return get_catalog().projects()
+
+
+@app.get("/backups/latest")
+def latest_backup(
+    project: str,
+    database: Optional[str] = None,
+    verified: bool = False,
+) -> dict:
+    """
+    The most recent backup of a project
+
+    Args:
+        verified (bool): Only consider backups that have passed verification
+    """
+    backup = get_catalog().latest(project, database, verified_only=verified)
+    if backup is None:
+        raise HTTPException(404, f"No backups of '{project}'")
+    return backup
+
+
+@app.get("/backups/digest/{digest}")
+def backups_by_digest(digest: str) -> list[dict]:
+    """Backups with the given checksum, in any algorithm"""
+    return get_catalog().find_by_digest(digest)
+
+
+@app.get("/timelines")
+def find_timeline(
+    name: str,
+    project: Optional[str] = None,
+    database: Optional[str] = None,
+    exact: bool = False,
+) -> list[dict]:
+    """
+    Find a timeline across backup history
+
+    Args:
+        name (str): Timeline name, or part of one unless ``exact``. Case-insensitive.
+
+    Returns:
+        list[dict]: Per project and timeline: first and last backups it's in,
+        backups where it changed, and the backup it disappeared in, if it has
+    """
+    return timelines.find_timeline(name, project, database, exact)
+
+
+@app.get("/train_dictionary")
+def train_compression_dictionary(database: Optional[str] = None) -> int:
+    """
+    Train a zstd dictionary for a database from its existing backups
+
+    Args:
+        database (str, optional): Defaults to the current database
+
+    Returns:
+        int: The new dictionary's id
+    """
+    try:
+        if database is None:
+            database = call_resolve(lambda: resolve.project_manager.db["DbName"])
+        return train_dictionary(database)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
@@ -0,0 +1,275 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from rex.settings.manager import SettingsManager
+from rex.app.main import Backup, get_resolve
+
+settings = SettingsManager()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings["app"]["loglevel"])
+
+
+def call_with_timeout(func, timeout: float = None):
+    """
+    Call ``func`` on a daemon thread, giving up after ``timeout`` seconds
+
+    A hung Resolve call can't be interrupted, but this stops it holding up the run.
+
+    Raises:
+        concurrent.futures.TimeoutError: If the call didn't return in time
+    """
+
+    future = Future()
+
+    def target():
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, daemon=True).start()
+    return future.result(timeout=timeout)
+
+
+def _remove_export(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        # Still open, e.g. on Windows
+        logger.warning(f"[yellow]Couldn't remove failed export '{path}': {e}")
+
+
+def _export_attempt(backup: Backup, path: str, abandoned: threading.Event) -> bool:
+
+    try:
+        return backup.export_project(path)
+    finally:
+        # Finished after we stopped waiting, nobody's going to use it
+        if abandoned.is_set():
+            _remove_export(path)
+
+
+class BulkBackup:
+    """
+    Back up every project in the project manager, folders included
+
+    Exports run through a bounded worker pool. Each finished export is handed to
+    a second pool for checksums and de-duplication, so CPU-bound work overlaps
+    with the next export instead of waiting for it.
+
+    An export that times out can't be stopped. Its retry exports to a new file,
+    and whatever the abandoned export writes is deleted when it finishes.
+    """
+
+    def __init__(
+        self,
+        resolve=None,
+        export_workers: int = None,
+        finalize_workers: int = None,
+        retries: int = None,
+        timeout: float = None,
+        cancel_event: threading.Event = None,
+        projects: list = None,
+        skip: set = None,
+        progress=None,
+    ):
+        """
+        Args:
+            projects (list, optional): Only back up projects with these names, in any folder
+            skip (set, optional): Names of projects not to back up, e.g. already done
+            progress (optional): Passed to each ``Backup``
+        """
+
+        bulk_settings = settings["backup"]["bulk"]
+
+        self.resolve = resolve or get_resolve()
+        self.export_workers = export_workers or bulk_settings["export_workers"]
+        self.finalize_workers = finalize_workers or bulk_settings["finalize_workers"]
+        self.retries = bulk_settings["retries"] if retries is None else retries
+        self.timeout = timeout or bulk_settings["timeout_in_seconds"]
+        self.cancel_event = cancel_event or threading.Event()
+        self.projects = set(projects) if projects else None
+        self.skip = skip or set()
+        self.progress = progress
+
+        self.results = []
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def run(self) -> dict:
+        """
+        Back up all projects, starting from the project manager's root folder
+
+        Returns:
+            dict: Summary with ``total``, ``succeeded``, ``failed``, ``skipped``,
+            ``bytes``, ``seconds`` and per-project ``results``
+        """
+
+        start = time.perf_counter()
+        self.results = []
+        self.skipped = 0
+        project_manager = self.resolve.project_manager
+
+        with ThreadPoolExecutor(
+            self.export_workers, thread_name_prefix="rex-export"
+        ) as self._export_pool, ThreadPoolExecutor(
+            self.finalize_workers, thread_name_prefix="rex-finalize"
+        ) as self._finalize_pool:
+
+            self._finalizing = []
+            project_manager.goto_root_folder()
+            self._backup_folder(())
+
+            for future in self._finalizing:
+                future.result()
+
+        failed = [x for x in self.results if not x["success"]]
+        summary = {
+            "cancelled": self.cancel_event.is_set(),
+            "total": len(self.results),
+            "succeeded": len(self.results) - len(failed),
+            "failed": len(failed),
+            "skipped": self.skipped,
+            "bytes": sum(x.get("bytes") or 0 for x in self.results),
+            "seconds": round(time.perf_counter() - start, 3),
+            "results": self.results,
+        }
+
+        logger.info(
+            f"Backed up {summary['succeeded']}/{summary['total']} projects "
+            f"in {summary['seconds']}s"
+        )
+        for x in failed:
+            logger.error(f"[red]Failed to back up '{x['project']}': {x['error']}")
+
+        return summary
+
+    def _backup_folder(self, folder: tuple):
+        """
+        Export every project in the current folder, then recurse into subfolders
+
+        Exports are relative to the project manager's current folder,
+        so a folder's exports must finish before we navigate away from it.
+        """
+
+        project_manager = self.resolve.project_manager
+
+        names = [
+            x
+            for x in project_manager.projects
+            if self.projects is None or x in self.projects
+        ]
+        wanted = [x for x in names if x not in self.skip]
+        self.skipped += len(names) - len(wanted)
+
+        exports = [
+            self._export_pool.submit(self._export, folder, name) for name in wanted
+        ]
+        for future in exports:
+            future.result()
+
+        for subfolder in list(project_manager.folders):
+            if self.cancel_event.is_set():
+                return
+            project_manager.open_folder(subfolder)
+            try:
+                self._backup_folder(folder + (subfolder,))
+            finally:
+                project_manager.goto_parent_folder()
+
+    def _export(self, folder: tuple, project_name: str):
+        """Export a project, with retries and a per-attempt timeout"""
+
+        result = {
+            "project": project_name,
+            "folder": "/".join(folder),
+            "success": False,
+            "status": None,
+            "attempts": 0,
+            "error": None,
+            "export_seconds": None,
+            "finalize_seconds": None,
+            "bytes": None,
+        }
+
+        with self._lock:
+            self.results.append(result)
+
+        if self.cancel_event.is_set():
+            result["error"] = "Cancelled"
+            return
+
+        try:
+            backup = Backup(
+                project_name,
+                resolve=self.resolve,
+                progress=self.progress,
+                folder=folder,
+            )
+        except Exception as e:
+            result["error"] = str(e)
+            return
+
+        if backup.unchanged_since_last_backup():
+            result["success"] = True
+            result["status"] = backup.status
+            return
+
+        for attempt in range(1, self.retries + 2):
+
+            result["attempts"] = attempt
+            abandoned = threading.Event()
+
+            try:
+                path = backup.prepare_export(attempt)
+                start = time.perf_counter()
+                if call_with_timeout(
+                    lambda: _export_attempt(backup, path, abandoned), self.timeout
+                ):
+                    result["export_seconds"] = round(time.perf_counter() - start, 3)
+                    result["error"] = None
+                    break
+                result["error"] = "Resolve refused the export"
+
+            except FutureTimeoutError:
+                abandoned.set()
+                result["error"] = f"Export timed out after {self.timeout}s"
+
+            except Exception as e:
+                result["error"] = str(e)
+
+            # Anything partial. An abandoned export cleans up after itself too.
+            _remove_export(backup.backup_filepath)
+
+            logger.warning(
+                f"[yellow]Export of '{project_name}' failed "
+                f"(attempt {attempt}/{self.retries + 1}): {result['error']}"
+            )
+            if attempt <= self.retries:
+                time.sleep(min(2 ** (attempt - 1), 30))
+
+        else:
+            return
+
+        future = self._finalize_pool.submit(self._finalize, backup, result)
+        with self._lock:
+            self._finalizing.append(future)
+
+    def _finalize(self, backup: Backup, result: dict):
+
+        start = time.perf_counter()
+        result["success"] = backup.finalize()
+        result["status"] = backup.status
+        result["bytes"] = backup.size
+        result["timings"] = backup.timings
+        result["finalize_seconds"] = round(time.perf_counter() - start, 3)
+
+        if not result["success"]:
+            result["error"] = "Post-export processing failed"
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from rex.settings.manager import SettingsManager
+
+settings = SettingsManager()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings["app"]["loglevel"])
+
+
+class TTLCache:
+    """
+    Thread-safe cache with a time-to-live per entry and a bounded size
+
+    Least recently used entries are evicted first once ``maxsize`` is reached.
+    Concurrent misses on the same key make a single call, the rest wait for it.
+    """
+
+    def __init__(self, maxsize: int = 256):
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self._key_locks = dict()
+
+    def get_or_set(self, key, func, ttl: float):
+        """
+        Return the cached value for ``key``, or call ``func`` and cache its result
+
+        Args:
+            key: Any hashable. Tuples are handy for per-folder keys, e.g. ``("projects", folder)``
+            func: Called with no arguments on a miss. Exceptions aren't cached.
+            ttl (float): Seconds to keep the result. 0 disables caching for this call.
+        """
+
+        found, value = self._get(key)
+        if found:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        try:
+            with key_lock:
+
+                # Someone else may have filled it while we waited
+                found, value = self._get(key, count=False)
+                if found:
+                    return value
+
+                value = func()
+                if ttl > 0:
+                    self.set(key, value, ttl)
+                return value
+
+        finally:
+            # Only needed while a load's running. Anyone already waiting on it
+            # still has it, and later misses get a new one.
+            with self._lock:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+    def _get(self, key, count: bool = True) -> tuple:
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return True, entry[1]
+
+            if count:
+                self.misses += 1
+            return False, None
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *names):
+        """
+        Drop cached entries
+
+        Args:
+            *names: Keys to drop. Tuple keys are also dropped by their first element,
+                so ``invalidate("projects")`` drops every folder's listing.
+                No names clears the whole cache.
+        """
+
+        with self._lock:
+
+            if not names:
+                self._entries.clear()
+                return
+
+            for key in list(self._entries):
+                if key in names or (isinstance(key, tuple) and key[0] in names):
+                    del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+
+# Resolve metadata, shared by the API and anything in Rex that changes it
+metadata_cache = TTLCache(settings["server"]["cache"]["max_entries"])
+
+
+def _resize(changed: set):
+    # New TTLs apply to new entries anyway, only the size needs pushing
+    if "server" in changed:
+        metadata_cache.maxsize = settings["server"]["cache"]["max_entries"]
+
+
+settings.subscribe(_resize)
+
+
+def cached(name: str, func, *key_parts):
+    """Get Resolve metadata through ``metadata_cache``, with the TTL configured for ``name``"""
+
+    ttl = settings["server"]["cache"]["ttl_seconds"][name]
+    key = (name,) + key_parts if key_parts else name
+    return metadata_cache.get_or_set(key, func, ttl)
@@ -0,0 +1,610 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    id INTEGER PRIMARY KEY,
+    db_name TEXT NOT NULL,
+    project TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    storage TEXT NOT NULL,
+    size INTEGER,
+    verify_state TEXT NOT NULL DEFAULT 'unverified',
+    verified_at REAL
+);
+CREATE INDEX IF NOT EXISTS backups_project_time ON backups (project, created_at);
+CREATE INDEX IF NOT EXISTS backups_db_project_time ON backups (db_name, project, created_at);
+CREATE INDEX IF NOT EXISTS backups_verified ON backups (verified_at);
+
+CREATE TABLE IF NOT EXISTS digests (
+    backup_id INTEGER NOT NULL REFERENCES backups (id) ON DELETE CASCADE,
+    algorithm TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (backup_id, algorithm)
+);
+CREATE INDEX IF NOT EXISTS digests_digest ON digests (digest);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    db_name TEXT NOT NULL,
+    project TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_project_time ON events (project, created_at);
+
+CREATE TABLE IF NOT EXISTS chunk_refs (
+    digest TEXT NOT NULL,
+    backup_id INTEGER NOT NULL REFERENCES backups (id) ON DELETE CASCADE,
+    PRIMARY KEY (digest, backup_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chunk_refs_backup ON chunk_refs (backup_id);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    backup_id INTEGER NOT NULL REFERENCES backups (id) ON DELETE CASCADE,
+    target TEXT NOT NULL,
+    uploaded_at REAL NOT NULL,
+    PRIMARY KEY (backup_id, target)
+);
+CREATE TABLE IF NOT EXISTS uploaded_chunks (
+    digest TEXT NOT NULL,
+    target TEXT NOT NULL,
+    uploaded_at REAL NOT NULL,
+    PRIMARY KEY (digest, target)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS timeline_index (
+    backup_id INTEGER PRIMARY KEY REFERENCES backups (id) ON DELETE CASCADE,
+    indexed_at REAL NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS timelines (
+    backup_id INTEGER NOT NULL REFERENCES backups (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    clips INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timelines_name ON timelines (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS timelines_backup ON timelines (backup_id);
+
+CREATE TABLE IF NOT EXISTS database_cycles (
+    db_name TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS events_db_time ON events (db_name, created_at);
+"""
+
+# Columns added since their table was, for catalogs created before them
+COLUMNS = [
+    ("database_cycles", "error", "TEXT"),
+]
+
+VERIFY_STATES = ("unverified", "ok", "corrupt", "missing")
+
+
+class Catalog:
+    """
+    SQLite catalog of every backup Rex has written
+
+    Answers "latest good backup of project X" from an index instead of
+    listing the static dir. WAL mode lets the API read while backups write.
+    Each thread gets its own connection.
+
+    Keep the database on local disk - WAL doesn't work over network shares.
+    """
+
+    def __init__(self, path: str):
+
+        self.path = path
+        self._local = threading.local()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+            for table, column, definition in COLUMNS:
+                existing = connection.execute(f"PRAGMA table_info({table})")
+                if column not in {x["name"] for x in existing}:
+                    connection.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+                    )
+
+    def _connection(self) -> sqlite3.Connection:
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+
+        return connection
+
+    def add_backup(
+        self,
+        db_name: str,
+        project: str,
+        filename: str,
+        path: str,
+        storage: str,
+        size: int = None,
+        digests: dict = None,
+        created_at: float = None,
+        chunks=None,
+    ) -> int:
+        """
+        Record a backup
+
+        Args:
+            storage (str): How the backup is stored, e.g. "drp" or "manifest"
+            digests (dict, optional): Hex digests keyed by algorithm
+            chunks (iterable, optional): Digests of the chunks a manifest backup uses
+
+        Returns:
+            int: The backup's id
+        """
+
+        with self._connection() as connection:
+
+            cursor = connection.execute(
+                "INSERT INTO backups (db_name, project, created_at, filename, path, storage, size)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    db_name,
+                    project,
+                    created_at or time.time(),
+                    filename,
+                    path,
+                    storage,
+                    size,
+                ),
+            )
+            backup_id = cursor.lastrowid
+
+            connection.executemany(
+                "INSERT INTO digests (backup_id, algorithm, digest) VALUES (?, ?, ?)",
+                [(backup_id, k, v) for k, v in (digests or {}).items()],
+            )
+            self._add_chunk_refs(connection, backup_id, chunks or ())
+
+        return backup_id
+
+    def add_chunk_refs(self, backup_id: int, chunks):
+        with self._connection() as connection:
+            self._add_chunk_refs(connection, backup_id, chunks)
+
+    @staticmethod
+    def _add_chunk_refs(connection, backup_id, chunks):
+        connection.executemany(
+            "INSERT OR IGNORE INTO chunk_refs (digest, backup_id) VALUES (?, ?)",
+            [(x, backup_id) for x in set(chunks)],
+        )
+
+    def unindexed_manifests(self) -> list:
+        """Manifest backups with no chunk references recorded, from before they were"""
+
+        return self._query(
+            "SELECT * FROM backups WHERE storage = 'manifest'"
+            " AND NOT EXISTS (SELECT 1 FROM chunk_refs WHERE backup_id = backups.id)"
+        )
+
+    def retention_index(self) -> list:
+        """
+        Every backup, lightest columns only, grouped by database and project, newest first
+
+        Returns:
+            list[dict]: ``id``, ``db_name``, ``project``, ``created_at``, ``verify_state``
+        """
+
+        with self._connection() as connection:
+            rows = connection.execute(
+                "SELECT id, db_name, project, created_at, verify_state FROM backups"
+                " ORDER BY db_name, project, created_at DESC"
+            ).fetchall()
+        return [dict(x) for x in rows]
+
+    def remove_backups(self, backup_ids: list) -> dict:
+        """
+        Forget backups, along with their digests and chunk references
+
+        Returns:
+            dict: Chunk digests no other backup references any more, each with the
+            paths of the removed manifests that used it
+        """
+
+        if not backup_ids:
+            return dict()
+
+        orphans = dict()
+        with self._connection() as connection:
+
+            connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS removing (id INTEGER PRIMARY KEY)"
+            )
+            connection.execute("DELETE FROM removing")
+            connection.executemany(
+                "INSERT OR IGNORE INTO removing (id) VALUES (?)",
+                [(x,) for x in backup_ids],
+            )
+
+            rows = connection.execute(
+                "SELECT chunk_refs.digest, backups.path FROM chunk_refs"
+                " JOIN removing ON removing.id = chunk_refs.backup_id"
+                " JOIN backups ON backups.id = chunk_refs.backup_id"
+                " WHERE NOT EXISTS (SELECT 1 FROM chunk_refs AS other"
+                " WHERE other.digest = chunk_refs.digest"
+                " AND other.backup_id NOT IN (SELECT id FROM removing))"
+            ).fetchall()
+            for digest, path in rows:
+                orphans.setdefault(digest, []).append(path)
+
+            connection.execute(
+                "DELETE FROM backups WHERE id IN (SELECT id FROM removing)"
+            )
+            connection.execute("DELETE FROM removing")
+
+        return orphans
+
+    def add_event(self, db_name: str, project: str, event: str, created_at=None):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO events (db_name, project, created_at, event) VALUES (?, ?, ?, ?)",
+                (db_name, project, created_at or time.time(), event),
+            )
+
+    def database_cycles(self) -> dict:
+        """Where each database is in the current cross-database cycle, keyed by name"""
+
+        with self._connection() as connection:
+            rows = connection.execute("SELECT * FROM database_cycles").fetchall()
+        return {x["db_name"]: dict(x) for x in rows}
+
+    def start_database_cycle(self, db_names: list, started_at: float = None):
+        """Mark databases as due in a new cycle, starting now"""
+
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO database_cycles"
+                " (db_name, started_at, finished_at, error) VALUES (?, ?, NULL, NULL)",
+                [(x, started_at or time.time()) for x in db_names],
+            )
+
+    def finish_database_cycle(self, db_name: str, error: str = None):
+        """Mark a database done for this cycle, or given up on with ``error``"""
+
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE database_cycles SET finished_at = ?, error = ? WHERE db_name = ?",
+                (time.time(), error, db_name),
+            )
+
+    def backed_up_since(self, db_name: str, since: float) -> set:
+        """Projects in a database with a backup, or an unchanged check, since a time"""
+
+        with self._connection() as connection:
+            rows = connection.execute(
+                "SELECT project FROM backups WHERE db_name = ? AND created_at >= ?"
+                " UNION SELECT project FROM events WHERE db_name = ? AND created_at >= ?",
+                (db_name, since, db_name, since),
+            ).fetchall()
+        return {x["project"] for x in rows}
+
+    def set_verification(self, backup_id: int, state: str):
+
+        if state not in VERIFY_STATES:
+            raise ValueError(f"Unknown verification state '{state}'")
+
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE backups SET verify_state = ?, verified_at = ? WHERE id = ?",
+                (state, time.time(), backup_id),
+            )
+
+    def verification_queue(self, reverify_before: float, limit: int = 100) -> list:
+        """
+        Backups due for verification, never-verified first, then least recently verified
+
+        Progress is kept in the catalog, so an interrupted sweep picks up where it stopped.
+        """
+
+        return self._query(
+            "SELECT * FROM backups WHERE verified_at IS NULL OR verified_at < ?"
+            " ORDER BY verified_at IS NOT NULL, verified_at, created_at LIMIT ?",
+            (reverify_before, limit),
+        )
+
+    def upload_queue(
+        self,
+        target: str,
+        projects: list = None,
+        databases: list = None,
+        limit: int = 50,
+    ) -> list:
+        """
+        Backups not yet uploaded to ``target``, oldest first
+
+        Args:
+            projects, databases (list, optional): Only these. Empty or ``None`` for all.
+        """
+
+        clauses = [
+            "NOT EXISTS (SELECT 1 FROM uploads"
+            " WHERE backup_id = backups.id AND target = ?)"
+        ]
+        params = [target]
+        for column, values in (("project", projects), ("db_name", databases)):
+            if values:
+                clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+
+        return self._query(
+            f"SELECT * FROM backups WHERE {' AND '.join(clauses)}"
+            " ORDER BY created_at LIMIT ?",
+            params + [limit],
+        )
+
+    def set_uploaded(self, backup_id: int, target: str):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO uploads (backup_id, target, uploaded_at)"
+                " VALUES (?, ?, ?)",
+                (backup_id, target, time.time()),
+            )
+
+    def uploaded_chunks(self, target: str, digests) -> set:
+        """Which of these chunks have already been uploaded to ``target``"""
+
+        digests = list(set(digests))
+        uploaded = set()
+
+        # Under SQLite's limit on query parameters
+        connection = self._connection()
+        for i in range(0, len(digests), 500):
+            batch = digests[i : i + 500]
+            uploaded.update(
+                x["digest"]
+                for x in connection.execute(
+                    "SELECT digest FROM uploaded_chunks WHERE target = ?"
+                    f" AND digest IN ({','.join('?' * len(batch))})",
+                    [target] + batch,
+                )
+            )
+
+        return uploaded
+
+    def add_uploaded_chunks(self, target: str, digests):
+        with self._connection() as connection:
+            now = time.time()
+            connection.executemany(
+                "INSERT OR REPLACE INTO uploaded_chunks (digest, target, uploaded_at)"
+                " VALUES (?, ?, ?)",
+                [(x, target, now) for x in set(digests)],
+            )
+
+    def add_timelines(self, backup_id: int, timelines: list, error: str = None):
+        """
+        Record a backup's timelines, replacing any recorded before
+
+        Args:
+            timelines (list[dict]): ``name``, ``clips`` and ``content_hash`` of each
+            error (str, optional): Why the backup couldn't be indexed
+        """
+
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM timelines WHERE backup_id = ?", (backup_id,)
+            )
+            connection.executemany(
+                "INSERT INTO timelines (backup_id, name, clips, content_hash)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (backup_id, x["name"], x["clips"], x["content_hash"])
+                    for x in timelines
+                ],
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO timeline_index (backup_id, indexed_at, error)"
+                " VALUES (?, ?, ?)",
+                (backup_id, time.time(), error),
+            )
+
+    def unindexed_timelines(self, limit: int = 50) -> list:
+        """Backups whose timelines haven't been indexed, newest first"""
+
+        return self._query(
+            "SELECT * FROM backups WHERE NOT EXISTS"
+            " (SELECT 1 FROM timeline_index WHERE backup_id = backups.id)"
+            " ORDER BY created_at DESC LIMIT ?",
+            (limit,),
+        )
+
+    def timeline_history(
+        self, name: str, project: str = None, db_name: str = None, exact: bool = False
+    ) -> list:
+        """
+        Every indexed appearance of matching timelines, oldest first per project and timeline
+
+        Args:
+            name (str): Timeline name, or part of one unless ``exact``. Case-insensitive.
+        """
+
+        if exact:
+            clauses, params = ["timelines.name = ? COLLATE NOCASE"], [name]
+        else:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses, params = ["timelines.name LIKE ? ESCAPE '\\'"], [f"%{escaped}%"]
+
+        for column, value in (("project", project), ("db_name", db_name)):
+            if value is not None:
+                clauses.append(f"backups.{column} = ?")
+                params.append(value)
+
+        with self._connection() as connection:
+            rows = connection.execute(
+                "SELECT timelines.name AS timeline, timelines.clips, timelines.content_hash,"
+                " backups.id AS backup_id, backups.db_name, backups.project,"
+                " backups.created_at, backups.path"
+                " FROM timelines JOIN backups ON backups.id = timelines.backup_id"
+                f" WHERE {' AND '.join(clauses)}"
+                " ORDER BY backups.db_name, backups.project, timelines.name, backups.created_at",
+                params,
+            ).fetchall()
+        return [dict(x) for x in rows]
+
+    def next_indexed_backup(self, db_name: str, project: str, after: float) -> dict:
+        """The first successfully indexed backup of a project after a time, if any"""
+
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT backups.id AS backup_id, backups.created_at, backups.path"
+                " FROM backups JOIN timeline_index ON timeline_index.backup_id = backups.id"
+                " WHERE db_name = ? AND project = ? AND created_at > ?"
+                " AND timeline_index.error IS NULL"
+                " ORDER BY created_at LIMIT 1",
+                (db_name, project, after),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def set_path(self, backup_id: int, path: str):
+        """Point a backup at its file's new location, e.g. once moved out of staging"""
+        with self._connection() as connection:
+            connection.execute(
+                "UPDATE backups SET path = ? WHERE id = ?", (path, backup_id)
+            )
+
+    def backups_under(self, directory: str) -> list:
+        """Backups whose files are directly in ``directory``, oldest first"""
+
+        directory = os.path.join(directory, "")
+        return [
+            x
+            for x in self._query(
+                "SELECT * FROM backups WHERE substr(path, 1, ?) = ?"
+                " ORDER BY created_at",
+                (len(directory), directory),
+            )
+            if os.path.dirname(x["path"]) == os.path.normpath(directory)
+        ]
+
+    def get(self, backup_id: int) -> dict:
+        rows = self._query("SELECT * FROM backups WHERE id = ?", (backup_id,))
+        return rows[0] if rows else None
+
+    def get_many(self, backup_ids: list) -> list:
+        """Backups by id, skipping any that don't exist"""
+
+        placeholders = ",".join("?" * len(backup_ids))
+        return self._query(
+            f"SELECT * FROM backups WHERE id IN ({placeholders}) ORDER BY created_at",
+            list(backup_ids),
+        )
+
+    def list_backups(
+        self,
+        project: str = None,
+        db_name: str = None,
+        since: float = None,
+        until: float = None,
+        limit: int = 50,
+    ) -> list:
+        """Most recent backups first, optionally filtered"""
+
+        clauses, params = self._filters(project, db_name, since, until)
+        return self._query(
+            f"SELECT * FROM backups {clauses} ORDER BY created_at DESC LIMIT ?",
+            params + [limit],
+        )
+
+    def latest(
+        self,
+        project: str,
+        db_name: str = None,
+        verified_only: bool = False,
+        before: float = None,
+    ) -> dict:
+        """
+        The most recent backup of a project
+
+        Args:
+            verified_only (bool, optional): Only consider backups that passed verification
+            before (float, optional): Only consider backups taken at or before this time
+        """
+
+        clauses, params = self._filters(project, db_name, None, before)
+        if verified_only:
+            clauses += " AND verify_state = 'ok'"
+        else:
+            clauses += " AND verify_state NOT IN ('corrupt', 'missing')"
+
+        rows = self._query(
+            f"SELECT * FROM backups {clauses} ORDER BY created_at DESC LIMIT 1",
+            params,
+        )
+        return rows[0] if rows else None
+
+    def find_by_digest(self, digest: str) -> list:
+        return self._query(
+            "SELECT backups.* FROM digests JOIN backups ON backups.id = digests.backup_id"
+            " WHERE digests.digest = ? ORDER BY created_at DESC",
+            (digest,),
+        )
+
+    def projects(self) -> list:
+        """Every backed up project with its backup count and latest backup time"""
+
+        with self._connection() as connection:
+            rows = connection.execute(
+                "SELECT db_name, project, COUNT(*) AS backups, MAX(created_at) AS latest"
+                " FROM backups GROUP BY db_name, project ORDER BY project"
+            ).fetchall()
+        return [dict(x) for x in rows]
+
+    def _filters(self, project, db_name, since, until) -> tuple:
+
+        clauses, params = [], []
+        for column, op, value in (
+            ("project", "=", project),
+            ("db_name", "=", db_name),
+            ("created_at", ">=", since),
+            ("created_at", "<=", until),
+        ):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+
+        return "WHERE " + (" AND ".join(clauses) or "1"), params
+
+    def _query(self, sql: str, params=()) -> list:
+        """Run a backup query, attaching each backup's digests"""
+
+        connection = self._connection()
+        rows = [dict(x) for x in connection.execute(sql, params).fetchall()]
+
+        if rows:
+            by_id = {x["id"]: x for x in rows}
+            for x in rows:
+                x["digests"] = dict()
+
+            placeholders = ",".join("?" * len(by_id))
+            for digest in connection.execute(
+                f"SELECT * FROM digests WHERE backup_id IN ({placeholders})",
+                list(by_id),
+            ):
+                by_id[digest["backup_id"]]["digests"][digest["algorithm"]] = digest[
+                    "digest"
+                ]
+
+        return rows
@@ -1,43 +1,38 @@
-import subprocess
+import logging
 import os
-import psutil
+import subprocess
 import sys
-from pyfiglet import Figlet
-from rich import print
-from pathlib import Path
-from distutils.sysconfig import get_python_lib
+from contextlib import contextmanager, suppress
+from datetime import datetime
 
-import requests
+import typer
+from rich import print
 
-fig = Figlet()
+# Keep imports here light, `rex` is often scripted from other tools.
+# Settings, requests, Resolve and friends load inside the commands that use them.
 
-sys.stdout.write(fig.renderText("rex"))
-print("[bold]Schedule and manage DaVinci Resolve project backups :t-rex:\n")
+cli_app = typer.Typer()
 
+logger = logging.getLogger(__name__)
 
-import logging
 
-import typer
-from rich.console import Console
-from rich.panel import Panel
+@cli_app.callback()
+def init():
+    """Schedule and manage DaVinci Resolve project backups"""
 
-from rex.settings.manager import SettingsManager
-from rex.app.utils.core import setup_rich_logging
-from requests import ConnectionError, ConnectTimeout
-from pydavinci.wrappers.project import Project
-from pydavinci import davinci
+    from rex.settings.manager import SettingsManager
+    from rex.app.utils.core import setup_rich_logging
 
-# Init classes
-console = Console()
-settings = SettingsManager()
+    # Only for people, not for scripts piping our output
+    if sys.stdout.isatty():
 
-cli_app = typer.Typer()
+        from pyfiglet import Figlet
 
-setup_rich_logging()
-logger = logging.getLogger(__name__)
-logger.setLevel(settings["app"]["loglevel"])
+        sys.stdout.write(Figlet().renderText("rex"))
+        print("[bold]Schedule and manage DaVinci Resolve project backups :t-rex:\n")
 
-tld = f"http://{settings['server']['ip']}:{settings['server']['port']}"
+    setup_rich_logging()
+    logger.setLevel(SettingsManager()["app"]["loglevel"])
 
 
 @cli_app.command()
@@ -51,11 +46,15 @@ def info():
     - Current project
     """
 
-    resolve_version = requests.get(f"{tld}/resolve_version").json()
-    databases = requests.get(f"{tld}/databases").json()
-    current_db = requests.get(f"{tld}/current_database").json()
-    all_projects = requests.get(f"{tld}/projects").json()
-    current_project = requests.get(f"{tld}/current_project").json()
+    from rich.panel import Panel
+    from rex.app.client import session, tld
+
+    info = session.get(f"{tld}/info").json()
+    resolve_version = info["resolve_version"]
+    databases = info["databases"]
+    current_db = info["current_database"]
+    project_count = info["project_count"]
+    current_project = info["current_project"]
 
     db_print = str()
     for x in databases:
@@ -69,7 +68,7 @@ def info():
         "[magenta bold]ACTIVE DATABASE[/]\n"
         f"{current_db['DbName']}\n\n"
         "[magenta bold]TOTAL PROJECTS[/]\n"
-        f"{len(all_projects)}\n\n"
+        f"{project_count}\n\n"
         f"[magenta bold]ACTIVE PROJECT[/]\n"
         f"{current_project}"
     )
@@ -77,122 +76,617 @@ def info():
     print(Panel(info_msg, title="[cyan]ENVIRONMENT INFO.", title_align="left"))
 
 
+@contextmanager
+def live_progress():
+    """
+    Show a backup job's progress events as they stream in, a bar per project
+
+    Yields:
+        The ``on_event`` callback for ``run_job``, or ``None`` if we're not in a
+        terminal (e.g. scripted), in which case nothing is shown
+    """
+
+    if not sys.stdout.isatty():
+        yield None
+        return
+
+    from rich.progress import (
+        BarColumn,
+        DownloadColumn,
+        Progress,
+        SpinnerColumn,
+        TextColumn,
+        TimeElapsedColumn,
+    )
+
+    progress = Progress(
+        SpinnerColumn(),
+        TextColumn("{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TextColumn("{task.fields[speed]}"),
+        TimeElapsedColumn(),
+    )
+    tasks = dict()
+
+    def on_event(event: dict):
+
+        if event["type"] == "database":
+            progress.console.print(f"[cyan]Backing up database '{event['database']}'")
+            return
+
+        project = event.get("project")
+        if project is None:
+            return
+
+        if event["type"] == "stage":
+            # A fresh bar per stage, its size unknown until bytes start flowing
+            if project in tasks:
+                progress.remove_task(tasks[project])
+            tasks[project] = progress.add_task(
+                f"{project} [dim]{event['stage']}", total=None, speed=""
+            )
+
+        elif event["type"] == "bytes" and project in tasks:
+            progress.update(
+                tasks[project],
+                completed=event["bytes"],
+                total=event["total"],
+                speed=f"{event['mb_per_sec']} MB/s",
+            )
+
+        elif event["type"] == "stage_done" and project in tasks:
+            if not event["success"]:
+                progress.update(
+                    tasks[project],
+                    description=f"[red]{project} {event['stage']} failed",
+                )
+                progress.stop_task(tasks[project])
+
+        elif event["type"] == "status":
+            if project in tasks:
+                progress.remove_task(tasks.pop(project))
+            status = "no changes" if event["status"] == "no-change" else "backed up"
+            progress.console.print(f"[green]{project}:[/] {status}")
+
+    with progress:
+        yield on_event
+
+
 @cli_app.command()
 def backup(
     dry_run: bool = typer.Option(
         False, help="Test run the backup command without actually writing files."
     ),
+    all_projects: bool = typer.Option(
+        False,
+        "--all",
+        help="Backup every project in the database, not just the active one.",
+    ),
+    all_databases: bool = typer.Option(
+        False,
+        help="Backup the configured projects in every configured database, "
+        "switching databases as few times as possible.",
+    ),
 ):
     """Backup the current Resolve project to configured path now"""
 
+    from rex.app.client import run_job
+
     print("[green]Backing up projects :inbox_tray:")
 
-    # 2 minute timeout
-    success = requests.get(f"{tld}/backup", timeout=120).json()
-    if not success:
+    # Runs as a server job, so long backups aren't cut off by a request timeout.
+    # Its progress streams in while we wait.
+    if all_databases:
+
+        with live_progress() as on_event:
+            job = run_job("backup_databases", on_event=on_event)
+        if job["state"] != "succeeded":
+            logger.error(f"[red]Back up {job['state']}... {job['error'] or ''}")
+            return False
+
+        summary = job["result"]
+        for database in summary["databases"]:
+
+            if database["error"]:
+                logger.error(f"[red]{database['error']}")
+                continue
+
+            for x in database.get("results", []):
+                if not x["success"]:
+                    logger.error(
+                        f"[red]'{x['project']}' in '{database['database']}' failed: {x['error']}"
+                    )
+
+            print(
+                f"[cyan]{database['database']}:[/] {database['succeeded']}/{database['total']} "
+                f"projects in {database['seconds']}s ({database['mb_per_sec']} MB/s), "
+                f"{database['skipped']} already done, switched in {database['switch_seconds']}s"
+            )
+
+        print(
+            f"[green]Backed up {summary['succeeded']}/{summary['total']} projects "
+            f"across {len(summary['databases'])} databases, "
+            f"{summary['switches']} database switches, in {summary['seconds']}s"
+        )
+        if summary["remaining"]:
+            logger.warning(
+                f"[yellow]Not finished, the next run resumes with: {', '.join(summary['remaining'])}"
+            )
+        return summary["failed"] == 0
+
+    if all_projects:
+
+        with live_progress() as on_event:
+            job = run_job("backup_all", on_event=on_event)
+        if job["state"] != "succeeded":
+            logger.error(f"[red]Back up {job['state']}... {job['error'] or ''}")
+            return False
+
+        summary = job["result"]
+        for x in summary["results"]:
+            if not x["success"]:
+                logger.error(f"[red]'{x['project']}' failed: {x['error']}")
+
+        print(
+            f"[green]Backed up {summary['succeeded']}/{summary['total']} projects "
+            f"in {summary['seconds']}s"
+        )
+        return summary["failed"] == 0
+
+    with live_progress() as on_event:
+        job = run_job("backup", on_event=on_event)
+    if job["state"] != "succeeded" or not job["result"]["success"]:
         logger.error("[red]Back up failed...")
         return False
 
+    if job["result"]["status"] == "no-change":
+        logger.info("[green]No changes since the last backup")
+        return True
+
     logger.info("[green]Succesfully backed up!")
     return True
 
 
+@cli_app.command()
+def restore(
+    project: str = typer.Argument(None, help="Project to restore."),
+    at: datetime = typer.Option(
+        None, help="Restore the latest backup as of this time. Defaults to now."
+    ),
+    backup_id: int = typer.Option(None, help="Restore this backup, from 'rex list'."),
+    database: str = typer.Option(None, help="Only restore backups from this database."),
+    verified: bool = typer.Option(
+        False, help="Only restore backups that have passed verification."
+    ),
+    stage_only: bool = typer.Option(
+        False, help="Rebuild and verify the .drp, but don't import it into Resolve."
+    ),
+):
+    """Restore a project from backup, into the current project manager folder under a new name"""
+
+    from rex.app.client import run_job
+
+    if project is None and backup_id is None:
+        logger.error("[red]Give a project to restore, or a --backup-id")
+        raise typer.Exit(1)
+
+    print("[green]Restoring backup :outbox_tray:")
+
+    job = run_job(
+        "restore",
+        project=project,
+        at=at.timestamp() if at else None,
+        backup_id=backup_id,
+        database=database,
+        verified_only=verified,
+        stage_only=stage_only,
+    )
+    if job["state"] != "succeeded":
+        logger.error(f"[red]Restore {job['state']}... {job['error'] or ''}")
+        raise typer.Exit(1)
+
+    report = job["result"]
+    backed_up = datetime.fromtimestamp(report["created_at"]).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+    print(
+        f"[green]Rebuilt backup {report['backup_id']} from {backed_up} "
+        f"at {report['mb_per_sec']} MB/s, verified {', '.join(report['verified']) or 'nothing'}"
+    )
+
+    if report["imported_as"]:
+        print(f"[green]Imported as '{report['imported_as']}'")
+    else:
+        print(f"[green]Staged at '{report['path']}'")
+
+
+@cli_app.command(name="list")
+def list_backups(
+    project: str = typer.Option(None, help="Only list backups of this project."),
+    database: str = typer.Option(None, help="Only list backups from this database."),
+    limit: int = typer.Option(20, help="Maximum number of backups to list."),
+):
+    """List catalogued backups, most recent first"""
+
+    from rich.table import Table
+    from rex.app.client import session, tld
+
+    backups = session.get(
+        f"{tld}/backups",
+        params={"project": project, "database": database, "limit": limit},
+    ).json()
+
+    table = Table(title="Backups", title_justify="left")
+    for column in ("ID", "Time", "Database", "Project", "Size", "Verified"):
+        table.add_column(column)
+
+    for x in backups:
+        table.add_row(
+            str(x["id"]),
+            datetime.fromtimestamp(x["created_at"]).strftime("%Y-%m-%d %H:%M:%S"),
+            x["db_name"],
+            x["project"],
+            f"{(x['size'] or 0) / 1024 ** 2:.1f} MB",
+            x["verify_state"],
+        )
+
+    print(table)
+
+
+@cli_app.command()
+def find_timeline(
+    name: str = typer.Argument(..., help="Timeline name, or part of one."),
+    project: str = typer.Option(None, help="Only search backups of this project."),
+    database: str = typer.Option(None, help="Only search backups from this database."),
+    exact: bool = typer.Option(False, help="Match the whole name, not part of it."),
+):
+    """Find which backups contain a timeline, and when it changed or disappeared"""
+
+    from rich.table import Table
+    from rex.app.client import session, tld
+
+    def when(backup):
+        return datetime.fromtimestamp(backup["created_at"]).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+
+    matches = session.get(
+        f"{tld}/timelines",
+        params={"name": name, "project": project, "database": database, "exact": exact},
+    ).json()
+
+    if not matches:
+        print(f"[yellow]No backups contain a timeline matching '{name}'")
+        return
+
+    for x in matches:
+
+        table = Table(
+            title=f"{x['timeline']} - {x['project']} ({x['database']})",
+            title_justify="left",
+        )
+        for column in ("Backup", "Time", "Clips", "Path"):
+            table.add_column(column)
+
+        for change in x["changes"]:
+            table.add_row(
+                str(change["backup_id"]),
+                when(change),
+                str(change["clips"]),
+                change["path"],
+            )
+        print(table)
+
+        last = x["last_seen"]
+        if x["gone_in"]:
+            print(
+                f"[yellow]Last in backup {last['backup_id']} ({when(last)}), "
+                f"gone from backup {x['gone_in']['backup_id']} ({when(x['gone_in'])})\n"
+            )
+        else:
+            print(
+                f"[green]Still in the latest backup, {last['backup_id']} ({when(last)})\n"
+            )
+
+
+@cli_app.command()
+def index_timelines():
+    """Index timelines of backups made before timeline indexing, so they can be searched"""
+
+    from rex.app.client import run_job
+
+    print("[green]Indexing timelines :card_index:")
+
+    job = run_job("index_timelines")
+    if job["state"] != "succeeded":
+        logger.error(f"[red]Indexing {job['state']}... {job['error'] or ''}")
+        return
+
+    report = job["result"]
+    print(f"[green]Indexed {report['indexed']} backups, {report['failed']} failed")
+    if report["remaining"]:
+        print(f"[yellow]{report['remaining']} left, run again to carry on")
+
+
+@cli_app.command()
+def verify():
+    """Verify checksums of backups that are due for an integrity check"""
+
+    from rex.app.client import run_job
+
+    print("[green]Verifying backups :mag:")
+
+    # Runs until the queue is empty or the configured time limit
+    job = run_job("verify")
+    if job["state"] != "succeeded":
+        logger.error(f"[red]Verification {job['state']}... {job['error'] or ''}")
+        return
+
+    report = job["result"]
+    for x in report["problems"]:
+        logger.error(f"[red]{x['state'].upper()}: '{x['path']}' - {x['error']}")
+
+    print(
+        f"[green]Verified {report['checked']} backups at {report['mb_per_sec']} MB/s: "
+        f"{report['ok']} ok, {report['corrupt']} corrupt, {report['missing']} missing"
+    )
+
+
+@cli_app.command()
+def upload():
+    """Upload new backups to the configured S3 bucket now"""
+
+    from rex.app.client import run_job
+
+    print("[green]Uploading backups :cloud:")
+
+    # Runs until everything is uploaded or the configured time limit
+    job = run_job("upload")
+    if job["state"] != "succeeded":
+        logger.error(f"[red]Upload {job['state']}... {job['error'] or ''}")
+        return
+
+    report = job["result"]
+    for x in report["problems"]:
+        logger.error(f"[red]Couldn't upload '{x['path']}' - {x['error']}")
+
+    print(
+        f"[green]Uploaded {report['uploaded']} backups at {report['mb_per_sec']} MB/s, "
+        f"{report['failed']} failed, {report['skipped_objects']} files already uploaded"
+    )
+
+
+@cli_app.command()
+def prune(
+    dry_run: bool = typer.Option(
+        False, help="List what would be pruned without deleting anything."
+    ),
+):
+    """Delete backups that fall outside the retention policy"""
+
+    from rich.table import Table
+    from rex.app.client import run_job
+
+    print(f"[green]{'Planning' if dry_run else 'Pruning'} old backups :wastebasket:")
+
+    job = run_job("prune", dry_run=dry_run)
+    if job["state"] != "succeeded" or job["result"] is None:
+        logger.error(
+            f"[red]Pruning {job['state']}... {job['error'] or 'already running'}"
+        )
+        return False
+
+    report = job["result"]
+    if dry_run:
+
+        counts = dict()
+        for x in report["backups"]:
+            key = (x["db_name"], x["project"])
+            counts[key] = counts.get(key, 0) + 1
+
+        table = Table(title="Would prune", title_justify="left")
+        for column in ("Database", "Project", "Backups"):
+            table.add_column(column)
+        for (db_name, project), count in sorted(counts.items()):
+            table.add_row(db_name, project, str(count))
+
+        print(table)
+        print(f"[green]{report['planned']} backups would be pruned")
+        return True
+
+    print(
+        f"[green]Pruned {report['pruned']} backups and {report['chunks_deleted']} chunks, "
+        f"freeing {report['bytes_freed'] / 1024 ** 2:.1f} MB in {report['seconds']}s"
+    )
+    if report["remaining"]:
+        print(f"[yellow]{report['remaining']} left, run again to carry on")
+    return True
+
+
+@cli_app.command()
+def train_dictionary(
+    database: str = typer.Option(
+        None, help="Database to train for. Defaults to the current one."
+    ),
+):
+    """Train a compression dictionary from a database's existing backups"""
+
+    from rex.app.client import session, tld
+
+    print("[green]Training compression dictionary :books:")
+
+    response = session.get(
+        f"{tld}/train_dictionary", params={"database": database}, timeout=None
+    )
+    if response.status_code != 200:
+        logger.error(f"[red]{response.json()['detail']}")
+        return
+
+    print(f"[green]Trained dictionary {response.json()}. New backups will use it.")
+
+
 @cli_app.command()
 def config():
     """Open user settings configuration file for editing"""
 
+    from rex.settings.manager import SettingsManager
+
     print("[green]Opening user settings file for modification")
-    typer.launch(settings.user_file)
+    typer.launch(SettingsManager().user_file)
 
 
-@cli_app.command()
-def up():
-    """Start the server and scheduler as background processes"""
+# Written to the working directory by Rex versions before the single daemon
+LEGACY_PID_FILES = ("server_pid", "scheduler_pid")
+
+
+def _stop_legacy():
+    """Stop a server or scheduler started by an older Rex, and remove its PID file"""
+
+    import psutil
+
+    for name in LEGACY_PID_FILES:
+
+        if not os.path.exists(name):
+            continue
+
+        try:
+            with open(name) as pid_file:
+                process = psutil.Process(int(pid_file.read()))
+            # The PID may have been reused since
+            if any("rex" in x for x in process.cmdline()):
+                process.terminate()
+                print(f"[magenta]Stopped old Rex process[/] (pid: {process.pid})")
+        except (ValueError, OSError, psutil.Error):
+            pass
+
+        with suppress(FileNotFoundError):
+            os.remove(name)
+
+
+def _start():
+
+    import time
+    from rex.app import daemon
+
+    _stop_legacy()
+
+    pid = daemon.running_pid()
+    if pid:
+        print(f"[yellow]Rex is already running[/] (pid: {pid})")
+        return
 
     print("[green]Starting Rex services")
-    package_dir = Path(get_python_lib()).resolve().parents[1]
-    scripts_dir = os.path.join(package_dir, "Scripts")
-    runner = os.path.abspath(os.path.join(scripts_dir, "python.exe"))
-    server = os.path.abspath(os.path.join(scripts_dir, "uvicorn.exe"))
 
-    def start_server():
+    # Detached, so it outlives this terminal
+    if sys.platform == "win32":
+        detach = dict(
+            creationflags=subprocess.DETACHED_PROCESS
+            | subprocess.CREATE_NEW_PROCESS_GROUP
+        )
+    else:
+        detach = dict(start_new_session=True)
 
-        # Run server command
+    os.makedirs(daemon.RUNTIME_DIR, exist_ok=True)
+    with open(daemon.LOG_FILE, "a") as log:
         proc = subprocess.Popen(
-            f"{runner} {server} rex.app.api:app --host {settings['server']['ip']} --port {settings['server']['port']}",
-            # stdout=subprocess.DEVNULL,
+            [sys.executable, "-m", "rex.app.daemon"],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            **detach,
         )
 
-        print(f"[magenta]Started server with pid: {proc.pid}")
+    # It writes its PID once it holds the lock, before loading anything heavy
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
 
-        # Write PID file
-        with open("server_pid", "w") as pid_file:
-            pid_file.write(str(proc.pid))
+        if proc.poll() is not None:
+            logger.error(f"[red]Rex failed to start, see '{daemon.LOG_FILE}'")
+            raise typer.Exit(1)
 
-    def start_scheduler():
+        if daemon.read_pid() == proc.pid:
+            print(f"[magenta]Started Rex with pid: {proc.pid}")
+            return
 
-        proc = subprocess.Popen(
-            f"{runner} ../rex/rex/app/scheduler.py",
-            # stdout=subprocess.DEVNULL,
-        )
-        print(f"[magenta]Started scheduler with pid: {proc.pid}")
+        time.sleep(0.02)
 
-        # Write PID file
-        with open("scheduler_pid", "w") as pid_file:
-            pid_file.write(str(proc.pid))
+    print(f"[yellow]Rex is still starting[/] (pid: {proc.pid})")
 
-    start_server()
-    start_scheduler()
 
+def _stop(timeout: float):
 
-@cli_app.command()
-def down():
-    """Stop the server and scheduler"""
+    import psutil
+    from rex.app import daemon
+
+    _stop_legacy()
+
+    pid = daemon.running_pid()
+    if pid is None:
+        print("[yellow]Rex is already stopped")
+        return
 
     print("[green]Stopping Rex services")
 
-    def kill_by_pid(pid):
-        try:
-            process = psutil.Process(pid)
-            for proc in process.children(recursive=True):
-                proc.kill()
-            process.kill()
-        except psutil.NoSuchProcess:
-            return False
-        return True
+    try:
+        process = psutil.Process(pid)
+        process.terminate()
+        process.wait(timeout)
+
+    except psutil.NoSuchProcess:
+        pass
+
+    except psutil.TimeoutExpired:
+        print(f"[yellow]Rex didn't stop within {timeout}s, killing it")
+        for proc in process.children(recursive=True):
+            proc.kill()
+        process.kill()
+
+    print(f"[magenta]Stopped Rex[/] (pid: {pid})")
 
-    with open("server_pid", "r") as pid_file:
-        server_pid = int(pid_file.read())
-        if not kill_by_pid(server_pid):
-            print(f"[yellow]Server is already stopped[/] (pid: {server_pid})")
 
-    with open("scheduler_pid", "r") as pid_file:
-        scheduler_pid = int(pid_file.read())
-        if not kill_by_pid(scheduler_pid):
-            print(f"[yellow]Scheduler is already stopped[/] (pid: {scheduler_pid})")
+STOP_TIMEOUT = typer.Option(
+    30, help="Seconds to let a running export finish before killing Rex"
+)
 
 
 @cli_app.command()
-def reload():
-    """
-    Reload the server and scheduler
+def up():
+    """Start the server and scheduler as a background process"""
+    _start()
 
-    Useful when needing to load configuration changes
-    """
-    down()
-    up()
 
+@cli_app.command()
+def down(timeout: float = STOP_TIMEOUT):
+    """Stop the server and scheduler"""
+    _stop(timeout)
 
-def init():
-    """Run before CLI App load"""
-    print()
+
+@cli_app.command()
+def reload(timeout: float = STOP_TIMEOUT):
+    """
+    Restart the server and scheduler
+
+    Settings changes are picked up by running services on their own.
+    This is only needed after changing the server's ip or port, or updating Rex.
+    """
+    _stop(timeout)
+    _start()
 
 
 def main():
     try:
-        init()
         cli_app()
-    except ConnectionError:
+    except Exception as e:
+
+        from requests import ConnectionError
+
+        if not isinstance(e, ConnectionError):
+            raise
+
+        from rex.settings.manager import SettingsManager
+
+        settings = SettingsManager()
         ip = settings["server"]["ip"]
         port = settings["server"]["port"]
         logger.error(
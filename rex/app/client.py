@@ -0,0 +1,116 @@
+import json
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rex.settings.manager import SettingsManager
+
+settings = SettingsManager()
+
+tld = f"http://{settings['server']['ip']}:{settings['server']['port']}"
+
+# One keep-alive connection pool for every call to the Rex server
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+# The server sends a keep-alive more often than this, even through a long export
+STREAM_READ_TIMEOUT = 60
+STREAM_RETRIES = 3
+
+
+def submit_job(kind: str = "backup", **params) -> dict:
+    """Queue a job on the Rex server and return it without waiting"""
+
+    response = session.post(f"{tld}/jobs", json={"kind": kind, **params})
+    response.raise_for_status()
+    return response.json()
+
+
+def wait_for_job(job_id: str, poll_interval: float = 1.0) -> dict:
+    """Poll a job until it finishes, however long that takes"""
+
+    while True:
+
+        response = session.get(f"{tld}/jobs/{job_id}")
+        response.raise_for_status()
+
+        job = response.json()
+        if job["state"] in FINISHED_STATES:
+            return job
+
+        time.sleep(poll_interval)
+
+
+def stream_job(job_id: str, on_event, poll_interval: float = 1.0) -> dict:
+    """
+    Follow a job's progress events until it finishes
+
+    A dropped stream is resumed. If it keeps dropping, falls back to polling,
+    so a flaky connection never abandons the job.
+
+    Args:
+        on_event: Called with each progress event, a dict with a ``type``
+
+    Returns:
+        dict: The finished job
+    """
+
+    after = 0
+    for _ in range(STREAM_RETRIES):
+        try:
+            with session.get(
+                f"{tld}/jobs/{job_id}/events",
+                params={"after": after},
+                stream=True,
+                timeout=(5, STREAM_READ_TIMEOUT),
+            ) as response:
+                response.raise_for_status()
+
+                name = None
+                for line in response.iter_lines(decode_unicode=True):
+
+                    if line.startswith("event:"):
+                        name = line[6:].strip()
+
+                    elif line.startswith("data:"):
+                        data = json.loads(line[5:])
+                        if name == "done":
+                            return data
+                        after = data["seq"]
+                        on_event(data)
+
+        except requests.RequestException:
+            # Resume from the last event seen
+            continue
+
+    return wait_for_job(job_id, poll_interval)
+
+
+def run_job(
+    kind: str = "backup", poll_interval: float = 1.0, on_event=None, **params
+) -> dict:
+    """
+    Queue a job and wait for it to finish
+
+    Interrupting the wait (Ctrl+C) cancels the job on the server too.
+
+    Args:
+        on_event (optional): Called with each of the job's progress events as they
+            happen, streamed from the server rather than polled
+
+    Returns:
+        dict: The finished job, with its ``state``, ``result`` and ``error``
+    """
+
+    job = submit_job(kind, **params)
+    try:
+        if on_event:
+            return stream_job(job["id"], on_event, poll_interval)
+        return wait_for_job(job["id"], poll_interval)
+
+    except KeyboardInterrupt:
+        session.delete(f"{tld}/jobs/{job['id']}")
+        raise
@@ -0,0 +1,282 @@
+import glob
+import logging
+import os
+import threading
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Optional dependency, only needed with compression enabled
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_SUFFIX = ".zst"
+DICTIONARIES_DIR = ".dictionaries"  # In the static dir
+
+REPACK_BLOCK_SIZE = 1024 * 1024
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError(
+            "Compression needs the 'zstandard' package. "
+            "Install it with 'pip install zstandard' or disable compression."
+        )
+
+
+class _HashingReader:
+    """File wrapper that feeds everything read through it to a hasher"""
+
+    def __init__(self, file, hasher):
+        self.file = file
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.hasher.update(data)
+        return data
+
+
+class _HashingWriter:
+    """File wrapper that feeds everything written through it to a hasher"""
+
+    def __init__(self, file, hasher=None):
+        self.file = file
+        self.hasher = hasher
+        self.written = 0
+
+    def write(self, data):
+        if self.hasher:
+            self.hasher.update(data)
+        self.written += len(data)
+        return self.file.write(data)
+
+
+def repack_stored(src: str, dest: str, progress=None) -> int:
+    """
+    Rewrite a .drp with its members stored rather than deflated
+
+    Resolve deflates each member of a .drp, and zstd can't compress deflated data
+    any further, or find what's repeated across backups in it. The uncompressed
+    members compress to about half. The result is still a valid .drp, with the
+    same member names, timestamps and CRCs.
+
+    Args:
+        progress (ByteCounter, optional): Fed the uncompressed member bytes
+
+    Returns:
+        int: Size of the repacked file, or 0 if ``src`` isn't a zip and nothing was written
+    """
+
+    try:
+        archive = zipfile.ZipFile(src)
+    except zipfile.BadZipFile:
+        return 0
+
+    with archive, zipfile.ZipFile(dest, "x", zipfile.ZIP_STORED) as repacked:
+        for info in archive.infolist():
+
+            stored = zipfile.ZipInfo(info.filename, info.date_time)
+            stored.external_attr = info.external_attr
+            stored.comment = info.comment
+
+            if info.is_dir():
+                repacked.writestr(stored, b"")
+                continue
+
+            with archive.open(info) as member, repacked.open(
+                stored, "w", force_zip64=info.file_size >= zipfile.ZIP64_LIMIT
+            ) as out:
+                for data in iter(lambda: member.read(REPACK_BLOCK_SIZE), b""):
+                    if progress:
+                        progress.update(data)
+                    out.write(data)
+
+    return os.path.getsize(dest)
+
+
+class DictionaryStore:
+    """
+    Trained zstd dictionaries, one lineage per Resolve database
+
+    Saved as ``<db_name>.<dict_id>.zdict``. Retraining adds a new file rather
+    than replacing the old one, since older backups still need theirs to decompress.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._by_id = dict()
+        self._lock = threading.Lock()
+
+    def current(self, db_name: str):
+        """Most recently trained dictionary for a database, or ``None``"""
+
+        paths = glob.glob(os.path.join(self.root, glob.escape(db_name) + ".*.zdict"))
+        if not paths:
+            return None
+        return self._load(max(paths, key=os.path.getmtime))
+
+    def by_id(self, dict_id: int):
+        """
+        Raises:
+            FileNotFoundError: If no dictionary with that id has been saved
+        """
+
+        with self._lock:
+            if dict_id not in self._by_id:
+                paths = glob.glob(os.path.join(self.root, f"*.{dict_id}.zdict"))
+                if not paths:
+                    raise FileNotFoundError(f"Missing zstd dictionary {dict_id}")
+                self._by_id[dict_id] = self._load(paths[0])
+            return self._by_id[dict_id]
+
+    def train(self, db_name: str, samples: list, size: int):
+        """
+        Train and save a new dictionary for a database
+
+        Args:
+            samples (list[bytes]): Representative pieces of existing backups
+            size (int): Dictionary size in bytes
+
+        Returns:
+            zstandard.ZstdCompressionDict: The new dictionary
+        """
+
+        _require_zstandard()
+
+        dictionary = zstandard.train_dictionary(size, samples)
+        os.makedirs(self.root, exist_ok=True)
+
+        path = os.path.join(self.root, f"{db_name}.{dictionary.dict_id()}.zdict")
+        with open(path, "wb") as file:
+            file.write(dictionary.as_bytes())
+
+        logger.info(f"Trained {size} byte dictionary for '{db_name}' -> '{path}'")
+        return dictionary
+
+    def _load(self, path: str):
+        _require_zstandard()
+        with open(path, "rb") as file:
+            return zstandard.ZstdCompressionDict(file.read())
+
+
+class Compressor:
+    """
+    zstd compression for backups and chunks
+
+    Compression contexts aren't thread-safe, so each thread gets its own.
+    """
+
+    def __init__(self, level: int = 3, threads: int = 0, dictionary=None):
+        """
+        Args:
+            level (int, optional): zstd level, 1-22. Defaults to 3.
+            threads (int, optional): Worker threads for streaming compression.
+                0 compresses on the calling thread, -1 uses every core. Defaults to 0.
+            dictionary (zstandard.ZstdCompressionDict, optional): Trained dictionary
+        """
+
+        _require_zstandard()
+
+        self.level = level
+        self.threads = threads
+        self.dictionary = dictionary
+        self._local = threading.local()
+
+    def _context(self, threads: int = 0):
+
+        contexts = getattr(self._local, "contexts", None)
+        if contexts is None:
+            contexts = self._local.contexts = dict()
+
+        if threads not in contexts:
+            contexts[threads] = zstandard.ZstdCompressor(
+                level=self.level,
+                dict_data=self.dictionary,
+                threads=threads,
+                write_checksum=True,
+            )
+        return contexts[threads]
+
+    def compress(self, data: bytes) -> bytes:
+        """One-shot compression, for chunks"""
+        return self._context().compress(data)
+
+    def compress_file(self, src: str, dest: str, hasher=None, progress=None) -> int:
+        """
+        Stream a file through zstd
+
+        Args:
+            src (str): File to compress
+            dest (str): Compressed file to create
+            hasher (MultiHasher, optional): Fed the compressed bytes as they're written,
+                so the stored file's checksums need no extra read.
+            progress (ByteCounter, optional): Fed the uncompressed bytes as they're read
+
+        Returns:
+            int: Compressed size in bytes
+        """
+
+        with open(src, "rb") as src_file, open(dest, "xb") as dest_file:
+            writer = _HashingWriter(dest_file, hasher)
+            self._context(self.threads).copy_stream(
+                _HashingReader(src_file, progress) if progress else src_file,
+                writer,
+                size=os.fstat(src_file.fileno()).st_size,
+            )
+
+        return writer.written
+
+
+class Decompressor:
+    """Decompress zstd data, finding whichever dictionary it was compressed with"""
+
+    def __init__(self, dictionaries: DictionaryStore = None):
+
+        _require_zstandard()
+        self.dictionaries = dictionaries
+        self._local = threading.local()
+
+    def _context(self, frame_header: bytes):
+
+        dict_id = zstandard.get_frame_parameters(frame_header).dict_id
+
+        contexts = getattr(self._local, "contexts", None)
+        if contexts is None:
+            contexts = self._local.contexts = dict()
+
+        if dict_id not in contexts:
+            dictionary = None
+            if dict_id:
+                if self.dictionaries is None:
+                    raise FileNotFoundError(f"Missing zstd dictionary {dict_id}")
+                dictionary = self.dictionaries.by_id(dict_id)
+            contexts[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+
+        return contexts[dict_id]
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._context(data[:18]).decompress(data)
+
+    def iter_file(self, path: str, read_size: int = 1024 * 1024, hasher=None):
+        """
+        Yield a compressed file's original contents
+
+        Args:
+            hasher (MultiHasher, optional): Fed the compressed bytes as they're read
+        """
+
+        with open(path, "rb") as file:
+
+            header = file.read(18)
+            file.seek(0)
+
+            source = _HashingReader(file, hasher) if hasher else file
+            with self._context(header).stream_reader(source) as reader:
+                while True:
+                    data = reader.read(read_size)
+                    if not data:
+                        return
+                    yield data
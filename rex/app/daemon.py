@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+from contextlib import suppress
+
+from rex.settings.manager import SettingsManager
+
+settings = SettingsManager()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings["app"]["loglevel"])
+
+# Alongside the user settings, so each user gets their own daemon
+RUNTIME_DIR = os.path.dirname(settings.user_file)
+LOCK_FILE = os.path.join(RUNTIME_DIR, "rex.lock")
+PID_FILE = os.path.join(RUNTIME_DIR, "rex.pid")
+LOG_FILE = os.path.join(RUNTIME_DIR, "rex.log")
+
+
+def _lock(file):
+    if sys.platform == "win32":
+        import msvcrt
+
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+class DaemonLock:
+    """
+    Makes sure only one daemon runs, and records its PID while it does
+
+    The lock is an OS file lock, dropped when the process exits however it exits,
+    so a PID file left behind by a crash never blocks the next start.
+    """
+
+    def __init__(self, lock_file: str = LOCK_FILE, pid_file: str = PID_FILE):
+        self.lock_file = lock_file
+        self.pid_file = pid_file
+        self._file = None
+
+    def acquire(self, write_pid: bool = True) -> bool:
+        """
+        Returns:
+            bool: ``False`` if another process holds the lock
+        """
+
+        os.makedirs(os.path.dirname(self.lock_file), exist_ok=True)
+        self._file = open(self.lock_file, "a+")
+        try:
+            _lock(self._file)
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+
+        if write_pid:
+            with open(self.pid_file, "w") as file:
+                file.write(str(os.getpid()))
+        return True
+
+    def release(self, remove_pid: bool = True):
+
+        if self._file is None:
+            return
+
+        if remove_pid:
+            with suppress(FileNotFoundError):
+                os.remove(self.pid_file)
+
+        # Closing drops the lock
+        self._file.close()
+        self._file = None
+
+
+def read_pid() -> int:
+    """The PID in the PID file, which may be left over from a crash"""
+
+    try:
+        with open(PID_FILE) as file:
+            return int(file.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def running_pid() -> int:
+    """The running daemon's PID, or ``None`` if it isn't running"""
+
+    lock = DaemonLock()
+    if lock.acquire(write_pid=False):
+        lock.release(remove_pid=False)
+        return None
+
+    # Locked, but maybe not written yet
+    return read_pid()
+
+
+def in_process_dispatcher(jobs, job_kinds: dict):
+    """
+    Run the scheduler's jobs straight on the server's job queue, no HTTP involved
+
+    Args:
+        jobs (JobQueue): The server's job queue
+        job_kinds (dict): Job functions by kind
+    """
+
+    async def dispatch(kind: str, **params) -> dict:
+
+        job = jobs.submit(kind, job_kinds[kind], **params)
+        try:
+            await asyncio.wrap_future(job.future)
+        except asyncio.CancelledError:
+            # Shutting down
+            jobs.cancel(job.id)
+            raise
+        except Exception:
+            # Recorded on the job
+            pass
+        return job.to_dict()
+
+    return dispatch
+
+
+async def serve():
+    """Run the API server and the scheduler on this event loop until the server stops"""
+
+    import uvicorn
+    from rex.app import api, scheduler
+
+    scheduler.set_dispatcher(in_process_dispatcher(api.jobs, api.JOB_KINDS))
+
+    server = uvicorn.Server(
+        uvicorn.Config(
+            api.app,
+            host=str(settings["server"]["ip"]),
+            port=settings["server"]["port"],
+            log_level=settings["app"]["loglevel"].lower(),
+            # Its loggers go through our queue like everything else's
+            log_config=None,
+        )
+    )
+
+    # The server's /metrics covers the scheduler too, they share the process
+    scheduling = asyncio.ensure_future(scheduler.run_scheduler(serve_metrics=False))
+
+    def scheduler_stopped(task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"[red]Scheduler stopped: {task.exception()}")
+            server.should_exit = True
+
+    scheduling.add_done_callback(scheduler_stopped)
+
+    try:
+        await server.serve()
+
+    finally:
+        scheduling.cancel()
+        with suppress(asyncio.CancelledError):
+            await scheduling
+
+        # Queued jobs are dropped, a running export finishes before the process exits
+        for job in api.jobs.list():
+            api.jobs.cancel(job.id)
+
+
+def main():
+
+    from rex.app.utils.logs import setup_queued_logging, stop_queued_logging
+
+    lock = DaemonLock()
+    if not lock.acquire():
+        logger.error(f"[red]Rex is already running (pid: {read_pid()})")
+        sys.exit(1)
+
+    # `rex down` sends SIGTERM. Exit through the cleanup below rather than dying.
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+    # Logging never holds up a request or a backup
+    setup_queued_logging()
+
+    try:
+        logger.info(f"[green]Rex running (pid: {os.getpid()})")
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_queued_logging()
+        lock.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import collections
+import os
+import random
+import threading
+import time
+import zipfile
+
+# Project data per zip member. Real .drp files are many small XML files too.
+BLOCK_SIZE = 64 * 1024
+
+# Fixed, so unchanged members are byte-identical across exports
+_ZIP_DATE = (2022, 1, 1, 0, 0, 0)
+
+
+def make_drp(
+    path: str, blocks: list, seed: str = "", timelines: int = 5, clips: int = 20
+):
+    """
+    Write a synthetic .drp
+
+    A zip with a project XML holding ``timelines`` timelines of ``clips`` clips each,
+    plus one XML member per block of bulk project data. Each block's content only
+    depends on ``seed``, its index and its version in ``blocks``, so bumping a
+    block's version changes that member alone, like an edit would.
+
+    Args:
+        path (str): Where to write it
+        blocks (list[int]): Version of each ``BLOCK_SIZE`` block of data
+        seed (str, optional): Makes different projects' data different
+    """
+
+    def member(name: str, data: str):
+        info = zipfile.ZipInfo(name, _ZIP_DATE)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        # Fastest level, so benchmarks measure Rex rather than making the fake .drp
+        archive.writestr(info, data, compresslevel=1)
+
+    with zipfile.ZipFile(path, "w") as archive:
+
+        project = "".join(
+            f"<SM_Timeline><Name>Timeline {i + 1}</Name>"
+            + '<Sm2TiVideoClip Duration="240"/>' * clips
+            + "</SM_Timeline>"
+            for i in range(timelines)
+        )
+        member("project.xml", f"<SM_Project>{project}</SM_Project>")
+
+        for i, version in enumerate(blocks):
+            rng = random.Random(f"{seed}/{i}/{version}")
+            # Hex, so it compresses some. Real project XML compresses better.
+            data = rng.getrandbits(BLOCK_SIZE * 4).to_bytes(BLOCK_SIZE // 2, "little")
+            data = data.hex()
+            member(f"MediaPool/Master/Bin{i}.xml", f"<Bin><Data>{data}</Data></Bin>")
+
+
+class FakeFolder:
+    def __init__(self, clips: int):
+        self.clips = [None] * clips
+        self.subfolders = []
+
+
+class FakeMediaPool:
+    def __init__(self, clips: int):
+        self.root_folder = FakeFolder(clips)
+
+
+class FakeProject:
+    def __init__(self, name: str, manager, clips: int = 100):
+        self.name = name
+        self.mediapool = FakeMediaPool(clips)
+        self._manager = manager
+
+    @property
+    def timeline_count(self) -> int:
+        # Probes see the edits made since each export, if there are any
+        return self._manager.edits(self.name)
+
+
+class FakeProjectManager:
+    """
+    Stands in for pydavinci's project manager, with synthetic projects
+
+    Each export of a project is a new revision: about ``change_rate`` of its
+    blocks are changed first, then it's written after ``export_latency`` seconds.
+    """
+
+    def __init__(
+        self,
+        projects: int = 10,
+        folders: int = 0,
+        size_mb: float = 8,
+        change_rate: float = 0.05,
+        export_latency: float = 0.0,
+        db_name: str = "Local",
+        databases: int = 1,
+        switch_latency: float = 0.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            projects (int, optional): Projects in each folder
+            folders (int, optional): Subfolders of the root, one level deep
+            size_mb (float, optional): Project data per project, before zip compression
+            change_rate (float, optional): Fraction of blocks changed per export
+            export_latency (float, optional): Seconds each export takes, on top of writing it
+            databases (int, optional): Databases, each with the same layout of projects.
+                The first is ``db_name``, then ``db_name`` 2 and so on.
+            switch_latency (float, optional): Seconds switching database takes
+        """
+
+        self.change_rate = change_rate
+        self.export_latency = export_latency
+        self.switch_latency = switch_latency
+        self.db_list = [
+            {"DbName": db_name if i == 0 else f"{db_name} {i + 1}", "DbType": "Disk"}
+            for i in range(databases)
+        ]
+        self.db = self.db_list[0]
+        self.exports = 0
+        self.switches = 0
+
+        self._blocks = max(int(size_mb * 1024**2 / BLOCK_SIZE), 1)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._revisions = dict()
+        self._exported = collections.Counter()
+
+        self._trees = {
+            x["DbName"]: {
+                "projects": [f"Project {i + 1}" for i in range(projects)],
+                "folders": {
+                    f"Folder {f + 1}": {
+                        "projects": [
+                            f"Folder {f + 1} Project {i + 1}" for i in range(projects)
+                        ],
+                        "folders": {},
+                    }
+                    for f in range(folders)
+                },
+            }
+            for x in self.db_list
+        }
+        self._path = []
+
+    def _node(self) -> dict:
+        node = self._trees[self.db["DbName"]]
+        for x in self._path:
+            node = node["folders"][x]
+        return node
+
+    @property
+    def projects(self) -> list:
+        return list(self._node()["projects"])
+
+    @property
+    def folders(self) -> list:
+        return list(self._node()["folders"])
+
+    @property
+    def current_folder(self) -> str:
+        return self._path[-1] if self._path else ""
+
+    def open_folder(self, name: str) -> bool:
+        if name not in self._node()["folders"]:
+            return False
+        self._path.append(name)
+        return True
+
+    def goto_parent_folder(self) -> bool:
+        if not self._path:
+            return False
+        self._path.pop()
+        return True
+
+    def goto_root_folder(self) -> bool:
+        self._path = []
+        return True
+
+    def set_db(self, db_info: dict) -> bool:
+        """Switch database. Like Resolve, this goes back to the root folder."""
+
+        match = [x for x in self.db_list if x["DbName"] == db_info.get("DbName")]
+        if not match:
+            return False
+
+        time.sleep(self.switch_latency)
+        self.db = match[0]
+        self._path = []
+        self.switches += 1
+        return True
+
+    def edits(self, project_name: str) -> int:
+        """Revisions exported so far, or 0 if the project never changes"""
+        with self._lock:
+            key = (self.db["DbName"], project_name)
+            return self._exported[key] if self.change_rate else 0
+
+    def revise(self, project_name: str) -> list:
+        """Change about ``change_rate`` of a project's blocks, as an edit would"""
+
+        key = (self.db["DbName"], project_name)
+        with self._lock:
+            self._exported[key] += 1
+            blocks = self._revisions.get(key)
+            if blocks is None:
+                blocks = self._revisions[key] = [0] * self._blocks
+                return list(blocks)
+
+            changed = self._rng.sample(
+                range(len(blocks)), round(len(blocks) * self.change_rate)
+            )
+            for i in changed:
+                blocks[i] += 1
+            return list(blocks)
+
+    def export_project(
+        self, project_name: str, path: str, stills_and_luts: bool = True
+    ) -> bool:
+
+        if project_name not in self._node()["projects"]:
+            return False
+
+        blocks = self.revise(project_name)
+        time.sleep(self.export_latency)
+        make_drp(path, blocks, seed=f"{self.db['DbName']}/{project_name}")
+
+        with self._lock:
+            self.exports += 1
+        return True
+
+    def import_project(self, path: str, project_name: str = None) -> bool:
+
+        if not os.path.exists(path):
+            return False
+
+        name = project_name or os.path.splitext(os.path.basename(path))[0]
+        if name in self._node()["projects"]:
+            return False
+
+        self._node()["projects"].append(name)
+        return True
+
+
+class FakeResolve:
+    """
+    Stands in for ``pydavinci.davinci.Resolve``, so Rex runs without Resolve
+
+    Set the ``REX_FAKE_RESOLVE`` environment variable to have Rex use one, or pass one
+    as ``resolve`` wherever Rex takes it. The variable can hold ``FakeProjectManager``
+    options, e.g. ``REX_FAKE_RESOLVE="projects=20,size_mb=32,export_latency=2"``.
+    """
+
+    version = "18.0.0 (fake)"
+
+    def __init__(self, **kwargs):
+        """Keyword arguments are passed to ``FakeProjectManager``"""
+
+        self.project_manager = FakeProjectManager(**kwargs)
+        self.project = FakeProject(
+            self.project_manager.projects[0], self.project_manager
+        )
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "FakeResolve":
+        """From comma-separated ``option=value`` pairs. Anything else means defaults."""
+
+        kwargs = dict()
+        for x in spec.split(","):
+            if "=" in x:
+                key, value = (y.strip() for y in x.split("=", 1))
+                kwargs[key] = value if key == "db_name" else float(value)
+
+        for key in ("projects", "folders", "databases", "seed"):
+            if key in kwargs:
+                kwargs[key] = int(kwargs[key])
+
+        return cls(**kwargs)
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+
+def probe_project(project) -> dict:
+    """
+    Take cheap measurements of a project's state from Resolve
+
+    Only possible for the active project. Probing a project means loading it,
+    which would interrupt the editor, so any failure just returns ``None``.
+
+    Returns:
+        dict: ``timeline_count`` and ``media_pool_items``, or ``None``
+    """
+
+    try:
+
+        media_pool_items = 0
+        folders = [project.mediapool.root_folder]
+        while folders:
+            folder = folders.pop()
+            media_pool_items += len(folder.clips)
+            folders.extend(folder.subfolders)
+
+        return {
+            "timeline_count": project.timeline_count,
+            "media_pool_items": media_pool_items,
+        }
+
+    except Exception as e:
+        logger.debug(f"Couldn't probe project: {e}")
+        return None
+
+
+def content_hash(filepath: str) -> str:
+    """
+    Hash the content of an exported .drp, ignoring how it was packaged
+
+    A .drp is a zip of the project XML, stills and LUTs. Re-exporting an untouched
+    project gives a different file (member timestamps, ordering), so we hash the
+    sorted member names with their CRC32s and sizes from the zip's central directory
+    instead. That's the uncompressed content, without decompressing anything.
+    """
+
+    hasher = hashlib.blake2b(digest_size=32)
+
+    try:
+        with zipfile.ZipFile(filepath) as archive:
+            for info in sorted(archive.infolist(), key=lambda x: x.filename):
+                hasher.update(
+                    f"{info.filename}\0{info.CRC:08x}\0{info.file_size}\n".encode()
+                )
+
+    except zipfile.BadZipFile:
+        # Not a zip, hash it raw
+        with open(filepath, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+class FingerprintCache:
+    """
+    Persisted per-project record of the last backed up state
+
+    Lets the backup pipeline skip projects nobody has touched,
+    either before exporting (probes match) or after (content matches).
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str):
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = dict()
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as file:
+                    self._entries = json.load(file)
+            except (OSError, ValueError) as e:
+                logger.warning(f"[yellow]Ignoring unreadable fingerprint cache: {e}")
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            return dict(self._entries.get(key, {}))
+
+    def update(self, key: str, **values):
+        with self._lock:
+            self._entries.setdefault(key, {}).update(values)
+            self._save()
+
+    def record_backup(self, key: str, probes: dict, content: str):
+        self.update(
+            key,
+            probes=probes,
+            content_hash=content,
+            last_backup=time.time(),
+            last_event="backup",
+            unchanged_count=0,
+        )
+
+    def record_unchanged(self, key: str):
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            entry["last_checked"] = time.time()
+            entry["last_event"] = "no-change"
+            entry["unchanged_count"] = entry.get("unchanged_count", 0) + 1
+            self._save()
+
+    def _save(self):
+
+        # Atomic replace, the cache is read at the start of every backup
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(self._entries, file)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = {
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+}
+
+# Optional fast path. Not cryptographic, but plenty for catching bit-rot.
+try:
+    import xxhash
+
+    ALGORITHMS["xxh64"] = xxhash.xxh64
+    ALGORITHMS["xxh3_128"] = xxhash.xxh3_128
+
+except ImportError:
+    pass
+
+BUFFER_SIZE = 1024 * 1024
+
+# Files at least this big are mapped instead of read into a buffer
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+class MultiHasher:
+    """
+    Compute several digests over a single pass of the data
+
+    Feed it from any stream (a file read, a chunker, a compressor) so
+    checksumming never needs its own extra read of the backup.
+    """
+
+    def __init__(self, algorithms=("blake2b",), progress=None):
+        """
+        Args:
+            progress (ByteCounter, optional): Also fed everything hashed
+        """
+
+        unknown = [x for x in algorithms if x not in ALGORITHMS]
+        if unknown:
+            raise ValueError(
+                f"Unsupported hash algorithm(s): {unknown}. "
+                f"Available: {list(ALGORITHMS)}"
+            )
+
+        self._hashers = {x: ALGORITHMS[x]() for x in algorithms}
+        self.bytes_hashed = 0
+        self.progress = progress
+
+    def update(self, data):
+        for hasher in self._hashers.values():
+            hasher.update(data)
+        self.bytes_hashed += len(data)
+        if self.progress:
+            self.progress.update(data)
+
+    def hexdigests(self) -> dict:
+        return {name: hasher.hexdigest() for name, hasher in self._hashers.items()}
+
+
+def hash_file(
+    filepath: str,
+    algorithms=("blake2b",),
+    buffer_size: int = BUFFER_SIZE,
+    progress=None,
+) -> dict:
+    """
+    Hash a file with one or more algorithms in a single read
+
+    Large files are memory-mapped, smaller ones are read into a reused buffer.
+    Either way the data is fed to the hashers in ``buffer_size`` slices,
+    which lets hashlib release the GIL while it works.
+
+    Args:
+        filepath (str): File to hash
+        algorithms (tuple, optional): Algorithm names from ``ALGORITHMS``. Defaults to ("blake2b",).
+        buffer_size (int, optional): Bytes hashed per update. Defaults to 1MiB.
+        progress (ByteCounter, optional): Fed the bytes as they're hashed
+
+    Returns:
+        dict: hex digests keyed by algorithm name
+    """
+
+    hasher = MultiHasher(algorithms, progress)
+
+    with open(filepath, "rb") as file:
+
+        size = os.fstat(file.fileno()).st_size
+
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, size, buffer_size):
+                        hasher.update(view[offset : offset + buffer_size])
+                finally:
+                    view.release()
+
+        else:
+            buffer = bytearray(buffer_size)
+            view = memoryview(buffer)
+            while True:
+                read = file.readinto(buffer)
+                if not read:
+                    break
+                hasher.update(view[:read])
+
+    return hasher.hexdigests()
+
+
+def hash_files(paths, algorithms=("blake2b",), max_workers: int = None):
+    """
+    Hash many files in parallel on a thread pool
+
+    Args:
+        paths (iterable): Files to hash
+        algorithms (tuple, optional): Algorithm names from ``ALGORITHMS``. Defaults to ("blake2b",).
+        max_workers (int, optional): Thread count. Defaults to the CPU count.
+
+    Yields:
+        tuple: ``(path, digests, error)`` in completion order.
+        ``digests`` is ``None`` and ``error`` the exception if hashing failed.
+    """
+
+    max_workers = max_workers or os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+
+        futures = {pool.submit(hash_file, x, algorithms): x for x in paths}
+
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                yield path, future.result(), None
+            except Exception as e:
+                yield path, None, e
+
+
+def sidecar_path(filepath: str, algorithm: str) -> str:
+    return f"{filepath}.{algorithm}"
+
+
+def write_sidecars(filepath: str, digests: dict):
+    """Write each digest to a ``<filepath>.<algorithm>`` sidecar file"""
+
+    for algorithm, digest in digests.items():
+        with open(sidecar_path(filepath, algorithm), "x") as sidecar:
+            sidecar.write(digest)
+
+
+def read_sidecars(filepath: str) -> dict:
+    """Read any known-algorithm sidecar files that exist for ``filepath``"""
+
+    digests = {}
+    for algorithm in ALGORITHMS:
+        path = sidecar_path(filepath, algorithm)
+        if os.path.exists(path):
+            with open(path, "r") as sidecar:
+                digests[algorithm] = sidecar.read().strip()
+
+    return digests
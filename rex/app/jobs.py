@@ -0,0 +1,229 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from rex.app import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+# Progress events kept per job. Streams that fall further behind skip ahead.
+MAX_EVENTS = 1000
+
+# The Resolve scripting bridge isn't safe to drive from several threads at once.
+# Jobs hold this while they run, and anything else calling Resolve takes it too.
+resolve_lock = threading.RLock()
+
+
+def call_resolve(func, *args, **kwargs):
+    """Call ``func`` holding ``resolve_lock``, so never alongside a job or another caller"""
+
+    with resolve_lock:
+        return func(*args, **kwargs)
+
+
+class Job:
+    def __init__(self, kind: str, params: dict):
+
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+        # Checked by long-running jobs between units of work
+        self.cancel_event = threading.Event()
+        self.future = None
+
+        # Progress, numbered so a stream can pick up where it left off
+        self.events = deque(maxlen=MAX_EVENTS)
+        self._seq = 0
+        self._listeners = []
+        self._events_lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("succeeded", "failed", "cancelled")
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "progress": self.events[-1] if self.events else None,
+        }
+
+    def emit(self, **event):
+        """Record a progress event and wake anything streaming them. Safe from any thread."""
+
+        with self._events_lock:
+            self._seq += 1
+            self.events.append({"seq": self._seq, "time": time.time(), **event})
+            listeners = list(self._listeners)
+
+        for func in listeners:
+            func()
+
+    def events_since(self, seq: int) -> list:
+        with self._events_lock:
+            return [x for x in self.events if x["seq"] > seq]
+
+    def listen(self, func):
+        """Call ``func()``, from the emitting thread, whenever there's a new event"""
+        with self._events_lock:
+            self._listeners.append(func)
+
+    def unlisten(self, func):
+        with self._events_lock:
+            self._listeners.remove(func)
+
+
+class JobQueue:
+    """
+    Run blocking work (Resolve calls, mostly) off the API's event loop
+
+    Jobs run on a dedicated executor, each holding ``resolve_lock``. The Resolve
+    scripting bridge isn't safe to drive from several threads at once, so that's
+    a single worker by default, and API routes calling Resolve wait for the job.
+    Kinds in ``background_kinds`` never call Resolve. They run on a pool of their
+    own without the lock, so a long upload doesn't hold backups up.
+    Finished jobs are kept for status queries, up to ``keep`` of them.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        keep: int = 100,
+        background_kinds=(),
+        background_workers: int = 2,
+    ):
+
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="rex-jobs")
+        self.background = ThreadPoolExecutor(
+            background_workers, thread_name_prefix="rex-jobs-background"
+        )
+        self.background_kinds = set(background_kinds)
+        self.keep = keep
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, func, **params) -> Job:
+        """
+        Queue ``func(job)`` to run on the executor
+
+        Args:
+            kind (str): Job type, for display
+            func: Called with the ``Job``. Its return value becomes the job's result.
+            **params: Stored on the job for ``func`` and for display
+
+        Returns:
+            Job: The queued job
+        """
+
+        job = Job(kind, params)
+
+        # Never published without its future, or cancelling it in between would fail
+        executor = self.background if kind in self.background_kinds else self.executor
+        with self._lock:
+            job.future = executor.submit(self._run, job, func)
+            self._jobs[job.id] = job
+            self._prune()
+
+        return job
+
+    def _run(self, job: Job, func):
+
+        background = job.kind in self.background_kinds
+        with nullcontext() if background else resolve_lock:
+            return self._run_locked(job, func)
+
+    def _run_locked(self, job: Job, func):
+
+        # Cancelled as it was picked up, too late for the future to be cancelled
+        if job.cancel_event.is_set():
+            job.state = "cancelled"
+            job.finished_at = time.time()
+            job.emit(type="state", state=job.state)
+            return
+
+        job.state = "running"
+        job.started_at = time.time()
+        job.emit(type="state", state=job.state)
+        metrics.JOB_WAIT_SECONDS.observe(job.started_at - job.created_at, kind=job.kind)
+        logger.info(f"Started {job.kind} job {job.id}")
+
+        try:
+            job.result = func(job)
+            job.state = "cancelled" if job.cancel_event.is_set() else "succeeded"
+
+        except Exception as e:
+            logger.exception(f"[red]{job.kind} job {job.id} failed")
+            job.error = str(e)
+            job.state = "failed"
+
+        finally:
+            job.finished_at = time.time()
+            metrics.JOB_SECONDS.observe(
+                job.finished_at - job.started_at, kind=job.kind, state=job.state
+            )
+            job.emit(type="state", state=job.state)
+
+        return job.result
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def depth(self) -> int:
+        """Jobs waiting or running"""
+        with self._lock:
+            return sum(not x.done for x in self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job
+
+        Queued jobs never start. Running jobs are asked to stop at their next
+        checkpoint - a Resolve export already in progress can't be interrupted.
+
+        Returns:
+            bool: ``False`` if the job doesn't exist or has already finished
+        """
+
+        job = self.get(job_id)
+        if job is None or job.done:
+            return False
+
+        job.cancel_event.set()
+        if job.future.cancel():
+            job.state = "cancelled"
+            job.finished_at = time.time()
+            job.emit(type="state", state=job.state)
+
+        return True
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond ``keep``"""
+
+        finished = [x.id for x in self._jobs.values() if x.done]
+        for job_id in finished[: max(len(finished) - self.keep, 0)]:
+            del self._jobs[job_id]
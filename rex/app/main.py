@@ -1,12 +1,31 @@
 import logging
 import os
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import suppress
 from datetime import datetime
 from rich import print
 from rich import traceback as rich_tracebacks
 
 from rex.settings.manager import SettingsManager
-import hashlib
-from pydavinci import davinci
+from rex.app.store import CHUNKS_DIR, ChunkStore, MANIFEST_SUFFIX
+from rex.app import hashing, metrics
+from rex.app.catalog import Catalog
+from rex.app.compression import (
+    COMPRESSED_SUFFIX,
+    DICTIONARIES_DIR,
+    Compressor,
+    DictionaryStore,
+    repack_stored,
+)
+from rex.app.reader import iter_backup
+from rex.app.fingerprint import FingerprintCache, content_hash, probe_project
+from rex.app.activity import get_io_throttle
+from rex.app.progress import ByteCounter
+from rex.app.staging import Promoter
+from rex.app.timelines import parse_timelines
 
 rich_tracebacks.install()
 settings = SettingsManager()
@@ -14,65 +33,745 @@ settings = SettingsManager()
 logger = logging.getLogger(__name__)
 logger.setLevel(settings["app"]["loglevel"])
 
-resolve = davinci.Resolve()
+_resolve = None
+
+
+def get_resolve():
+    """
+    Connect to Resolve on first use, so importing doesn't need it running
+
+    With ``REX_FAKE_RESOLVE`` set, a ``FakeResolve`` with synthetic projects is used
+    instead, e.g. for benchmarks on machines without Resolve.
+    """
+
+    global _resolve
+    if _resolve is None:
+
+        spec = os.environ.get("REX_FAKE_RESOLVE")
+        if spec:
+            from rex.app.fake_resolve import FakeResolve
+
+            _resolve = FakeResolve.from_spec(spec)
+
+        else:
+            from pydavinci import davinci
+
+            _resolve = davinci.Resolve()
+
+    return _resolve
+
+
+_fingerprint_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_fingerprint_cache() -> FingerprintCache:
+    """Shared fingerprint cache, so concurrent backups don't clobber each other"""
+
+    global _fingerprint_cache
+    with _shared_lock:
+        if _fingerprint_cache is None:
+            _fingerprint_cache = FingerprintCache(
+                os.path.join(
+                    os.path.normpath(settings["backup"]["static_dir"]),
+                    ".fingerprints.json",
+                )
+            )
+    return _fingerprint_cache
+
+
+_catalog = None
+
+
+def get_catalog() -> Catalog:
+    """Shared backup catalog"""
+
+    global _catalog
+    with _shared_lock:
+        if _catalog is None:
+            _catalog = Catalog(os.path.expanduser(settings["catalog"]["path"]))
+    return _catalog
+
+
+_promoter = None
+
+
+def get_promoter() -> Promoter:
+    """Shared mover of backups from the staging dir into the static dir"""
+
+    global _promoter
+    catalog = get_catalog()
+    with _shared_lock:
+        if _promoter is None:
+            staging = settings["staging"]
+            _promoter = Promoter(
+                catalog,
+                staging_dir(),
+                os.path.normpath(settings["backup"]["static_dir"]),
+                max_bytes=int(staging["max_gb"] * 1024**3),
+                workers=staging["workers"],
+                retries=staging["retries"],
+            )
+    return _promoter
+
+
+def shutdown_promoter():
+    """Stop moving staged backups, if anything started to. The rest resume next time."""
+
+    with _shared_lock:
+        if _promoter is not None:
+            _promoter.shutdown()
+
+
+def staging_dir() -> str:
+    path = os.path.expanduser(settings["staging"]["dir"]) or os.path.join(
+        tempfile.gettempdir(), "rex-staging"
+    )
+    return os.path.normpath(path)
+
+
+_compressors = dict()
+
+
+def get_dictionary_store() -> DictionaryStore:
+    return DictionaryStore(
+        os.path.join(
+            os.path.normpath(settings["backup"]["static_dir"]), DICTIONARIES_DIR
+        )
+    )
+
+
+def get_compressor(db_name: str) -> Compressor:
+    """Shared compressor for a database, using its trained dictionary if there is one"""
+
+    with _shared_lock:
+        if db_name not in _compressors:
+
+            dictionary = None
+            if settings["compression"]["dictionary"]:
+                dictionary = get_dictionary_store().current(db_name)
+
+            _compressors[db_name] = Compressor(
+                level=settings["compression"]["level"],
+                threads=settings["compression"]["threads"],
+                dictionary=dictionary,
+            )
+
+    return _compressors[db_name]
+
+
+def _reset_shared(changed: set):
+    """Rebuild shared objects on next use if their settings were reloaded"""
+
+    global _catalog, _fingerprint_cache, _promoter
+    with _shared_lock:
+
+        if changed & {"backup", "compression"}:
+            _compressors.clear()
+        if "backup" in changed:
+            _fingerprint_cache = None
+        if "catalog" in changed:
+            _catalog = None
+        if changed & {"backup", "catalog", "staging"} and _promoter is not None:
+            # Moves already queued finish on the old one
+            _promoter = None
+
+
+settings.subscribe(_reset_shared)
+
+
+def train_dictionary(db_name: str, max_backups: int = 200) -> int:
+    """
+    Train a compression dictionary for a database from its recent backups
+
+    Samples are chunk-sized pieces of the backups' uncompressed members, since
+    that's what the compressor sees once backups are repacked. About 100 times the
+    dictionary size is sampled in total, spread across backups.
+
+    Returns:
+        int: The new dictionary's id
+
+    Raises:
+        ValueError: If there aren't enough backups to train from
+    """
+
+    dict_size = settings["compression"]["dictionary_size_kb"] * 1024
+    piece_size = settings["backup"]["chunk_size_kb"] * 1024
+    budget = dict_size * 100
+    per_backup = max(budget // 20, piece_size)
+
+    samples = []
+    sampled = 0
+
+    for backup in get_catalog().list_backups(db_name=db_name, limit=max_backups):
+
+        taken = 0
+        try:
+            for piece in _member_pieces(backup, piece_size):
+                samples.append(piece)
+                taken += len(piece)
+                if taken >= per_backup:
+                    break
+
+        except Exception as e:
+            logger.warning(f"[yellow]Skipping '{backup['path']}' for training: {e}")
+
+        sampled += taken
+        if sampled >= budget:
+            break
+
+    if len(samples) < 10:
+        raise ValueError(
+            f"Not enough backups of '{db_name}' to train a dictionary from"
+        )
+
+    dictionary = get_dictionary_store().train(db_name, samples, dict_size)
+
+    with _shared_lock:
+        _compressors.pop(db_name, None)
+
+    return dictionary.dict_id()
+
+
+def _member_pieces(backup: dict, piece_size: int):
+    """Yield a backup's uncompressed .drp members, a piece at a time"""
+
+    # Zips are read from the end, so it needs to be in a file
+    with tempfile.TemporaryFile() as file:
+        for data in iter_backup(backup):
+            file.write(data)
+
+        with zipfile.ZipFile(file) as archive:
+            for info in archive.infolist():
+                with archive.open(info) as member:
+                    yield from iter(lambda: member.read(piece_size), b"")
+
+
+def folder_path(project_manager) -> tuple:
+    """
+    Names of the folders from the root down to the project manager's current folder
+
+    Resolve only gives the current folder's name, so this walks up to the root
+    and back down again. Don't call it while exports in the folder are running.
+    """
+
+    path = []
+    while True:
+        name = project_manager.current_folder
+        if not project_manager.goto_parent_folder():
+            break
+        path.insert(0, name)
+
+    for name in path:
+        project_manager.open_folder(name)
+
+    return tuple(path)
 
 
 class Backup:
-    def __init__(self):
+    def __init__(
+        self,
+        project_name: str = None,
+        resolve=None,
+        progress=None,
+        folder: tuple = None,
+    ):
+        """
+        Args:
+            project_name (str, optional): Project in the project manager's current folder.
+                Defaults to the active project.
+            resolve (optional): Resolve object to back up from. Defaults to the live connection.
+            progress (optional): Called with the fields of each progress event as keyword
+                arguments: stage changes, and bytes processed with throughput. E.g. ``Job.emit``.
+            folder (tuple, optional): Names of the folders down to the current one from the root.
+                Found by walking the project manager up and back down if not given.
+        """
 
         # TODO: Ensure no wrongful file collisions
         # Use database name, type, ip address, and project path/folder structure in project manager
         # to create a unique hash for the backup name. Keep the timestamp. So backups are still unique.
 
-        self.project = resolve.project
-        self.db_name = resolve.project_manager.db["DbName"]
-        self.timestamp = datetime.now().strftime("%H%M%S")
+        self.resolve = resolve or get_resolve()
+        self.project_name = project_name or self.resolve.project.name
+        self.db_name = self.resolve.project_manager.db["DbName"]
+        self.created_at = time.time()
+        self.timestamp = datetime.fromtimestamp(self.created_at).strftime("%H%M%S")
 
-        self.backup_filename = (
-            f"{self.db_name}_{self.project.name}_{self.timestamp}.drp"
-        )
         self.static_dir = os.path.normpath(settings["backup"]["static_dir"])
-        self.backup_filepath = os.path.join(self.static_dir, self.backup_filename)
+        # Where it's exported and processed. If it's staged, it's moved to static_dir after.
+        self.work_dir = self.static_dir
+        if settings["staging"]["enabled"]:
+            self.work_dir = staging_dir()
+            os.makedirs(self.work_dir, exist_ok=True)
+
+        self.backup_filename = self._unique_filename(
+            f"{self.db_name}_{self.project_name}_{self.timestamp}"
+        )
+        self._set_paths()
+        self.storage = "drp"  # "manifest" or "zst" once processed
+        self.checksum_algorithms = settings["backup"]["checksum_algorithms"]
+        self.digests = dict()
+        self.chunks = None  # Chunk digests, if deduplicated
+        self.timelines = None  # For the search index, once parsed
+        self.timelines_error = None
+        self.size = None
+        self.bytes_written = None  # To storage, if not the whole export
+        self.backup_id = None
+        self.timings = dict()
+
+        # Projects in different folders can share a name
+        if folder is None:
+            folder = folder_path(self.resolve.project_manager)
+        self.folder = tuple(folder)
+        self.fingerprint_key = "/".join((self.db_name, *self.folder, self.project_name))
+        self.probes = None
+        self.content_fingerprint = None
+        self.status = None  # "backup" or "no-change" once run
+        self.progress = progress
 
         print(f"Backup Name: '{self.backup_filename}'")
         print(f"Backup Path: '{self.static_dir}'")
 
+    def _set_paths(self):
+
+        self.backup_filepath = os.path.join(self.work_dir, self.backup_filename)
+        # Manifests go straight to the store, alongside the chunks they point to.
+        # Only new chunks are written there, read from the staged export.
+        self.manifest_filepath = (
+            os.path.join(self.static_dir, self.backup_filename) + MANIFEST_SUFFIX
+        )
+        self.compressed_filepath = self.backup_filepath + COMPRESSED_SUFFIX
+        self.stored_filepath = self.backup_filepath
+
+    def _unique_filename(self, name: str) -> str:
+        """``name``.drp, numbered if a backup in any storage already has that name"""
+
+        filename, n = f"{name}.drp", 2
+        while any(
+            os.path.exists(os.path.join(directory, filename) + suffix)
+            for directory in {self.static_dir, self.work_dir}
+            for suffix in ("", MANIFEST_SUFFIX, COMPRESSED_SUFFIX)
+        ):
+            # Same project, same time of day
+            filename = f"{name}_{n}.drp"
+            n += 1
+
+        return filename
+
     def run(self, generate_checksum: bool = True) -> bool:
         """
         Run the backup routine
 
         Args:
-            generate_checksum (bool, optional): Generate an md5 checksum file alongside project backup .drp. Defaults to True.
+            generate_checksum (bool, optional): Write checksum sidecar files alongside project backup .drp. Defaults to True.
+
+        If ``backup.deduplicate`` is enabled, the exported .drp is split into chunks in the
+        static dir's chunk store and replaced with a small manifest to rebuild it from.
+        Checksums are computed during chunking, so the export is only read once.
+
+        If ``compression.enabled``, the backup (or each new chunk) is compressed with zstd.
+
+        If ``backup.skip_unchanged`` is enabled and the project hasn't changed since its
+        last backup, no new backup is written and ``status`` is set to "no-change".
         """
 
+        if self.unchanged_since_last_backup():
+            return True
+
         logger.info("Exporting project backup...")
-        if not self.export_project():
+        if not self._timed("export", self.export_project):
             return False
 
-        if generate_checksum:
+        return self.finalize(generate_checksum)
+
+    def finalize(self, generate_checksum: bool = True) -> bool:
+        """
+        Post-export processing: de-duplication, compression and checksums
+
+        Doesn't touch Resolve, so it can run while the next project exports.
+        """
+
+        if self.export_unchanged():
+            return True
+
+        # While it's still a plain .drp
+        if settings["backup"]["index_timelines"]:
+            self._timed("index", self.index_timelines)
+
+        # zstd gets nowhere with deflated members. If this fails it's compressed as is.
+        if settings["compression"]["enabled"]:
+            self._timed("repack", self.repack)
+
+        if settings["backup"]["deduplicate"]:
+            logger.info("De-duplicating backup...")
+            if not self._timed("deduplicate", self.deduplicate):
+                return False
+
+        elif settings["compression"]["enabled"]:
+            logger.info("Compressing backup...")
+            if not self._timed("compress", self.compress):
+                return False
+
+        elif generate_checksum:
             logger.info("Generating checksum...")
-            if not self.generate_checksum():
+            if not self._timed("checksum", self.generate_checksum):
+                return False
+
+        if generate_checksum:
+            if not self.write_checksums():
                 return False
 
+        logger.info(
+            "Timings: " + ", ".join(f"{k} {v}s" for k, v in self.timings.items())
+        )
+
+        self.status = "backup"
+        if settings["backup"]["skip_unchanged"]:
+            get_fingerprint_cache().record_backup(
+                self.fingerprint_key, self.probes, self.content_fingerprint
+            )
+
+        return self.record()
+
+    def _timed(self, stage: str, func) -> bool:
+
+        # Exports time and report themselves, bulk backups call them directly
+        if stage != "export":
+            self._emit(type="stage", stage=stage)
+
+        start = time.perf_counter()
+        success = func()
+        seconds = time.perf_counter() - start
+        self.timings[stage] = round(seconds, 3)
+
+        if stage != "export":
+            metrics.STAGE_SECONDS.observe(seconds, stage=stage)
+            if not success:
+                metrics.STAGE_FAILURES.inc(stage=stage)
+            self._emit(
+                type="stage_done",
+                stage=stage,
+                seconds=round(seconds, 3),
+                success=success,
+            )
+
+        return success
+
+    def _emit(self, **event):
+        if self.progress:
+            self.progress(project=self.project_name, **event)
+
+    def _counter(self, stage: str, total: int = None) -> ByteCounter:
+        # Post-export I/O backs off while Resolve is busy, e.g. playing back
+        throttle = get_io_throttle()
+        # Nothing to count into if nobody's listening or throttling
+        if not self.progress and throttle is None:
+            return None
+        return ByteCounter(self._emit, stage, total, throttle=throttle)
+
+    def record(self) -> bool:
+        """Add the finished backup to the catalog"""
+
+        try:
+            if self.size is None:
+                self.size = os.path.getsize(self.backup_filepath)
+
+            self.backup_id = get_catalog().add_backup(
+                db_name=self.db_name,
+                project=self.project_name,
+                filename=self.backup_filename,
+                path=self.stored_filepath,
+                storage=self.storage,
+                size=self.size,
+                digests=self.digests,
+                created_at=self.created_at,
+                chunks=self.chunks,
+            )
+            if self.timelines is not None:
+                get_catalog().add_timelines(
+                    self.backup_id, self.timelines, self.timelines_error
+                )
+
+            if os.path.dirname(self.stored_filepath) != self.static_dir:
+                get_promoter().submit(self.backup_id)
+
+            metrics.BACKUPS.inc(status=self.status)
+            metrics.BACKUP_BYTES.inc(self.size, storage=self.storage)
+            metrics.BYTES_WRITTEN.inc(
+                self.size if self.bytes_written is None else self.bytes_written,
+                storage=self.storage,
+            )
+            self._emit(type="status", status=self.status, backup_id=self.backup_id)
+            return True
+
+        except Exception as e:
+            logger.error(e)
+            return False
+
+    def index_timelines(self) -> bool:
+        """Parse the export's timelines for the search index. Never fails the backup."""
+
+        try:
+            self.timelines = parse_timelines(self.backup_filepath)
+
+        except Exception as e:
+            logger.warning(f"[yellow]Couldn't index timelines: {e}")
+            self.timelines = []
+            self.timelines_error = str(e)
+
         return True
 
-    def export_project(self) -> bool:
-        return resolve.project_manager.export_project(
-            project_name=self.project.name,
-            path=self.backup_filepath,
-            stills_and_luts=True,
+    def unchanged_since_last_backup(self) -> bool:
+        """
+        Check cheap project probes against the last backup, before exporting
+
+        Only the active project can be probed. Probes can't see edits inside a
+        timeline, so this is opt-in with ``backup.skip_on_probes``, and an export
+        is forced once ``backup.max_skip_minutes`` have passed.
+        """
+
+        if not settings["backup"]["skip_unchanged"]:
+            return False
+
+        project = self.resolve.project
+        if project is None or project.name != self.project_name:
+            return False
+
+        # Taken regardless, so they're recorded with the export's fingerprint
+        self.probes = probe_project(project)
+        if not settings["backup"]["skip_on_probes"]:
+            return False
+
+        last = get_fingerprint_cache().get(self.fingerprint_key)
+
+        if self.probes is None or last.get("probes") != self.probes:
+            return False
+
+        max_age = settings["backup"]["max_skip_minutes"] * 60
+        if time.time() - last.get("last_backup", 0) > max_age:
+            return False
+
+        self._record_unchanged()
+        return True
+
+    def export_unchanged(self) -> bool:
+        """
+        Compare the fresh export's content with the last backup's
+
+        Catches what the probes can't. If nothing changed, the export is discarded.
+        """
+
+        self.content_fingerprint = None
+        if not settings["backup"]["skip_unchanged"]:
+            return False
+
+        try:
+            self.content_fingerprint = content_hash(self.backup_filepath)
+        except Exception as e:
+            logger.warning(f"[yellow]Couldn't fingerprint export: {e}")
+            return False
+
+        last = get_fingerprint_cache().get(self.fingerprint_key)
+        if last.get("content_hash") != self.content_fingerprint:
+            return False
+
+        # Probes can change without the content changing, e.g. an empty bin
+        if self.probes is not None and last.get("probes") != self.probes:
+            get_fingerprint_cache().update(self.fingerprint_key, probes=self.probes)
+
+        os.remove(self.backup_filepath)
+        self._record_unchanged()
+        return True
+
+    def _record_unchanged(self):
+        logger.info(f"No changes to '{self.project_name}' since last backup")
+        get_fingerprint_cache().record_unchanged(self.fingerprint_key)
+        self.status = "no-change"
+        metrics.BACKUPS.inc(status=self.status)
+        self._emit(type="status", status=self.status, backup_id=None)
+
+        try:
+            get_catalog().add_event(self.db_name, self.project_name, self.status)
+        except Exception as e:
+            logger.warning(f"[yellow]Couldn't record event in catalog: {e}")
+
+    def prepare_export(self, attempt: int = 1) -> str:
+        """
+        Decide where the export goes, waiting for staging space first if need be
+
+        Args:
+            attempt (int, optional): Retries get a new filename, since an export that
+                was given up on may still be writing the last one
+
+        Returns:
+            str: Path to export to
+        """
+
+        if attempt > 1:
+            self.backup_filename = self._unique_filename(
+                f"{self.db_name}_{self.project_name}_{self.timestamp}_retry{attempt - 1}"
+            )
+            self._set_paths()
+
+        if self.work_dir != self.static_dir:
+            self._wait_for_staging()
+
+        return self.backup_filepath
+
+    def export_project(self, path: str = None) -> bool:
+        """
+        Args:
+            path (str, optional): From ``prepare_export``. Defaults to preparing one now.
+        """
+
+        path = path or self.prepare_export()
+
+        # Resolve doesn't report export progress, so there's only the start and end
+        self._emit(type="stage", stage="export")
+        start = time.perf_counter()
+
+        success = False
+        try:
+            with metrics.STAGE_SECONDS.time(stage="export"):
+                success = self.resolve.project_manager.export_project(
+                    project_name=self.project_name,
+                    path=path,
+                    stills_and_luts=True,
+                )
+            return success
+
+        finally:
+            if not success:
+                metrics.STAGE_FAILURES.inc(stage="export")
+            self._emit(
+                type="stage_done",
+                stage="export",
+                seconds=round(time.perf_counter() - start, 3),
+                success=success,
+            )
+
+    def _wait_for_staging(self):
+        """Hold the export while staging is full. If it stays full, skip staging."""
+
+        wait = settings["staging"]["wait_seconds"]
+        if get_promoter().wait_for_space(wait):
+            return
+
+        logger.warning(
+            f"[yellow]Staging still full after {wait}s, "
+            "exporting straight to the backup store"
         )
+        self.work_dir = self.static_dir
+        self._set_paths()
 
     def generate_checksum(self) -> bool:
         try:
-            hash_md5 = hashlib.md5()
-            with open(self.backup_filepath, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
+            counter = self._counter("checksum", os.path.getsize(self.backup_filepath))
+            self.digests = hashing.hash_file(
+                self.backup_filepath, self.checksum_algorithms, progress=counter
+            )
+            if counter:
+                counter.finish()
+            return True
+
+        except Exception as e:
+            logger.error(e)
+            return False
+
+    def write_checksums(self) -> bool:
+
+        # Manifest digests are of the original .drp, so name them after it
+        if self.storage == "manifest":
+            sidecar_base = os.path.join(self.static_dir, self.backup_filename)
+        else:
+            sidecar_base = self.stored_filepath
+
+        try:
+            hashing.write_sidecars(sidecar_base, self.digests)
+            return True
+
+        except Exception as e:
+            logger.error(e)
+            return False
+
+    def deduplicate(self) -> bool:
+        try:
+            compressor = None
+            if settings["compression"]["enabled"]:
+                compressor = get_compressor(self.db_name)
+
+            store = ChunkStore(
+                os.path.join(self.static_dir, CHUNKS_DIR),
+                avg_chunk_size=settings["backup"]["chunk_size_kb"] * 1024,
+                compressor=compressor,
+            )
+            counter = self._counter(
+                "deduplicate", os.path.getsize(self.backup_filepath)
+            )
+            hasher = hashing.MultiHasher(self.checksum_algorithms, counter)
+            stats = store.ingest(self.backup_filepath, self.manifest_filepath, hasher)
+            if counter:
+                counter.finish()
+            self.digests = hasher.hexdigests()
+            self.size = stats["size"]
+            self.bytes_written = stats["bytes_written"]
+            self.chunks = store.referenced_chunks([self.manifest_filepath])
+            os.remove(self.backup_filepath)
+
+            self.stored_filepath = self.manifest_filepath
+            self.storage = "manifest"
+
+            logger.info(
+                f"Stored {stats['new_chunks']} of {stats['chunks']} chunks "
+                f"({stats['bytes_written']} of {stats['size']} bytes written)"
+            )
+            return True
+
+        except Exception as e:
+            logger.error(e)
+            return False
+
+    def repack(self) -> bool:
+        """Store the export's members uncompressed, for zstd to compress instead"""
+
+        repacked_filepath = self.backup_filepath + ".stored"
+        try:
+            counter = self._counter("repack")
+            if repack_stored(self.backup_filepath, repacked_filepath, counter):
+                os.replace(repacked_filepath, self.backup_filepath)
+            if counter:
+                counter.finish()
+            return True
+
+        except Exception as e:
+            logger.error(e)
+            with suppress(FileNotFoundError):
+                os.remove(repacked_filepath)
+            return False
+
+    def compress(self) -> bool:
+        """Compress the export with zstd, hashing the compressed bytes as they're written"""
+
+        try:
+            hasher = hashing.MultiHasher(self.checksum_algorithms)
+            self.size = os.path.getsize(self.backup_filepath)
+            counter = self._counter("compress", self.size)
+            stored_size = get_compressor(self.db_name).compress_file(
+                self.backup_filepath, self.compressed_filepath, hasher, counter
+            )
+            if counter:
+                counter.finish()
+            self.digests = hasher.hexdigests()
+            self.bytes_written = stored_size
+            os.remove(self.backup_filepath)
 
-            with open(self.backup_filepath + ".md5", "x") as checksum_file:
-                checksum_file.write(hash_md5.hexdigest())
+            self.stored_filepath = self.compressed_filepath
+            self.storage = "zst"
 
+            logger.info(
+                f"Compressed {self.size} to {stored_size} bytes "
+                f"({stored_size / max(self.size, 1):.1%})"
+            )
             return True
 
         except Exception as e:
@@ -0,0 +1,301 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds. Covers API calls through to long exports.
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+    600,
+    1800,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {labels}")
+        return tuple(labels[x] for x in self.labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key: tuple, value) -> list:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down
+
+    Pass ``func`` to read the value when scraped instead of setting it.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), func=None):
+        super().__init__(name, help, labels)
+        self.func = func
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list:
+        if self.func is not None:
+            self.set(self.func())
+        return super().render()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: tuple = (), buckets=DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Per-bucket counts, then the sum. Made cumulative when rendered.
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the ``with`` block takes, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key: tuple, value) -> list:
+
+        lines, total = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), value[:-1]):
+            total += count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(
+                f"{self.name}_bucket{_format_labels(self.labels, key, le)} {total}"
+            )
+
+        labels = _format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(value[-1])}")
+        lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics for this process, rendered on request
+
+    Recording is a dict update under a lock, so instrumenting hot paths is cheap.
+    Nothing is formatted until something scrapes ``render()``.
+    """
+
+    def __init__(self):
+        self._metrics = dict()
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Re-registering (e.g. on module reload) returns the original
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(x for m in metrics for x in m.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels: tuple = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, labels: tuple = (), func=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labels, func))
+
+
+def histogram(
+    name: str, help: str, labels: tuple = (), buckets=DEFAULT_BUCKETS
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """
+    Serve ``/metrics`` from a background thread
+
+    For processes without the API server, like the scheduler.
+    """
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(
+        target=server.serve_forever, name="rex-metrics", daemon=True
+    ).start()
+    return server
+
+
+# Shared across modules, so they're all defined here
+
+STAGE_SECONDS = histogram(
+    "rex_backup_stage_seconds",
+    "Time spent in each backup stage",
+    ("stage",),
+)
+STAGE_FAILURES = counter(
+    "rex_backup_stage_failures_total",
+    "Backup stages that failed",
+    ("stage",),
+)
+BACKUPS = counter(
+    "rex_backups_total",
+    "Backups finished, by status: backup or no-change",
+    ("status",),
+)
+BACKUP_BYTES = counter(
+    "rex_backup_bytes_total",
+    "Size of exported projects, before de-duplication or compression",
+    ("storage",),
+)
+BYTES_WRITTEN = counter(
+    "rex_backup_bytes_written_total",
+    "Bytes written to backup storage",
+    ("storage",),
+)
+UPLOAD_BYTES = counter(
+    "rex_upload_bytes_total",
+    "Bytes uploaded to the bucket",
+)
+VERIFIED = counter(
+    "rex_verified_total",
+    "Backups verified, by result: ok, corrupt or missing",
+    ("state",),
+)
+VERIFIED_BYTES = counter(
+    "rex_verified_bytes_total",
+    "Bytes read by verification",
+)
+JOB_SECONDS = histogram(
+    "rex_job_seconds",
+    "Time jobs took to run, by kind and final state",
+    ("kind", "state"),
+)
+JOB_WAIT_SECONDS = histogram(
+    "rex_job_wait_seconds",
+    "Time jobs spent queued before starting",
+    ("kind",),
+)
+HTTP_SECONDS = histogram(
+    "rex_http_request_seconds",
+    "API request latency, by route",
+    ("method", "route", "status"),
+)
+SCHEDULER_LAG = histogram(
+    "rex_scheduler_lag_seconds",
+    "How late scheduled runs started",
+    ("entry",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+SCHEDULER_DEFERRED = histogram(
+    "rex_scheduler_deferred_seconds",
+    "How long scheduled backups were held back while Resolve was busy",
+    ("entry",),
+    buckets=(1, 10, 30, 60, 300, 600, 900, 1800, 3600),
+)
+RESOLVE_CPU = gauge(
+    "rex_resolve_cpu_percent",
+    "Resolve's CPU use at the last activity sample, as a share of all cores",
+)
+IO_RATE_LIMIT = gauge(
+    "rex_backup_io_limit_bytes_per_second",
+    "Current limit on post-export backup I/O. 0 when unlimited.",
+)
@@ -0,0 +1,244 @@
+import logging
+import threading
+import time
+
+from rex.settings.manager import SettingsManager
+from rex.app.bulk import BulkBackup
+from rex.app.main import get_catalog, get_resolve
+
+settings = SettingsManager()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings["app"]["loglevel"])
+
+
+class DatabasePlanner:
+    """
+    Back up selected projects across databases, visiting each database once per cycle
+
+    Switching database in Resolve takes seconds to tens of seconds, so all of a
+    database's projects are backed up in a single visit before moving on, starting
+    with the database Resolve is already on.
+
+    Progress is kept in the catalog. A cycle interrupted part way (cancelled, crashed,
+    Resolve quit) is resumed by the next run: databases already finished aren't
+    visited again, and projects backed up since the cycle started are skipped.
+    A database Resolve can't switch to is given up on until the next cycle, so it
+    doesn't hold the others up.
+    """
+
+    def __init__(
+        self,
+        resolve=None,
+        databases: list = None,
+        projects: list = None,
+        cancel_event: threading.Event = None,
+        progress=None,
+    ):
+        """
+        Args:
+            databases (list, optional): Database names. Defaults to ``databases.include``,
+                or every database Resolve knows if that's empty too.
+            projects (list, optional): Project names, in any folder. Defaults to
+                ``databases.projects``, or every project if that's empty too.
+            progress (optional): Told of each database visited, and passed to each ``Backup``
+        """
+
+        self.resolve = resolve or get_resolve()
+        self.databases = databases or settings["databases"]["include"]
+        self.projects = projects or settings["databases"]["projects"]
+        self.cancel_event = cancel_event or threading.Event()
+        self.progress = progress
+        self.catalog = get_catalog()
+        self.switches = 0
+
+    def targets(self) -> list:
+        """Databases to back up, the one Resolve is on first, then in Resolve's order"""
+
+        project_manager = self.resolve.project_manager
+        current = project_manager.db["DbName"]
+
+        targets = [
+            x
+            for x in project_manager.db_list
+            if not self.databases or x["DbName"] in self.databases
+        ]
+
+        missing = set(self.databases) - {x["DbName"] for x in targets}
+        if missing:
+            logger.warning(
+                f"[yellow]Resolve doesn't know these databases: {', '.join(sorted(missing))}"
+            )
+
+        return sorted(targets, key=lambda x: x["DbName"] != current)
+
+    def plan(self) -> list:
+        """
+        Databases still to visit this cycle, in visiting order
+
+        Starts a new cycle if the last one finished.
+
+        Returns:
+            list[dict]: Resolve's database info, plus the cycle's ``started_at``
+        """
+
+        targets = self.targets()
+        cycles = self.catalog.database_cycles()
+
+        unfinished = [
+            x
+            for x in targets
+            if x["DbName"] not in cycles or cycles[x["DbName"]]["finished_at"] is None
+        ]
+        in_progress = any(x["DbName"] in cycles for x in unfinished)
+
+        if not in_progress:
+            # Everything's done, or nothing ever was
+            self.catalog.start_database_cycle([x["DbName"] for x in targets])
+            unfinished = targets
+
+        else:
+            # Configured since the cycle started
+            new = [x["DbName"] for x in unfinished if x["DbName"] not in cycles]
+            if new:
+                self.catalog.start_database_cycle(new)
+
+        cycles = self.catalog.database_cycles()
+        return [
+            {**x, "started_at": cycles[x["DbName"]]["started_at"]} for x in unfinished
+        ]
+
+    def run(self) -> dict:
+        """
+        Visit each database due this cycle and back up its projects
+
+        Returns:
+            dict: ``databases`` (a report for each one visited), ``switches``,
+            ``remaining`` (databases left for the next run), ``total``, ``succeeded``,
+            ``failed``, ``bytes`` and ``seconds``
+        """
+
+        start = time.perf_counter()
+        project_manager = self.resolve.project_manager
+        original = project_manager.db
+        self.switches = 0
+
+        planned = self.plan()
+        reports = []
+
+        try:
+            for db_info in planned:
+                if self.cancel_event.is_set():
+                    break
+                reports.append(self._visit(db_info))
+
+        finally:
+            if (
+                settings["databases"]["return_to_current"]
+                and project_manager.db["DbName"] != original["DbName"]
+            ):
+                self._switch(original)
+
+        # Given up on counts as done, it's tried again next cycle
+        done = {x["database"] for x in reports if x["finished"] or x["error"]}
+        summary = {
+            "databases": reports,
+            "switches": self.switches,
+            "remaining": [x["DbName"] for x in planned if x["DbName"] not in done],
+            **{
+                k: sum(x[k] for x in reports)
+                for k in ("total", "succeeded", "failed", "bytes")
+            },
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+        logger.info(
+            f"Backed up {summary['succeeded']}/{summary['total']} projects "
+            f"across {len(reports)} databases with {self.switches} switches "
+            f"in {summary['seconds']}s"
+        )
+        return summary
+
+    def _switch(self, db_info: dict) -> bool:
+
+        try:
+            if not self.resolve.project_manager.set_db(db_info):
+                return False
+        except Exception as e:
+            logger.error(e)
+            return False
+
+        self.switches += 1
+        return True
+
+    def _visit(self, db_info: dict) -> dict:
+        """Switch to a database, if not already on it, and back up everything due there"""
+
+        name = db_info["DbName"]
+        report = {
+            "database": name,
+            "finished": False,
+            "switch_seconds": 0,
+            "total": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "skipped": 0,
+            "bytes": 0,
+            "seconds": 0,
+            "mb_per_sec": 0,
+            "error": None,
+        }
+
+        if self.progress:
+            self.progress(type="database", database=name)
+
+        if self.resolve.project_manager.db["DbName"] != name:
+
+            start = time.perf_counter()
+            if not self._switch(
+                {k: v for k, v in db_info.items() if k != "started_at"}
+            ):
+                report["error"] = f"Resolve couldn't switch to database '{name}'"
+                logger.error(f"[red]{report['error']}")
+                self.catalog.finish_database_cycle(name, error=report["error"])
+                return report
+            report["switch_seconds"] = round(time.perf_counter() - start, 3)
+
+        done = self.catalog.backed_up_since(name, db_info["started_at"])
+        summary = BulkBackup(
+            resolve=self.resolve,
+            cancel_event=self.cancel_event,
+            projects=self.projects,
+            skip=done,
+            progress=self.progress,
+        ).run()
+
+        report.update({k: summary[k] for k in report if k in summary})
+        report["results"] = summary["results"]
+        if summary["seconds"]:
+            report["mb_per_sec"] = round(
+                summary["bytes"] / 1024**2 / summary["seconds"], 2
+            )
+
+        # Failed projects don't hold the cycle up, the next cycle tries them again
+        if not self.cancel_event.is_set():
+            self.catalog.finish_database_cycle(name)
+            report["finished"] = True
+
+        return report
+
+
+_cycle_lock = threading.Lock()
+
+
+def run_database_cycle(cancel_event: threading.Event = None, progress=None) -> dict:
+    """Run or resume a cross-database cycle, unless one's running. Returns ``None`` if so."""
+
+    if not _cycle_lock.acquire(blocking=False):
+        logger.info("Cross-database backup already running, skipping")
+        return None
+
+    try:
+        return DatabasePlanner(cancel_event=cancel_event, progress=progress).run()
+    finally:
+        _cycle_lock.release()
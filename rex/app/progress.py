@@ -0,0 +1,69 @@
+import time
+
+# Seconds between byte count events. Often enough for a progress bar, rare enough
+# that a fast stage doesn't flood the stream.
+REPORT_INTERVAL = 0.25
+
+
+class ByteCounter:
+    """
+    Counts the bytes through a backup stage and reports them with their throughput
+
+    Has a hasher's ``update``, so it goes anywhere a ``MultiHasher`` is fed.
+    Reports at most every ``interval`` seconds, and once more on ``finish``.
+    Given a ``throttle``, ``update`` also waits on it for each block's bytes.
+    """
+
+    def __init__(
+        self,
+        emit,
+        stage: str,
+        total: int = None,
+        interval: float = REPORT_INTERVAL,
+        throttle=None,
+        **fields,
+    ):
+        """
+        Args:
+            emit: Called with each event's fields as keyword arguments
+            total (int, optional): Bytes expected, if known
+            throttle (IOThrottle, optional): Rate limit shared with other stages
+            **fields: Added to every event, e.g. ``project``
+        """
+
+        self.emit = emit
+        self.stage = stage
+        self.total = total
+        self.interval = interval
+        self.throttle = throttle
+        self.fields = fields
+        self.bytes = 0
+
+        self._start = time.perf_counter()
+        self._last_report = self._start
+
+    def update(self, data):
+
+        self.bytes += len(data)
+        if self.throttle is not None:
+            self.throttle.consume(len(data))
+
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report(now)
+
+    def report(self, now: float = None):
+
+        seconds = (now or time.perf_counter()) - self._start
+        self.emit(
+            type="bytes",
+            stage=self.stage,
+            bytes=self.bytes,
+            total=self.total,
+            mb_per_sec=round(self.bytes / 1024**2 / seconds, 2) if seconds else 0,
+            **self.fields,
+        )
+
+    def finish(self):
+        self.report()
@@ -0,0 +1,68 @@
+import os
+
+from rex.app import hashing
+from rex.app.compression import DICTIONARIES_DIR, Decompressor, DictionaryStore
+from rex.app.store import CHUNKS_DIR, ChunkStore, load_manifest
+
+
+def iter_backup(
+    backup: dict,
+    decompress: bool = True,
+    buffer_size: int = hashing.BUFFER_SIZE,
+    hasher=None,
+):
+    """
+    Yield a catalogued backup's contents, however it's stored
+
+    Args:
+        backup (dict): Catalog record
+        decompress (bool, optional): Yield the original .drp contents of compressed
+            backups, rather than the bytes stored on disk. Defaults to True.
+        hasher (MultiHasher, optional): Fed the bytes the backup's recorded digests
+            are of, in the same pass. Those are the stored bytes of a compressed backup.
+
+    Raises:
+        FileNotFoundError: If the backup, or any chunk it needs, is gone
+    """
+
+    store_dir = os.path.dirname(backup["path"])
+
+    if backup["storage"] == "zst" and decompress:
+        decompressor = Decompressor(
+            DictionaryStore(os.path.join(store_dir, DICTIONARIES_DIR))
+        )
+        yield from decompressor.iter_file(backup["path"], buffer_size, hasher)
+        return
+
+    if backup["storage"] == "manifest":
+        store = ChunkStore(os.path.join(store_dir, CHUNKS_DIR))
+        contents = store.iter_manifest(backup["path"])
+    else:
+        contents = _iter_file(backup["path"], buffer_size)
+
+    for data in contents:
+        if hasher:
+            hasher.update(data)
+        yield data
+
+
+def _iter_file(path: str, buffer_size: int):
+    with open(path, "rb") as file:
+        yield from iter(lambda: file.read(buffer_size), b"")
+
+
+def expected_digests(backup: dict) -> dict:
+    """
+    Digests recorded when the backup was made - from the catalog, else the sidecars
+
+    For de-duplicated backups these are of the original .drp,
+    otherwise they're of the file as stored.
+    """
+
+    if backup.get("digests"):
+        return backup["digests"]
+
+    if backup["storage"] == "manifest":
+        return load_manifest(backup["path"]).get("digests", {})
+
+    return hashing.read_sidecars(backup["path"])
@@ -0,0 +1,229 @@
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from rex.exceptions import RestoreError
+from rex.settings.manager import SettingsManager
+from rex.app import hashing, metrics
+from rex.app.main import get_catalog
+from rex.app.reader import expected_digests, iter_backup
+
+settings = SettingsManager()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings["app"]["loglevel"])
+
+# Blocks in flight between reading and writing, to keep both busy
+WRITE_BEHIND = 8
+
+
+def find_backup(
+    project: str,
+    at: float = None,
+    db_name: str = None,
+    verified_only: bool = False,
+    backup_id: int = None,
+) -> dict:
+    """
+    The backup to restore: a specific one, or a project's latest as of a point in time
+
+    Backups known to be corrupt or missing are never chosen.
+
+    Raises:
+        RestoreError: If there's no such backup
+    """
+
+    catalog = get_catalog()
+
+    if backup_id is not None:
+        backup = catalog.get(backup_id)
+        if backup is None:
+            raise RestoreError(f"No backup with id {backup_id}")
+        return backup
+
+    backup = catalog.latest(project, db_name, verified_only=verified_only, before=at)
+    if backup is None:
+        when = f" at {datetime.fromtimestamp(at)}" if at else ""
+        raise RestoreError(f"No backups of '{project}'{when}")
+    return backup
+
+
+def _write_behind(path: str, blocks) -> int:
+    """Write blocks to a file on a separate thread, so reading doesn't wait on the disk"""
+
+    pending = queue.Queue(WRITE_BEHIND)
+    errors = []
+
+    def writer():
+        try:
+            with open(path, "wb") as file:
+                while True:
+                    data = pending.get()
+                    if data is None:
+                        return
+                    file.write(data)
+        except BaseException as e:
+            errors.append(e)
+            # Keep draining so the reader never blocks on a dead writer
+            while pending.get() is not None:
+                pass
+
+    thread = threading.Thread(target=writer, name="rex-restore-writer")
+    thread.start()
+
+    written = 0
+    try:
+        for data in blocks:
+            if errors:
+                break
+            pending.put(data)
+            written += len(data)
+    finally:
+        pending.put(None)
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return written
+
+
+def stage(backup: dict, staging_dir: str = None) -> dict:
+    """
+    Rebuild a backup as a plain .drp in the staging dir, verifying it on the way
+
+    Reassembly or decompression, hashing and writing happen in one streaming pass.
+    The file only gets its final name once its digests have matched.
+
+    Returns:
+        dict: ``path``, ``bytes``, ``verified`` (algorithms checked), ``seconds`` and ``mb_per_sec``
+
+    Raises:
+        RestoreError: If the backup doesn't match its recorded digests
+    """
+
+    staging_dir = staging_dir or settings["restore"]["staging_dir"]
+    staging_dir = os.path.expanduser(staging_dir) or os.path.join(
+        tempfile.gettempdir(), "rex-restore"
+    )
+    os.makedirs(staging_dir, exist_ok=True)
+
+    path = os.path.join(staging_dir, f"{backup['id']}_{backup['filename']}")
+    part_path = path + ".part"
+
+    expected = expected_digests(backup)
+    if not expected:
+        logger.warning(
+            f"[yellow]No recorded digests for '{backup['path']}', can't verify it"
+        )
+    hasher = hashing.MultiHasher(list(expected))
+    catalog = get_catalog()
+
+    def blocks():
+        # Flag what the verifier would have, so it isn't chosen again
+        try:
+            yield from iter_backup(backup, buffer_size=4 * 1024 * 1024, hasher=hasher)
+        except FileNotFoundError as e:
+            catalog.set_verification(backup["id"], "missing")
+            raise RestoreError(f"Backup {backup['id']} is missing: {e}") from e
+        except OSError:
+            raise
+        except Exception as e:
+            catalog.set_verification(backup["id"], "corrupt")
+            raise RestoreError(f"Backup {backup['id']} is corrupt: {e}") from e
+
+    start = time.perf_counter()
+    try:
+        size = _write_behind(part_path, blocks())
+
+        mismatched = [k for k, v in hasher.hexdigests().items() if expected[k] != v]
+        if mismatched:
+            catalog.set_verification(backup["id"], "corrupt")
+            raise RestoreError(
+                f"Backup {backup['id']} doesn't match its checksums ({', '.join(mismatched)})"
+            )
+
+        os.replace(part_path, path)
+
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    seconds = time.perf_counter() - start
+    metrics.STAGE_SECONDS.observe(seconds, stage="restore")
+    logger.info(f"Staged backup {backup['id']} at '{path}' in {seconds:.2f}s")
+
+    return {
+        "path": path,
+        "bytes": size,
+        "verified": sorted(expected),
+        "seconds": round(seconds, 3),
+        "mb_per_sec": round(size / 1024**2 / seconds, 2) if seconds else 0,
+    }
+
+
+def restored_name(project: str, backup: dict, existing: list) -> str:
+    """A project name for the restore that isn't taken in the current folder"""
+
+    when = datetime.fromtimestamp(backup["created_at"]).strftime("%Y-%m-%d %H.%M.%S")
+    name = f"{project} (restored {when})"
+
+    candidate, n = name, 2
+    while candidate in existing:
+        candidate = f"{name} {n}"
+        n += 1
+    return candidate
+
+
+def restore(
+    resolve,
+    project: str,
+    at: float = None,
+    db_name: str = None,
+    verified_only: bool = False,
+    backup_id: int = None,
+    import_project: bool = True,
+) -> dict:
+    """
+    Find, stage, verify and import a backup into the current project manager folder
+
+    The project is imported under a new name, so nothing existing is overwritten.
+
+    Args:
+        resolve: pydavinci Resolve to import with
+        at (float, optional): Unix time to restore as of. Defaults to the latest backup.
+        import_project (bool, optional): ``False`` to only stage and verify
+
+    Returns:
+        dict: ``backup_id``, ``created_at``, ``imported_as`` and the staging report
+
+    Raises:
+        RestoreError: If there's no backup, it fails verification or Resolve won't import it
+    """
+
+    backup = find_backup(project, at, db_name, verified_only, backup_id)
+    report = {
+        "backup_id": backup["id"],
+        "created_at": backup["created_at"],
+        "imported_as": None,
+        **stage(backup),
+    }
+
+    if not import_project:
+        return report
+
+    project_manager = resolve.project_manager
+    name = restored_name(backup["project"], backup, project_manager.projects)
+    if not project_manager.import_project(report["path"], name):
+        raise RestoreError(f"Resolve couldn't import '{report['path']}'")
+
+    logger.info(f"[green]Restored backup {backup['id']} as '{name}'")
+    report["imported_as"] = name
+
+    if not settings["restore"]["keep_staged"]:
+        os.remove(report["path"])
+
+    return report
@@ -0,0 +1,277 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from rex.settings.manager import SettingsManager
+from rex.app import hashing
+from rex.app.compression import COMPRESSED_SUFFIX
+from rex.app.main import get_catalog
+from rex.app.store import CHUNKS_DIR, ChunkStore, load_manifest
+
+settings = SettingsManager()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings["app"]["loglevel"])
+
+POLICY_KEYS = ("keep_last", "hourly", "daily", "weekly", "monthly")
+
+# Period each GFS tier keeps one backup per
+PERIODS = {
+    "hourly": lambda x: (x.year, x.month, x.day, x.hour),
+    "daily": lambda x: (x.year, x.month, x.day),
+    "weekly": lambda x: x.isocalendar()[:2],
+    "monthly": lambda x: (x.year, x.month),
+}
+
+
+def policy_for(db_name: str, project: str) -> dict:
+    """
+    The retention policy for a project, with any per-project overrides applied
+
+    Overrides without a ``database`` apply to the project in every database.
+    """
+
+    policy = {x: settings["retention"][x] for x in POLICY_KEYS}
+    for x in settings["retention"]["projects"]:
+        if x["project"] == project and x.get("database", db_name) == db_name:
+            policy.update({k: v for k, v in x.items() if k in POLICY_KEYS})
+    return policy
+
+
+def select_keep(backups: list, policy: dict) -> set:
+    """
+    Grandfather-father-son selection
+
+    Keeps the ``keep_last`` most recent backups, then the most recent backup in
+    each of the last ``hourly`` hours that have one, and so on for days, ISO weeks
+    and months. The most recent verified backup is always kept too.
+
+    Args:
+        backups (list[dict]): One project's backups, newest first
+        policy (dict): Counts for each of ``POLICY_KEYS``
+
+    Returns:
+        set: ids of the backups to keep
+    """
+
+    keep = {x["id"] for x in backups[: policy["keep_last"]]}
+
+    for tier, period in PERIODS.items():
+
+        seen = set()
+        for x in backups:
+
+            if len(seen) >= policy[tier]:
+                break
+
+            key = period(datetime.fromtimestamp(x["created_at"]))
+            if key not in seen:
+                seen.add(key)
+                keep.add(x["id"])
+
+    verified = next((x for x in backups if x["verify_state"] == "ok"), None)
+    if verified:
+        keep.add(verified["id"])
+
+    return keep
+
+
+class Pruner:
+    """
+    Delete backups that fall outside their retention policy
+
+    Works from the catalog, never by listing the static dir. Each database and
+    project is pruned on its own. Deletions are done in batches and stop when time
+    runs out, so a big backlog is worked through over several scheduled runs.
+    Chunks are only deleted once no remaining backup references them.
+    """
+
+    def __init__(self, dry_run: bool = False, cancel_event: threading.Event = None):
+
+        self.dry_run = dry_run
+        self.cancel_event = cancel_event or threading.Event()
+        self.catalog = get_catalog()
+
+    def plan(self) -> list:
+        """
+        Backups to prune, oldest first
+
+        Returns:
+            list[dict]: ``id``, ``db_name``, ``project``, ``created_at``, ``verify_state``
+        """
+
+        prune = []
+        group, key = [], None
+
+        for x in self.catalog.retention_index() + [None]:
+
+            if x is None or (x["db_name"], x["project"]) != key:
+
+                if group:
+                    keep = select_keep(group, policy_for(*key))
+                    prune.extend(b for b in group if b["id"] not in keep)
+
+                if x is None:
+                    break
+                group, key = [], (x["db_name"], x["project"])
+
+            group.append(x)
+
+        return sorted(prune, key=lambda x: x["created_at"])
+
+    def run(self, max_seconds: float = None, batch_size: int = 500) -> dict:
+        """
+        Prune until nothing is left to prune, or time runs out
+
+        Args:
+            max_seconds (float, optional): Stop starting new batches after this long.
+                Defaults to the ``retention.max_minutes_per_run`` setting.
+            batch_size (int, optional): Backups deleted per catalog transaction
+
+        Returns:
+            dict: Report with ``planned``, ``pruned``, ``bytes_freed``, ``chunks_deleted``,
+            ``remaining``, ``seconds``, and the pruned ``backups``. A dry run lists
+            what would be pruned and deletes nothing.
+        """
+
+        if max_seconds is None:
+            max_seconds = settings["retention"]["max_minutes_per_run"] * 60
+
+        start = time.perf_counter()
+        planned = self.plan()
+
+        report = {
+            "dry_run": self.dry_run,
+            "planned": len(planned),
+            "pruned": 0,
+            "bytes_freed": 0,
+            "chunks_deleted": 0,
+            "remaining": len(planned),
+            "seconds": 0,
+            "backups": [],
+        }
+
+        if self.dry_run:
+            report["backups"] = [
+                {**x, "created": datetime.fromtimestamp(x["created_at"]).isoformat()}
+                for x in planned
+            ]
+            report["seconds"] = round(time.perf_counter() - start, 3)
+            return report
+
+        if planned:
+            self._index_chunks()
+
+        for i in range(0, len(planned), batch_size):
+
+            if self.cancel_event.is_set() or time.perf_counter() - start > max_seconds:
+                break
+
+            batch = self.catalog.get_many(
+                [x["id"] for x in planned[i : i + batch_size]]
+            )
+
+            # Forget first. A crash part way leaves stray files, never dangling records.
+            orphans = self.catalog.remove_backups([x["id"] for x in batch])
+
+            for x in batch:
+                report["bytes_freed"] += self._delete_backup(x)
+                report["backups"].append(
+                    {
+                        k: x[k]
+                        for k in ("id", "db_name", "project", "created_at", "path")
+                    }
+                )
+
+            for digest, paths in orphans.items():
+                freed = self._delete_chunk(digest, paths[0])
+                if freed is not None:
+                    report["chunks_deleted"] += 1
+                    report["bytes_freed"] += freed
+
+            report["pruned"] += len(batch)
+
+        report["remaining"] = report["planned"] - report["pruned"]
+        report["seconds"] = round(time.perf_counter() - start, 3)
+
+        logger.info(
+            f"Pruned {report['pruned']} backups and {report['chunks_deleted']} chunks, "
+            f"freeing {report['bytes_freed'] / 1024 ** 2:.1f} MB "
+            f"({report['remaining']} left for the next run)"
+        )
+        return report
+
+    def _index_chunks(self):
+        """Record chunk references for manifests catalogued before they were tracked"""
+
+        for x in self.catalog.unindexed_manifests():
+            try:
+                chunks = {d for d, _ in load_manifest(x["path"])["chunks"]}
+            except (OSError, ValueError) as e:
+                logger.warning(f"[yellow]Couldn't index chunks of '{x['path']}': {e}")
+                continue
+            self.catalog.add_chunk_refs(x["id"], chunks)
+
+    def _delete_backup(self, backup: dict) -> int:
+        """Delete a backup's file and checksum sidecars. Returns bytes freed."""
+
+        # Manifest sidecars are named after the original .drp
+        bases = {
+            backup["path"],
+            os.path.join(os.path.dirname(backup["path"]), backup["filename"]),
+        }
+        paths = [backup["path"]] + [
+            hashing.sidecar_path(base, algorithm)
+            for base in bases
+            for algorithm in backup["digests"]
+        ]
+
+        freed = 0
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"[yellow]Couldn't delete '{path}': {e}")
+
+        return freed
+
+    def _delete_chunk(self, digest: str, manifest_path: str) -> int:
+        """Delete an unreferenced chunk. Returns bytes freed, or None if it wasn't there."""
+
+        store = ChunkStore(os.path.join(os.path.dirname(manifest_path), CHUNKS_DIR))
+        path = store.chunk_path(digest)
+
+        for x in (path, path + COMPRESSED_SUFFIX):
+            try:
+                size = os.path.getsize(x)
+                os.remove(x)
+                return size
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"[yellow]Couldn't delete chunk '{x}': {e}")
+                return None
+
+        return None
+
+
+_prune_lock = threading.Lock()
+
+
+def run_retention(dry_run: bool = False, cancel_event: threading.Event = None) -> dict:
+    """Prune backups per the retention settings, unless already pruning. Returns ``None`` if so."""
+
+    if not _prune_lock.acquire(blocking=False):
+        logger.info("Pruning already running, skipping")
+        return None
+
+    try:
+        return Pruner(dry_run, cancel_event).run()
+    finally:
+        _prune_lock.release()
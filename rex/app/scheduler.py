@@ -1,74 +1,324 @@
-import sys
-from time import sleep
-from schedule import repeat, every, run_pending
+import asyncio
+import functools
+import json
+import time
 from rex.settings.manager import SettingsManager
+from rex.app import metrics
+from rex.app.activity import get_monitor
+from rex.app.schedules import CronSchedule, IntervalSchedule, Scheduler
+from rex.app.verify import run_verification
+from rex.app.upload import run_upload
+from rex.app.client import run_job
+from rex.app.utils.core import notify
 
 import chime
-import requests
-from notifypy import Notify
 from rich import print
 
 settings = SettingsManager()
-frequency = settings["schedule"]["frequency_in_minutes"]
-countdown_warning = settings["schedule"]["countdown_warning"]
 
 chime.theme("mario")
-notification = Notify()
-notification.title = "Rex Scheduler"
+title = "Rex Scheduler"
 
-tld = f"http://{settings['server']['ip']}:{settings['server']['port']}"
+# Seconds between load checks while a backup's held back
+QUIET_CHECK_INTERVAL = 15
 
+# Runs a job and returns it finished. Over HTTP to the server unless set in-process.
+_dispatch = None
 
-@repeat(every(frequency).minutes)
-def scheduled_backup():
 
-    print("[cyan]Running scheduled backup")
+def set_dispatcher(dispatch):
+    """
+    Run scheduled jobs with ``dispatch`` instead of over HTTP
 
-    # Remind user of scheduled backup
-    if countdown_warning > 0:
+    Args:
+        dispatch: Coroutine function taking a job kind and params, returning the
+            finished job as a dict, like ``run_job`` does
+    """
+
+    global _dispatch
+    _dispatch = dispatch
+
+
+async def dispatch_job(kind: str, **params) -> dict:
+
+    if _dispatch is not None:
+        return await _dispatch(kind, **params)
+
+    # Waiting on the job blocks, so do it off the event loop
+    return await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(run_job, kind, **params)
+    )
+
+
+async def wait_until_quiet(entry: str) -> float:
+    """
+    Hold a scheduled backup back while Resolve is busy, e.g. playing back or rendering
+
+    Gives up waiting after ``activity.max_delay_minutes`` and lets it run anyway.
+
+    Returns:
+        float: Seconds waited
+    """
+
+    if not settings["activity"]["enabled"]:
+        return 0
+
+    loop = asyncio.get_running_loop()
+    monitor = get_monitor()
+    start = time.monotonic()
+    deadline = start + settings["activity"]["max_delay_minutes"] * 60
+
+    while True:
+
+        # Finding Resolve's process walks the process list, so off the event loop
+        sample = await loop.run_in_executor(None, monitor.sample)
+        if not sample["busy"]:
+            break
+
+        if time.monotonic() >= deadline:
+            print("[yellow]Resolve is still busy, backing up anyway")
+            break
+
+        if time.monotonic() - start < QUIET_CHECK_INTERVAL:
+            print(f"[yellow]Holding {entry} back: {', '.join(sample['reasons'])}")
+        await asyncio.sleep(QUIET_CHECK_INTERVAL)
+
+    waited = time.monotonic() - start
+    metrics.SCHEDULER_DEFERRED.observe(waited, entry=entry)
+    return waited
+
+
+async def scheduled_backup(project: str = None, countdown: int = None):
+    """
+    Wait for Resolve to be idle, warn the user, wait out the countdown, then back up
 
-        notification.message = f"Scheduled backup in {countdown_warning} seconds"
-        notification.send()
+    Args:
+        project (str, optional): Project in the current folder. Defaults to the active project.
+        countdown (int, optional): Seconds of warning before backing up. Defaults to the setting.
+    """
 
+    if countdown is None:
+        countdown = settings["schedule"]["countdown_warning"]
+
+    print(f"[cyan]Running scheduled backup{f' of {project}' if project else ''}")
+    await wait_until_quiet("backup")
+
+    # Remind user of scheduled backup
+    if countdown > 0:
+
+        notify(f"Scheduled backup in {countdown} seconds", title)
         chime.info()
-        sleep(countdown_warning)  # 30
+        await asyncio.sleep(countdown)  # 30
 
-    notification.message = f"Backing up! Take a brain-break."
-    notification.send()
+    notify("Backing up! Take a brain-break.", title)
 
-    # Backup
-    success = requests.get(f"{tld}/backup", timeout=120).json()
-    if success:
+    job = await dispatch_job("backup", project=project)
+    if job["state"] == "succeeded" and job["result"]["success"]:
 
         chime.success()
-        notification.message = "Successfully backed up"
-        notification.send()
+        notify("Successfully backed up", title)
 
     else:
 
         chime.error()
-        notification.message = (
+        notify(
             "Uh-oh! Something went wrong.\n"
             "Please check your project exists, is open, output path exists\n"
-            "and try again manually with 'rex backup'"
+            "and try again manually with 'rex backup'",
+            title,
+        )
+
+
+async def scheduled_verification():
+
+    report = await asyncio.get_running_loop().run_in_executor(None, run_verification)
+    if report and (report["corrupt"] or report["missing"]):
+
+        chime.warning()
+        notify(
+            f"Verification found {report['corrupt']} corrupt "
+            f"and {report['missing']} missing backups!\n"
+            "Check the Rex logs for details.",
+            title,
+        )
+
+
+async def scheduled_upload():
+
+    # Runs here rather than on the server's job queue, so backups aren't held up
+    report = await asyncio.get_running_loop().run_in_executor(None, run_upload)
+    if report and report["failed"]:
+
+        chime.warning()
+        notify(
+            f"{report['failed']} backups couldn't be uploaded!\n"
+            "Check the Rex logs for details.",
+            title,
+        )
+
+
+async def scheduled_database_cycle():
+
+    await wait_until_quiet("backup of all databases")
+    job = await dispatch_job("backup_databases")
+    if job["state"] == "failed" or (job["result"] and job["result"]["failed"]):
+
+        chime.warning()
+        notify(
+            "Some projects couldn't be backed up across databases.\n"
+            "Check the Rex logs for details.",
+            title,
         )
-        notification.send()
+
+
+async def scheduled_retention():
+
+    # On the server's job queue, so it never runs alongside a backup
+    job = await dispatch_job("prune")
+    if job["state"] == "failed":
+
+        chime.error()
+        notify(
+            f"Pruning old backups failed: {job['error']}\n"
+            "Check the Rex logs for details.",
+            title,
+        )
+
+
+def timer_settings() -> str:
+    """Every setting ``build_scheduler`` reads, to tell when the timers need rebuilding"""
+
+    return json.dumps(
+        {
+            "schedule": settings["schedule"],
+            "databases": settings["databases"]["frequency_in_minutes"],
+            "verify": [
+                settings["verify"]["enabled"],
+                settings["verify"]["frequency_in_minutes"],
+            ],
+            "upload": [settings["upload"]["enabled"], settings["upload"]["cron"]],
+            "retention": [
+                settings["retention"]["enabled"],
+                settings["retention"]["frequency_in_minutes"],
+            ],
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+
+def build_scheduler(scheduler: Scheduler = None) -> Scheduler:
+    """
+    Schedule the active project backup, per-project backups and verification
+
+    Args:
+        scheduler (Scheduler, optional): Existing scheduler to reschedule from current settings
+    """
+
+    if scheduler is None:
+        scheduler = Scheduler()
+    scheduler.clear()
+
+    frequency = settings["schedule"]["frequency_in_minutes"]
+    if frequency > 0:
+        scheduler.add("backup", IntervalSchedule(frequency), scheduled_backup)
+
+    for x in settings["schedule"]["projects"]:
+
+        if x.get("cron"):
+            schedule = CronSchedule(x["cron"])
+        else:
+            schedule = IntervalSchedule(x["frequency_in_minutes"])
+
+        scheduler.add(
+            f"backup of '{x['project']}'",
+            schedule,
+            functools.partial(
+                scheduled_backup,
+                x["project"],
+                x.get("countdown_warning"),
+            ),
+        )
+
+    frequency = settings["databases"]["frequency_in_minutes"]
+    if frequency > 0:
+        scheduler.add(
+            "backup of all databases",
+            IntervalSchedule(frequency),
+            scheduled_database_cycle,
+        )
+
+    if settings["verify"]["enabled"]:
+        scheduler.add(
+            "verification",
+            IntervalSchedule(settings["verify"]["frequency_in_minutes"]),
+            scheduled_verification,
+        )
+
+    if settings["upload"]["enabled"]:
+        scheduler.add(
+            "upload", CronSchedule(settings["upload"]["cron"]), scheduled_upload
+        )
+
+    if settings["retention"]["enabled"]:
+        scheduler.add(
+            "pruning",
+            IntervalSchedule(settings["retention"]["frequency_in_minutes"]),
+            scheduled_retention,
+        )
+
+    return scheduler
+
+
+async def run_scheduler(serve_metrics: bool = True):
+    """
+    Run scheduled jobs until cancelled
+
+    Args:
+        serve_metrics (bool, optional): Serve this process's metrics on
+            ``server.scheduler_metrics_port``. Not needed alongside the API server.
+    """
+
+    scheduler = build_scheduler()
+    loop = asyncio.get_running_loop()
+    timers = timer_settings()
+
+    def reschedule(changed: set):
+        nonlocal timers
+
+        # Rebuilding restarts every interval, so only when a timer's changed
+        current = timer_settings()
+        if current != timers:
+            timers = current
+            loop.call_soon_threadsafe(build_scheduler, scheduler)
+
+    # Pick up edits to the settings file without restarting
+    settings.subscribe(reschedule)
+    settings.watch()
+
+    # Separate from the server's, which can't see this process
+    port = settings["server"]["scheduler_metrics_port"]
+    if serve_metrics and port:
+        try:
+            metrics.serve(port, str(settings["server"]["ip"]))
+        except OSError as e:
+            print(f"[yellow]Couldn't serve scheduler metrics on {port}: {e}")
+
+    await scheduler.run()
 
 
 def loop():
-    # TODO: Add port-based lock somehow
-    # So we don't start multiple scheduler instances
-    print("[green]Scheduler running")
-    while True:
-        run_pending()
+    # Standalone, against a separately run server. `rex up` runs both in one daemon.
 
+    from rex.app.utils.logs import setup_queued_logging, stop_queued_logging
 
-def test():
-    scheduled_backup()
-    sys.exit()
+    setup_queued_logging()
+    print("[green]Scheduler running")
+    try:
+        asyncio.run(run_scheduler())
+    finally:
+        stop_queued_logging()
 
 
 if __name__ == "__main__":
-    test()
-else:
     loop()
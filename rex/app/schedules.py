@@ -0,0 +1,231 @@
+import asyncio
+import logging
+from datetime import datetime, time, timedelta
+
+from rex.app import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cap on any single sleep, so clock changes and suspend/resume are noticed
+MAX_SLEEP = 60
+
+
+class IntervalSchedule:
+    """Every ``minutes`` minutes, starting ``minutes`` from when the scheduler starts"""
+
+    def __init__(self, minutes: float):
+
+        if minutes <= 0:
+            raise ValueError("Interval must be positive")
+        self.interval = timedelta(minutes=minutes)
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + self.interval
+
+    def __repr__(self):
+        return f"every {self.interval}"
+
+
+class CronSchedule:
+    """
+    Standard five-field cron expression: minute hour day-of-month month day-of-week
+
+    Supports ``*``, lists, ranges and steps (``*/15``, ``1-5``, ``0,30``, ``9-17/2``).
+    Day-of-week is 0-7 with Sunday as 0 or 7. As in cron, if both day fields are
+    restricted, a day matching either one is enough.
+    """
+
+    FIELDS = (
+        ("minute", 0, 59),
+        ("hour", 0, 23),
+        ("day of month", 1, 31),
+        ("month", 1, 12),
+        ("day of week", 0, 7),
+    )
+
+    def __init__(self, expression: str):
+
+        self.expression = expression
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got '{expression}'")
+
+        parsed = [self._parse(x, *spec) for x, spec in zip(fields, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {x % 7 for x in weekdays}
+
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, name: str, low: int, high: int) -> list:
+
+        values = set()
+        for part in field.split(","):
+
+            step = 1
+            if "/" in part:
+                part, step = part.split("/", 1)
+                step = int(step)
+
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(x) for x in part.split("-", 1))
+            else:
+                start = end = int(part)
+                if step != 1:
+                    end = high
+
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Invalid {name} '{field}' (allowed {low}-{high})")
+
+            values.update(range(start, end + 1, step))
+
+        return sorted(values)
+
+    def _day_matches(self, day) -> bool:
+
+        if day.month not in self.months:
+            return False
+
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+
+        if self._any_day:
+            return in_weekdays
+        if self._any_weekday:
+            return in_days
+        return in_days or in_weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+
+        # Five years covers any valid expression, Feb 29th included
+        for _ in range(366 * 5):
+
+            if self._day_matches(day):
+
+                for hour in self.hours:
+                    if day == start.date() and hour < start.hour:
+                        continue
+
+                    for minute in self.minutes:
+                        if (day, hour) == (start.date(), start.hour) and (
+                            minute < start.minute
+                        ):
+                            continue
+                        return datetime.combine(day, time(hour, minute))
+
+            day += timedelta(days=1)
+
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+    def __repr__(self):
+        return f"cron '{self.expression}'"
+
+
+class ScheduleEntry:
+    def __init__(self, name: str, schedule, func):
+        self.name = name
+        self.schedule = schedule
+        self.func = func
+        self.next_run = None
+        self.last_lag = None  # Seconds late the last run started
+        self.task = None
+
+
+class Scheduler:
+    """
+    Event-driven scheduler on asyncio
+
+    Sleeps until the next entry is due rather than polling. Each run is its own task,
+    so a job sleeping through a countdown doesn't hold up any other.
+    A job still running when it's due again is skipped, not stacked.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self._wakeup = None
+        self._loop = None
+
+    def add(self, name: str, schedule, func) -> ScheduleEntry:
+        """
+        Args:
+            name (str): For logging
+            schedule: ``IntervalSchedule`` or ``CronSchedule``
+            func: Coroutine function to call when due, with no arguments
+        """
+
+        entry = ScheduleEntry(name, schedule, func)
+        entry.next_run = schedule.next_after(datetime.now())
+        self.entries.append(entry)
+        logger.info(f"Scheduled {name} ({schedule}), next at {entry.next_run}")
+
+        # Re-plan the current sleep, from any thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+        return entry
+
+    def clear(self):
+        """Remove every entry. Runs already going carry on."""
+
+        self.entries = []
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self):
+
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+        while True:
+
+            if not self.entries:
+                await self._sleep(MAX_SLEEP)
+                continue
+
+            entry = min(self.entries, key=lambda x: x.next_run)
+            now = datetime.now()
+            delay = (entry.next_run - now).total_seconds()
+
+            if delay > 0:
+                await self._sleep(min(delay, MAX_SLEEP))
+                continue
+
+            entry.last_lag = -delay
+            metrics.SCHEDULER_LAG.observe(entry.last_lag, entry=entry.name)
+            self._start(entry)
+
+            next_run = entry.schedule.next_after(entry.next_run)
+            if next_run <= now:
+                # Overslept (suspend, clock change). Don't replay missed runs.
+                next_run = entry.schedule.next_after(now)
+            entry.next_run = next_run
+
+            # Let the run start before anything else due, so a backlog can't starve them
+            await asyncio.sleep(0)
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def _start(self, entry: ScheduleEntry):
+
+        if entry.task is not None and not entry.task.done():
+            logger.warning(f"[yellow]Skipping {entry.name}, previous run still going")
+            return
+
+        entry.task = asyncio.ensure_future(self._run_entry(entry))
+
+    async def _run_entry(self, entry: ScheduleEntry):
+        try:
+            await entry.func()
+        except Exception:
+            logger.exception(f"[red]Scheduled {entry.name} failed")
@@ -0,0 +1,273 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+
+from rex.app import hashing, metrics
+from rex.app.activity import get_io_throttle
+
+logger = logging.getLogger(__name__)
+
+# Large, so a network share sees few big writes rather than many small ones
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def _fsync_dir(path: str):
+    """Make a rename in ``path`` durable. Windows has no directory handles to sync."""
+
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _hash_file(path: str) -> str:
+
+    hasher = hashlib.blake2b()
+    with open(path, "rb") as file:
+        for data in iter(lambda: file.read(BLOCK_SIZE), b""):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def copy_verified(src: str, dest: str, throttle=None) -> int:
+    """
+    Copy a file so it's either all there under ``dest`` or not there at all
+
+    Writes to ``dest``.part and fsyncs it, then reads it back and compares it with
+    what was read from ``src`` before renaming it into place.
+
+    Args:
+        throttle (IOThrottle, optional): Waited on for each block copied
+
+    Returns:
+        int: Bytes copied
+
+    Raises:
+        OSError: If the copy fails, or doesn't read back the same
+    """
+
+    part_path = dest + ".part"
+    hasher = hashlib.blake2b()
+    size = 0
+
+    try:
+        with open(src, "rb") as src_file, open(part_path, "wb") as dest_file:
+            for data in iter(lambda: src_file.read(BLOCK_SIZE), b""):
+                if throttle is not None:
+                    throttle.consume(len(data))
+                hasher.update(data)
+                dest_file.write(data)
+                size += len(data)
+            dest_file.flush()
+            os.fsync(dest_file.fileno())
+
+        if _hash_file(part_path) != hasher.hexdigest():
+            raise OSError(f"Copy of '{src}' doesn't match the original")
+
+        os.replace(part_path, dest)
+        _fsync_dir(os.path.dirname(dest))
+
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    return size
+
+
+def staged_files(backup: dict) -> list:
+    """A catalogued backup's stored file and checksum sidecars, sidecars first"""
+
+    sidecars = [
+        hashing.sidecar_path(backup["path"], x)
+        for x in hashing.ALGORITHMS
+        if os.path.exists(hashing.sidecar_path(backup["path"], x))
+    ]
+    return sidecars + [backup["path"]]
+
+
+class Promoter:
+    """
+    Moves backups made in a local staging dir into the backup store, in the background
+
+    Exports and post-processing happen on fast local disk, so Resolve and the backup
+    job never wait on a slow store like a network share. Each staged backup is then
+    copied, verified and renamed into place by a small pool of workers, and the
+    catalog repointed at it. Failed moves are retried. Anything left staged, e.g. by
+    a crash, is picked up again by ``resume``.
+
+    Staging space is capped: ``wait_for_space`` holds up new exports while the
+    staged backups are over ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        catalog,
+        staging_dir: str,
+        store_dir: str,
+        max_bytes: int,
+        workers: int = 2,
+        retries: int = 3,
+    ):
+        self.catalog = catalog
+        self.staging_dir = staging_dir
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.retries = retries
+
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="rex-promote")
+        self._pending = dict()
+        self._changed = threading.Condition()
+
+    def usage(self) -> int:
+        """Bytes in the staging dir"""
+
+        with os.scandir(self.staging_dir) as entries:
+            return sum(x.stat().st_size for x in entries if x.is_file())
+
+    def wait_for_space(self, timeout: float) -> bool:
+        """
+        Wait until the staging dir is under its cap
+
+        Returns:
+            bool: ``False`` if it's still full after ``timeout`` seconds
+        """
+
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.usage() >= self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                # Woken as backups leave, but check now and then regardless
+                self._changed.wait(min(remaining, 1))
+        return True
+
+    def submit(self, backup_id: int) -> bool:
+        """
+        Queue a staged backup to be moved into the store
+
+        Returns:
+            bool: ``False`` if it's already queued
+        """
+
+        with self._changed:
+            if backup_id in self._pending:
+                return False
+            self._pending[backup_id] = self.executor.submit(self._run, backup_id)
+        return True
+
+    def resume(self) -> int:
+        """Queue every catalogued backup still in the staging dir. Returns how many."""
+
+        backups = self.catalog.backups_under(self.staging_dir)
+        for x in backups:
+            self.submit(x["id"])
+
+        if backups:
+            logger.info(f"Resuming promotion of {len(backups)} staged backups")
+        return len(backups)
+
+    def pending(self) -> int:
+        with self._changed:
+            return len(self._pending)
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait for every queued backup to be moved
+
+        Returns:
+            bool: ``False`` if some still weren't after ``timeout`` seconds
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def shutdown(self):
+        """Drop queued moves, they're resumed next time. One underway finishes first."""
+
+        with self._changed:
+            for future in self._pending.values():
+                future.cancel()
+        self.executor.shutdown(wait=False)
+
+    def _run(self, backup_id: int):
+
+        try:
+            for attempt in range(1, self.retries + 2):
+                try:
+                    with metrics.STAGE_SECONDS.time(stage="promote"):
+                        self.promote(backup_id)
+                    return
+
+                except Exception as e:
+                    metrics.STAGE_FAILURES.inc(stage="promote")
+                    logger.warning(
+                        f"[yellow]Moving backup {backup_id} into the store failed "
+                        f"(attempt {attempt}/{self.retries + 1}): {e}"
+                    )
+                    if attempt <= self.retries:
+                        time.sleep(min(2**attempt, 60))
+
+            logger.error(
+                f"[red]Backup {backup_id} is still staged in '{self.staging_dir}'. "
+                "It'll be tried again when Rex restarts."
+            )
+
+        finally:
+            with self._changed:
+                self._pending.pop(backup_id, None)
+                self._changed.notify_all()
+
+    def promote(self, backup_id: int) -> str:
+        """
+        Move one staged backup into the store, now
+
+        Returns:
+            str: Its new path, or ``None`` if it's no longer staged (pruned, or moved already)
+        """
+
+        backup = self.catalog.get(backup_id)
+        if backup is None or os.path.dirname(backup["path"]) != self.staging_dir:
+            return None
+
+        files = staged_files(backup)
+        throttle = get_io_throttle()
+        size = 0
+        for path in files:
+            size += copy_verified(
+                path, os.path.join(self.store_dir, os.path.basename(path)), throttle
+            )
+
+        # The catalog only moves once every file is in place
+        new_path = os.path.join(self.store_dir, os.path.basename(backup["path"]))
+        self.catalog.set_path(backup_id, new_path)
+
+        if self.catalog.get(backup_id) is None:
+            # Pruned while it was being copied
+            files = [os.path.join(self.store_dir, os.path.basename(x)) for x in files]
+            new_path = None
+
+        for path in files:
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+        with self._changed:
+            self._changed.notify_all()
+
+        if new_path:
+            logger.info(f"Moved backup {backup_id} into the store ({size} bytes)")
+        return new_path
@@ -0,0 +1,389 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from rex.app.compression import (
+    COMPRESSED_SUFFIX,
+    DICTIONARIES_DIR,
+    Decompressor,
+    DictionaryStore,
+)
+
+logger = logging.getLogger(__name__)
+
+# Optional dependency. Chunking is several times faster with it.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MANIFEST_SUFFIX = ".manifest"
+CHUNKS_DIR = ".chunks"  # Alongside the manifests
+MANIFEST_VERSION = 1
+
+# Gear table for the rolling hash. Derived from blake2b so it is stable
+# across Python versions and platforms - chunk boundaries must never change.
+_GEAR = [
+    int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=8).digest(), "little")
+    for i in range(256)
+]
+_MASK_64 = (1 << 64) - 1
+
+# A byte only stays in the gear hash for 64 more bytes, then it's shifted out
+_WINDOW = 64
+
+if numpy is not None:
+    _GEAR_ARRAY = numpy.array(_GEAR, dtype=numpy.uint64)
+
+
+def _gear_hashes(data: bytes, start: int, stop: int):
+    """
+    Gear hashes at ``data[start:stop]``, each over the 64 bytes ending there
+
+    The same values as rolling the hash byte by byte, once it has seen a full
+    window, but built from the whole range at once with numpy. Each pass adds the
+    range to itself shifted along by twice as much as the last.
+
+    Args:
+        start (int): At least 63, so every hash has a full window
+    """
+
+    h = _GEAR_ARRAY[
+        numpy.frombuffer(
+            data,
+            dtype=numpy.uint8,
+            count=stop - start + _WINDOW - 1,
+            offset=start - _WINDOW + 1,
+        )
+    ]
+
+    shift = 1
+    while shift < _WINDOW:
+        # Wraps at 64 bits, like the rolling hash
+        h[shift:] += h[:-shift] << numpy.uint64(shift)
+        shift *= 2
+
+    return h[_WINDOW - 1 :]
+
+
+def _top_bits_mask(bits: int) -> int:
+    """Mask selecting the highest ``bits`` bits of a 64-bit gear hash"""
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+class Chunker:
+    """
+    Content-defined chunker (FastCDC)
+
+    Splits a byte stream at positions chosen by a gear-based rolling hash,
+    so an insertion or deletion only disturbs the chunks around it.
+    Normalized chunking keeps chunk sizes tightly distributed around ``avg_size``.
+    """
+
+    def __init__(self, avg_size: int = 64 * 1024):
+
+        bits = max(avg_size.bit_length() - 1, 8)
+
+        self.avg_size = 1 << bits
+        self.min_size = self.avg_size // 4
+        self.max_size = self.avg_size * 4
+
+        # Harder to match before the average size, easier after
+        self._mask_small = _top_bits_mask(bits + 1)
+        self._mask_large = _top_bits_mask(bits - 1)
+
+    def _cut_point(self, data, start: int, end: int) -> int:
+        """Return the length of the next chunk in ``data[start:end]``"""
+
+        remaining = end - start
+        if remaining <= self.min_size:
+            return remaining
+
+        limit = min(remaining, self.max_size)
+        normal = min(limit, self.avg_size)
+
+        # The hash restarts at min_size. With numpy, roll it byte by byte only until
+        # it covers a full window, from there it's the same as _gear_hashes.
+        rolled = limit if numpy is None else min(limit, self.min_size + _WINDOW - 1)
+
+        gear = _GEAR
+        mask_64 = _MASK_64
+        h = 0
+        i = self.min_size
+
+        mask = self._mask_small
+        while i < min(normal, rolled):
+            h = ((h << 1) + gear[data[start + i]]) & mask_64
+            if not h & mask:
+                return i + 1
+            i += 1
+
+        mask = self._mask_large
+        while i < rolled:
+            h = ((h << 1) + gear[data[start + i]]) & mask_64
+            if not h & mask:
+                return i + 1
+            i += 1
+
+        for mask, stop in ((self._mask_small, normal), (self._mask_large, limit)):
+            if i < stop:
+                hashes = _gear_hashes(data, start + i, start + stop)
+                hits = numpy.flatnonzero((hashes & numpy.uint64(mask)) == 0)
+                if hits.size:
+                    return i + int(hits[0]) + 1
+                i = stop
+
+        return limit
+
+    def chunks(self, file_obj, read_size: int = 8 * 1024 * 1024):
+        """
+        Yield content-defined chunks from a binary file object
+
+        Args:
+            file_obj: Readable binary file object
+            read_size (int, optional): Bytes to read from disk at a time. Defaults to 8MiB.
+
+        Yields:
+            bytes: Each chunk in stream order
+        """
+
+        buffer = b""
+        eof = False
+
+        while True:
+
+            if not eof and len(buffer) < self.max_size:
+                data = file_obj.read(max(read_size, self.max_size))
+                if data:
+                    buffer = buffer + data if buffer else data
+                else:
+                    eof = True
+
+            if not buffer:
+                return
+
+            # Cut as many chunks as the buffer safely allows
+            offset = 0
+            while len(buffer) - offset >= self.max_size or (
+                eof and offset < len(buffer)
+            ):
+                length = self._cut_point(buffer, offset, len(buffer))
+                yield buffer[offset : offset + length]
+                offset += length
+
+            buffer = buffer[offset:]
+
+
+class ChunkStore:
+    """
+    Content-addressed chunk store for de-duplicated backups
+
+    Each unique chunk is written once to ``<root>/<ab>/<digest>``,
+    or ``<digest>.zst`` if compressed. Chunks are addressed by their uncompressed
+    content, so compressed and uncompressed backups still share chunks.
+    A backup is recorded as a small JSON manifest listing its chunks in order,
+    from which the original file can be rebuilt byte-for-byte.
+    """
+
+    def __init__(self, root: str, avg_chunk_size: int = 64 * 1024, compressor=None):
+        """
+        Args:
+            root (str): Chunk directory
+            avg_chunk_size (int, optional): Target chunk size in bytes. Defaults to 64KiB.
+            compressor (Compressor, optional): Compress new chunks with this
+        """
+
+        self.root = root
+        self.chunker = Chunker(avg_chunk_size)
+        self.compressor = compressor
+        self._decompressor = None
+
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _read_chunk(self, digest: str) -> bytes:
+
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            with open(path, "rb") as chunk_file:
+                return chunk_file.read()
+
+        with open(path + COMPRESSED_SUFFIX, "rb") as chunk_file:
+            data = chunk_file.read()
+
+        if self._decompressor is None:
+            self._decompressor = Decompressor(
+                DictionaryStore(
+                    os.path.join(os.path.dirname(self.root), DICTIONARIES_DIR)
+                )
+            )
+        return self._decompressor.decompress(data)
+
+    def check_chunk(self, digest: str) -> tuple:
+        """
+        Re-hash a stored chunk and compare it with its address
+
+        Returns:
+            tuple: (length, stored) - its uncompressed length and bytes read from disk
+
+        Raises:
+            FileNotFoundError: If it's gone
+            ValueError: If its contents don't match its digest
+        """
+
+        path = self.chunk_path(digest)
+        if not os.path.exists(path):
+            path += COMPRESSED_SUFFIX
+        stored = os.path.getsize(path)
+
+        data = self._read_chunk(digest)
+        if hashlib.blake2b(data, digest_size=32).hexdigest() != digest:
+            raise ValueError(f"Chunk '{digest}' doesn't match its digest")
+
+        return len(data), stored
+
+    def put(self, data: bytes) -> tuple:
+        """
+        Store a chunk if it isn't already stored
+
+        Args:
+            data (bytes): Chunk contents
+
+        Returns:
+            tuple: (digest, written) - ``written`` is the number of bytes written,
+            0 if the chunk was already stored
+        """
+
+        digest = hashlib.blake2b(data, digest_size=32).hexdigest()
+        path = self.chunk_path(digest)
+
+        if os.path.exists(path) or os.path.exists(path + COMPRESSED_SUFFIX):
+            return digest, 0
+
+        if self.compressor:
+            data = self.compressor.compress(data)
+            path += COMPRESSED_SUFFIX
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write then rename, so a crash never leaves a truncated chunk behind
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return digest, len(data)
+
+    def ingest(self, filepath: str, manifest_path: str, hasher=None) -> dict:
+        """
+        Split a file into chunks, store the new ones and write its manifest
+
+        Args:
+            filepath (str): File to ingest
+            manifest_path (str): Where to write the manifest
+            hasher (MultiHasher, optional): Fed every chunk, so the file's checksums
+                come out of the same read pass.
+
+        Returns:
+            dict: Ingest stats - ``size``, ``chunks``, ``new_chunks`` and ``bytes_written``
+        """
+
+        entries = []
+        size = 0
+        new_chunks = 0
+        bytes_written = 0
+
+        with open(filepath, "rb") as file:
+            for chunk in self.chunker.chunks(file):
+
+                if hasher:
+                    hasher.update(chunk)
+
+                digest, written = self.put(chunk)
+                entries.append([digest, len(chunk)])
+                size += len(chunk)
+
+                if written:
+                    new_chunks += 1
+                    bytes_written += written
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "filename": os.path.basename(filepath),
+            "size": size,
+            "digests": hasher.hexdigests() if hasher else {},
+            "chunks": entries,
+        }
+
+        with open(manifest_path, "x") as manifest_file:
+            json.dump(manifest, manifest_file)
+
+        logger.debug(
+            f"Ingested '{filepath}': {len(entries)} chunks, "
+            f"{new_chunks} new ({bytes_written} of {size} bytes written)"
+        )
+
+        return {
+            "size": size,
+            "chunks": len(entries),
+            "new_chunks": new_chunks,
+            "bytes_written": bytes_written,
+        }
+
+    def iter_manifest(self, manifest_path: str):
+        """
+        Yield the original file's contents chunk by chunk
+
+        Raises:
+            ValueError: If a stored chunk doesn't match its recorded length
+        """
+
+        manifest = load_manifest(manifest_path)
+
+        for digest, length in manifest["chunks"]:
+            data = self._read_chunk(digest)
+            if len(data) != length:
+                raise ValueError(
+                    f"Chunk '{digest}' is {len(data)} bytes, expected {length}"
+                )
+            yield data
+
+    def restore(self, manifest_path: str, dest: str) -> int:
+        """
+        Rebuild a backup file from its manifest
+
+        Args:
+            manifest_path (str): Manifest of the backup to rebuild
+            dest (str): Path to write the rebuilt file to
+
+        Returns:
+            int: Number of bytes written
+        """
+
+        written = 0
+        with open(dest, "xb") as dest_file:
+            for data in self.iter_manifest(manifest_path):
+                dest_file.write(data)
+                written += len(data)
+
+        return written
+
+    def referenced_chunks(self, manifest_paths) -> set:
+        """Return the set of chunk digests referenced by the given manifests"""
+
+        referenced = set()
+        for manifest_path in manifest_paths:
+            referenced.update(d for d, _ in load_manifest(manifest_path)["chunks"])
+        return referenced
+
+
+def load_manifest(manifest_path: str) -> dict:
+    with open(manifest_path, "r") as manifest_file:
+        return json.load(manifest_file)
@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter
+
+    Tokens (bytes, usually) refill at ``rate`` per second up to ``capacity``.
+    ``consume`` blocks until enough are available. Share one bucket between
+    threads to cap their combined throughput.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate (float): Tokens per second. Zero or ``None`` means unlimited.
+            capacity (float, optional): Largest burst allowed. Defaults to one second's worth.
+        """
+
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        """Change the rate on the fly, e.g. when load changes"""
+
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = rate
+            self._tokens = min(self._tokens, self.capacity or 0)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last) * self.rate
+            )
+        self._last = now
+
+    def consume(self, amount: float):
+        """Take ``amount`` tokens, sleeping until they're available"""
+
+        while amount > 0:
+
+            with self._lock:
+
+                if not self.rate:
+                    return
+
+                self._refill()
+
+                # Requests bigger than a burst are taken a burst at a time
+                take = min(amount, self.capacity)
+                if self._tokens >= take:
+                    self._tokens -= take
+                    amount -= take
+                    continue
+
+                wait = (take - self._tokens) / self.rate
+
+            time.sleep(wait)
@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+import zipfile
+from xml.etree import ElementTree
+
+from rex.app.reader import iter_backup
+
+logger = logging.getLogger(__name__)
+
+# Backups rebuilt from chunks or decompressed for indexing spill to disk past this
+SPOOL_SIZE = 64 * 1024 * 1024
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _timeline_name(element) -> str:
+
+    for key in ("Name", "name"):
+        if element.get(key):
+            return element.get(key)
+
+    for child in element:
+        if _local_name(child.tag) == "Name" and child.text:
+            return child.text.strip()
+
+    return None
+
+
+def _parse_member(xml_file) -> list:
+
+    timelines = []
+    depth = 0  # Of open timelines
+
+    for event, element in ElementTree.iterparse(xml_file, events=("start", "end")):
+
+        is_timeline = _local_name(element.tag).endswith("Timeline")
+        if event == "start":
+            depth += is_timeline
+            continue
+
+        if is_timeline:
+
+            depth -= 1
+            name = _timeline_name(element)
+            if name is not None:
+                timelines.append(
+                    {
+                        "name": name,
+                        "clips": sum(
+                            "Clip" in _local_name(x.tag) for x in element.iter()
+                        ),
+                        "content_hash": hashlib.blake2b(
+                            ElementTree.tostring(element), digest_size=16
+                        ).hexdigest(),
+                    }
+                )
+
+        # Keep what a timeline still being read needs, free the rest
+        if depth == 0:
+            element.clear()
+
+    return timelines
+
+
+def parse_timelines(file_obj) -> list:
+    """
+    Find the timelines in a .drp
+
+    A .drp is a zip of project XML. Each member is streamed through ``iterparse``
+    and cleared as it goes, so memory stays flat however big the project is.
+    Timelines are elements whose tag ends in "Timeline" and that have a name,
+    clips are elements inside them with "Clip" in their tag. Members that aren't
+    well-formed XML are skipped.
+
+    Args:
+        file_obj: Path or seekable binary file of the .drp
+
+    Returns:
+        list[dict]: ``name``, ``clips`` and ``content_hash`` (of the timeline's XML) of each timeline
+    """
+
+    timelines = []
+
+    with zipfile.ZipFile(file_obj) as archive:
+        for member in archive.infolist():
+
+            if member.is_dir() or not member.filename.lower().endswith(".xml"):
+                continue
+
+            try:
+                with archive.open(member) as xml_file:
+                    timelines.extend(_parse_member(xml_file))
+
+            except ElementTree.ParseError as e:
+                # Not everything in there has to be project XML
+                logger.debug(f"Skipping '{member.filename}', can't parse it: {e}")
+
+    return timelines
+
+
+def index_backup(backup: dict) -> list:
+    """
+    Parse a catalogued backup's timelines, however it's stored
+
+    De-duplicated and compressed backups are rebuilt into a temporary file first.
+    """
+
+    if backup["storage"] == "drp":
+        return parse_timelines(backup["path"])
+
+    with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as drp:
+        for data in iter_backup(backup):
+            drp.write(data)
+        drp.seek(0)
+        return parse_timelines(drp)
+
+
+def backfill(
+    max_seconds: float = 300,
+    batch_size: int = 50,
+    cancel_event: threading.Event = None,
+    progress=None,
+) -> dict:
+    """
+    Index backups made before timeline indexing, newest first
+
+    Args:
+        cancel_event (threading.Event, optional): Stops it between backups
+        progress (optional): Called with an "index" event as each backup's done,
+            e.g. ``Job.emit``
+
+    Returns:
+        dict: ``indexed``, ``failed``, ``remaining`` and ``seconds``
+    """
+
+    from rex.app.main import get_catalog
+
+    catalog = get_catalog()
+    start = time.perf_counter()
+    indexed = failed = 0
+    skip = set()
+
+    cancel_event = cancel_event or threading.Event()
+
+    while time.perf_counter() - start < max_seconds and not cancel_event.is_set():
+
+        batch = [
+            x
+            for x in catalog.unindexed_timelines(batch_size + len(skip))
+            if x["id"] not in skip
+        ]
+        if not batch:
+            break
+
+        for backup in batch[:batch_size]:
+
+            if cancel_event.is_set() or time.perf_counter() - start >= max_seconds:
+                break
+
+            error = None
+            try:
+                catalog.add_timelines(backup["id"], index_backup(backup))
+                indexed += 1
+
+            except FileNotFoundError as e:
+                # Gone, nothing to index. Verification will flag it.
+                skip.add(backup["id"])
+                error = str(e)
+
+            except Exception as e:
+                logger.warning(f"[yellow]Couldn't index '{backup['path']}': {e}")
+                catalog.add_timelines(backup["id"], [], error=str(e))
+                failed += 1
+                error = str(e)
+
+            if progress:
+                progress(type="index", backup_id=backup["id"], error=error)
+
+    return {
+        "indexed": indexed,
+        "failed": failed,
+        "remaining": len(catalog.unindexed_timelines(limit=-1)) - len(skip),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def find_timeline(
+    name: str, project: str = None, db_name: str = None, exact: bool = False
+) -> list:
+    """
+    Every version of matching timelines across backup history
+
+    Args:
+        name (str): Timeline name, or part of one unless ``exact``. Case-insensitive.
+
+    Returns:
+        list[dict]: One per database, project and timeline: ``first_seen`` and
+        ``last_seen`` backups, each backup where its content changed (``changes``),
+        and the first backup without it (``gone_in``), or ``None`` if it's still there
+    """
+
+    from rex.app.main import get_catalog
+
+    catalog = get_catalog()
+    results = dict()
+
+    for row in catalog.timeline_history(name, project, db_name, exact):
+
+        key = (row["db_name"], row["project"], row["timeline"])
+        backup = {
+            k: row[k]
+            for k in ("backup_id", "created_at", "path", "clips", "content_hash")
+        }
+
+        result = results.get(key)
+        if result is None:
+            result = results[key] = {
+                "database": row["db_name"],
+                "project": row["project"],
+                "timeline": row["timeline"],
+                "first_seen": backup,
+                "changes": [backup],
+            }
+        elif backup["content_hash"] != result["changes"][-1]["content_hash"]:
+            result["changes"].append(backup)
+
+        result["last_seen"] = backup
+
+    for result in results.values():
+        result["gone_in"] = catalog.next_indexed_backup(
+            result["database"], result["project"], result["last_seen"]["created_at"]
+        )
+
+    return list(results.values())
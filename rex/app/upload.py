@@ -0,0 +1,512 @@
+import glob
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from rex.settings.manager import SettingsManager
+from rex.app import hashing, metrics
+from rex.app.compression import COMPRESSED_SUFFIX, DICTIONARIES_DIR
+from rex.app.main import get_catalog
+from rex.app.store import CHUNKS_DIR, ChunkStore, load_manifest
+from rex.app.throttle import TokenBucket
+
+# Optional dependency, only needed with uploads enabled
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+settings = SettingsManager()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings["app"]["loglevel"])
+
+# Metadata key holding the digest an object was uploaded with
+DIGEST_KEY = "blake2b"
+
+# Throttled reads happen this much at a time
+READ_SIZE = 256 * 1024
+
+
+def _require_boto3():
+    if boto3 is None:
+        raise ImportError(
+            "Uploading needs the 'boto3' package. "
+            "Install it with 'pip install boto3' or disable uploads."
+        )
+
+
+def make_client():
+    """S3 client from the upload settings. Credentials come from the usual AWS places."""
+
+    _require_boto3()
+    upload_settings = settings["upload"]
+
+    session = boto3.session.Session(profile_name=upload_settings["profile"] or None)
+    return session.client(
+        "s3",
+        endpoint_url=upload_settings["endpoint_url"] or None,
+        region_name=upload_settings["region"] or None,
+        config=Config(
+            max_pool_connections=upload_settings["workers"] * 2,
+            retries={"max_attempts": 5, "mode": "adaptive"},
+        ),
+    )
+
+
+class _ThrottledBody(io.BytesIO):
+    """
+    Part body that takes from the shared bandwidth budget as it's sent
+
+    botocore rewinds the body to checksum it and to retry a failed request,
+    so only bytes past the furthest read so far are charged for.
+    """
+
+    def __init__(self, data: bytes, bucket: TokenBucket):
+        super().__init__(data)
+        self.bucket = bucket
+        self._charged = 0
+
+    def read(self, size=-1):
+        start = self.tell()
+        data = super().read(READ_SIZE if size is None or size < 0 else size)
+        end = start + len(data)
+        if end > self._charged:
+            self.bucket.consume(end - max(start, self._charged))
+            self._charged = end
+        return data
+
+
+class Uploader:
+    """
+    Push catalogued backups to S3-compatible storage
+
+    Works through backups the catalog hasn't recorded as uploaded to this bucket
+    and prefix, oldest first. Large files go up as multipart uploads, their parts
+    spread over worker threads. An interrupted multipart upload is picked up from
+    its last finished part. Objects already in the bucket with a matching digest
+    are skipped. De-duplicated chunks are recorded in the catalog once uploaded,
+    so they're never uploaded, or even looked up in the bucket, again.
+    All workers share one bandwidth cap.
+
+    Remote layout, under the prefix::
+
+        <database>/<project>/<backup file and checksum sidecars>
+        .chunks/<ab>/<digest>[.zst]
+        .dictionaries/<database>.<id>.zdict
+    """
+
+    def __init__(
+        self,
+        client=None,
+        bucket: str = None,
+        prefix: str = None,
+        workers: int = None,
+        rate_limit_mb: float = None,
+        cancel_event: threading.Event = None,
+        progress=None,
+    ):
+        """
+        Args:
+            client (optional): boto3 S3 client. Defaults to one from the upload settings.
+            rate_limit_mb (float, optional): Combined upload rate cap in MB/s, 0 for none
+            progress (optional): Called with an "upload" event as each backup's done,
+                e.g. ``Job.emit``
+        """
+
+        upload_settings = settings["upload"]
+
+        self.client = client or make_client()
+        self.bucket = bucket or upload_settings["bucket"]
+        self.prefix = (upload_settings["prefix"] if prefix is None else prefix).strip(
+            "/"
+        )
+        self.target = f"s3://{self.bucket}/{self.prefix}"
+        self.part_size = upload_settings["part_size_mb"] * 1024 * 1024
+        self.workers = workers or upload_settings["workers"]
+
+        if rate_limit_mb is None:
+            rate_limit_mb = upload_settings["rate_limit_mb_per_sec"]
+        self.bandwidth = TokenBucket(rate_limit_mb * 1024 * 1024)
+
+        self.cancel_event = cancel_event or threading.Event()
+        self.progress = progress
+        self.catalog = get_catalog()
+        self.pool = None
+        # Parts have their own, so files uploading from the pool never wait on it
+        self.part_pool = None
+
+        self.uploaded_bytes = 0
+        self.skipped_objects = 0
+        self._lock = threading.Lock()
+        # Shared by every backup in the store, so only looked up once a run
+        self._uploaded_dictionaries = set()
+
+    def key(self, *parts) -> str:
+        return "/".join(x for x in (self.prefix,) + parts if x)
+
+    def run(self, max_seconds: float = None, batch_size: int = 50) -> dict:
+        """
+        Upload due backups until there are none left or time runs out
+
+        Args:
+            max_seconds (float, optional): Stop taking new backups after this long.
+                Defaults to the ``upload.max_minutes_per_run`` setting, 0 for no limit.
+
+        Returns:
+            dict: Report with counts, ``bytes``, ``seconds``, ``mb_per_sec`` and any ``problems``
+        """
+
+        if max_seconds is None:
+            max_seconds = settings["upload"]["max_minutes_per_run"] * 60
+
+        start = time.perf_counter()
+        results = []
+        failed = set()
+        self._uploaded_dictionaries.clear()
+
+        with ThreadPoolExecutor(
+            self.workers, thread_name_prefix="rex-upload"
+        ) as pool, ThreadPoolExecutor(
+            self.workers, thread_name_prefix="rex-upload-part"
+        ) as part_pool:
+
+            self.pool = pool
+            self.part_pool = part_pool
+            while not self.cancel_event.is_set():
+
+                if max_seconds and time.perf_counter() - start > max_seconds:
+                    break
+
+                batch = [
+                    x
+                    for x in self.catalog.upload_queue(
+                        self.target,
+                        settings["upload"]["projects"],
+                        settings["upload"]["databases"],
+                        batch_size + len(failed),
+                    )
+                    if x["id"] not in failed
+                ]
+                if not batch:
+                    break
+
+                for backup in batch[:batch_size]:
+
+                    if self.cancel_event.is_set():
+                        break
+
+                    result = self.upload_backup(backup)
+                    results.append(result)
+                    if result["error"]:
+                        failed.add(backup["id"])
+
+                    if self.progress:
+                        self.progress(
+                            type="upload",
+                            backup_id=result["id"],
+                            path=result["path"],
+                            error=result["error"],
+                            bytes=self.uploaded_bytes,
+                        )
+
+        seconds = time.perf_counter() - start
+        report = {
+            "uploaded": sum(not x["error"] for x in results),
+            "failed": len(failed),
+            "skipped_objects": self.skipped_objects,
+            "bytes": self.uploaded_bytes,
+            "seconds": round(seconds, 3),
+            "mb_per_sec": (
+                round(self.uploaded_bytes / 1024**2 / seconds, 2) if seconds else 0
+            ),
+            "cancelled": self.cancel_event.is_set(),
+            "problems": [x for x in results if x["error"]],
+        }
+
+        logger.info(
+            f"Uploaded {report['uploaded']} backups to {self.target} "
+            f"({report['mb_per_sec']} MB/s), {report['failed']} failed"
+        )
+        for x in report["problems"]:
+            logger.error(f"[red]Couldn't upload '{x['path']}' - {x['error']}")
+
+        return report
+
+    def upload_backup(self, backup: dict) -> dict:
+        """
+        Upload one backup with everything needed to restore it, then record it in the catalog
+
+        Returns:
+            dict: ``id``, ``path`` and ``error``
+        """
+
+        result = {"id": backup["id"], "path": backup["path"], "error": None}
+        start = time.perf_counter()
+        store_dir = os.path.dirname(backup["path"])
+        folder = (backup["db_name"], backup["project"])
+
+        try:
+
+            futures = []
+            chunks = dict()
+            digest = backup["digests"].get(DIGEST_KEY)
+
+            if backup["storage"] == "manifest":
+
+                # Manifest digests are of the original .drp, not the manifest
+                digest = None
+                needed = {x for x, _ in load_manifest(backup["path"])["chunks"]}
+                uploaded = self.catalog.uploaded_chunks(self.target, needed)
+                self._count_skip(len(uploaded))
+
+                for chunk in needed - uploaded:
+                    chunks[chunk] = self.pool.submit(
+                        self._upload_chunk, store_dir, chunk
+                    )
+                futures.extend(chunks.values())
+
+            for path in glob.glob(os.path.join(store_dir, DICTIONARIES_DIR, "*.zdict")):
+                futures.append(self.pool.submit(self._upload_dictionary, path))
+
+            for path in self._sidecars(backup):
+                futures.append(
+                    self.pool.submit(
+                        self.upload_file,
+                        path,
+                        self.key(*folder, os.path.basename(path)),
+                    )
+                )
+
+            try:
+                self.upload_file(
+                    backup["path"],
+                    self.key(*folder, os.path.basename(backup["path"])),
+                    digest,
+                )
+
+            finally:
+                # Chunks that made it count, even if the backup didn't
+                wait(futures)
+                self.catalog.add_uploaded_chunks(
+                    self.target, [k for k, v in chunks.items() if not v.exception()]
+                )
+
+            for future in futures:
+                future.result()
+
+            if self.cancel_event.is_set():
+                raise InterruptedError("Cancelled")
+
+            self.catalog.set_uploaded(backup["id"], self.target)
+
+        except Exception as e:
+            result["error"] = str(e)
+
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="upload")
+        if result["error"]:
+            metrics.STAGE_FAILURES.inc(stage="upload")
+        return result
+
+    def _sidecars(self, backup: dict) -> list:
+        # Manifest sidecars are named after the original .drp
+        bases = {
+            backup["path"],
+            os.path.join(os.path.dirname(backup["path"]), backup["filename"]),
+        }
+        return [
+            hashing.sidecar_path(base, algorithm)
+            for base in bases
+            for algorithm in backup["digests"]
+            if os.path.exists(hashing.sidecar_path(base, algorithm))
+        ]
+
+    def _upload_chunk(self, store_dir: str, digest: str):
+
+        path = ChunkStore(os.path.join(store_dir, CHUNKS_DIR)).chunk_path(digest)
+        if not os.path.exists(path):
+            path += COMPRESSED_SUFFIX
+
+        # Content-addressed, so other backups' uploads of a chunk count too
+        self.upload_file(
+            path, self.key(CHUNKS_DIR, digest[:2], os.path.basename(path)), digest
+        )
+
+    def _upload_dictionary(self, path: str):
+
+        # Never changed once trained, a new one gets a new ID
+        key = self.key(DICTIONARIES_DIR, os.path.basename(path))
+        with self._lock:
+            if key in self._uploaded_dictionaries:
+                self.skipped_objects += 1
+                return
+
+        self.upload_file(path, key)
+        with self._lock:
+            self._uploaded_dictionaries.add(key)
+
+    def _remote_digest(self, key: str) -> str:
+        """The digest an object was uploaded with. ``None`` if it doesn't exist."""
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+        return head.get("Metadata", {}).get(DIGEST_KEY, "")
+
+    def _count_skip(self, amount: int = 1):
+        with self._lock:
+            self.skipped_objects += amount
+
+    def _count_bytes(self, amount: int):
+        with self._lock:
+            self.uploaded_bytes += amount
+        metrics.UPLOAD_BYTES.inc(amount)
+
+    def upload_file(self, path: str, key: str, digest: str = None):
+        """
+        Upload a file, unless the bucket already has it with the same digest
+
+        Args:
+            digest (str, optional): blake2b hex digest of the file. Hashed here if not given.
+        """
+
+        if digest is None:
+            digest = hashing.hash_file(path, [DIGEST_KEY])[DIGEST_KEY]
+
+        if self._remote_digest(key) == digest:
+            self._count_skip()
+            return
+
+        size = os.path.getsize(path)
+        metadata = {DIGEST_KEY: digest}
+
+        if size <= self.part_size:
+            with open(path, "rb") as file:
+                body = _ThrottledBody(file.read(), self.bandwidth)
+            self.client.put_object(
+                Bucket=self.bucket, Key=key, Body=body, Metadata=metadata
+            )
+            self._count_bytes(size)
+            return
+
+        self._upload_multipart(path, key, size, metadata)
+
+    def _upload_multipart(self, path: str, key: str, size: int, metadata: dict):
+
+        upload_id, done = self._resume_multipart(key, size)
+        if upload_id is None:
+            upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=key, Metadata=metadata
+            )["UploadId"]
+        elif done:
+            logger.info(f"Resuming upload of '{key}' after {len(done)} parts")
+
+        def upload_part(number: int, offset: int):
+
+            if self.cancel_event.is_set():
+                raise InterruptedError("Cancelled")
+
+            with open(path, "rb") as file:
+                file.seek(offset)
+                data = file.read(self.part_size)
+
+            etag = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=_ThrottledBody(data, self.bandwidth),
+            )["ETag"]
+            self._count_bytes(len(data))
+            return etag
+
+        futures = {
+            number: self.part_pool.submit(upload_part, number, offset)
+            for number, offset in enumerate(range(0, size, self.part_size), start=1)
+            if number not in done
+        }
+        wait(futures.values())
+
+        # Left in place on failure, to be resumed next time
+        parts = dict(done)
+        for number, future in futures.items():
+            parts[number] = future.result()
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": k, "ETag": v} for k, v in sorted(parts.items())
+                ]
+            },
+        )
+
+    def _resume_multipart(self, key: str, size: int) -> tuple:
+        """
+        Find an unfinished multipart upload of ``key`` to carry on with
+
+        Backup filenames are unique, so an upload to the same key is of the same file.
+        Its parts are only reused if they're the sizes this upload would make.
+        Any other unfinished uploads of the key are aborted.
+
+        Returns:
+            tuple: (upload id, {part number: ETag} of finished parts), or (None, {})
+        """
+
+        resumed = None, {}
+        uploads = self.client.list_multipart_uploads(Bucket=self.bucket, Prefix=key)
+
+        for upload in uploads.get("Uploads", []):
+
+            if upload["Key"] != key:
+                continue
+
+            upload_id = upload["UploadId"]
+            parts = [
+                part
+                for page in self.client.get_paginator("list_parts").paginate(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id
+                )
+                for part in page.get("Parts", [])
+            ]
+
+            if resumed[0] is None and all(
+                x["Size"]
+                == min(self.part_size, size - (x["PartNumber"] - 1) * self.part_size)
+                for x in parts
+            ):
+                resumed = upload_id, {x["PartNumber"]: x["ETag"] for x in parts}
+                continue
+
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id
+            )
+
+        return resumed
+
+
+_upload_lock = threading.Lock()
+
+
+def run_upload(cancel_event: threading.Event = None, progress=None) -> dict:
+    """Upload due backups, unless an upload is already running. Returns ``None`` if so."""
+
+    if not _upload_lock.acquire(blocking=False):
+        logger.info("Upload already running, skipping")
+        return None
+
+    try:
+        return Uploader(cancel_event=cancel_event, progress=progress).run()
+    finally:
+        _upload_lock.release()
@@ -7,23 +7,23 @@ from rich.logging import RichHandler
 from rich.prompt import Prompt
 
 
+def rich_handler() -> RichHandler:
+    """Console handler with rich markup and tracebacks"""
+
+    handler = RichHandler(
+        rich_tracebacks=True,
+        tracebacks_extra_lines=1,
+        markup=True,
+    )
+    handler.setFormatter(logging.Formatter("%(message)s", datefmt="[%X]"))
+    return handler
+
+
 def setup_rich_logging():
 
     """Set logger to rich, allowing for console markup."""
 
-    FORMAT = "%(message)s"
-    logging.basicConfig(
-        level="WARNING",
-        format=FORMAT,
-        datefmt="[%X]",
-        handlers=[
-            RichHandler(
-                rich_tracebacks=True,
-                tracebacks_extra_lines=1,
-                markup=True,
-            )
-        ],
-    )
+    logging.basicConfig(level="WARNING", handlers=[rich_handler()])
 
 
 setup_rich_logging()
@@ -0,0 +1,168 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from rich.errors import MarkupError
+from rich.text import Text
+
+from rex.app.utils.core import rich_handler
+
+LOGFILE_NAME = "rex.jsonl"
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """A JSON object per record, with rich markup stripped from the message"""
+
+    def format(self, record: logging.LogRecord) -> str:
+
+        message = record.getMessage()
+        try:
+            message = Text.from_markup(message).plain
+        except MarkupError:
+            pass
+
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": message,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+class RotatingJSONLinesHandler(logging.handlers.RotatingFileHandler):
+    """
+    JSON lines, rolled over at ``max_bytes`` or every ``max_age`` seconds, whichever's first
+
+    Keeps ``backup_count`` old files alongside, numbered like ``RotatingFileHandler``'s.
+    """
+
+    def __init__(
+        self, filename: str, max_bytes: int, backup_count: int, max_age: float = 0
+    ):
+        super().__init__(
+            filename,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
+        self.max_age = max_age
+        self.rollover_at = time.time() + max_age
+        self.setFormatter(JSONLinesFormatter())
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if self.max_age and time.time() >= self.rollover_at:
+            return 1
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.max_age
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records as they are, apart from merging in their arguments
+
+    The stock one formats everything up front, tracebacks included, on the logging
+    thread. Keeping ``exc_info`` leaves that to the listener and keeps rich tracebacks.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments could change before the listener gets to them
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def setup_queued_logging() -> logging.handlers.QueueListener:
+    """
+    Log through a queue, for long-running processes like the Rex server
+
+    Logging calls only put the record on a queue. A background thread renders it to
+    the console with rich and, with ``app.log_to_file``, appends it as JSON to
+    ``rex.jsonl`` in ``app.logfile_path``. Changes to the app settings apply live.
+
+    Returns:
+        QueueListener: The background listener. ``stop_queued_logging`` flushes it.
+    """
+
+    from rex.settings.manager import SettingsManager
+
+    settings = SettingsManager()
+
+    def reconfigure(changed: set):
+        if "app" in changed:
+            _start(settings["app"])
+
+    with _lock:
+        first = _listener is None
+    _start(settings["app"])
+    if first:
+        settings.subscribe(reconfigure)
+
+    return _listener
+
+
+def _start(app_settings: dict):
+    """Swap in a listener for the given settings, flushing the old one"""
+
+    global _listener
+
+    handlers = [rich_handler()]
+    if app_settings["log_to_file"]:
+        handlers.append(
+            RotatingJSONLinesHandler(
+                os.path.join(app_settings["logfile_path"], LOGFILE_NAME),
+                max_bytes=int(app_settings["log_max_mb"] * 1024**2),
+                backup_count=app_settings["log_backups"],
+                max_age=app_settings["log_rotate_hours"] * 3600,
+            )
+        )
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+
+    with _lock:
+        root = logging.getLogger()
+        root.handlers = [_QueueHandler(log_queue)]
+        old, _listener = _listener, listener
+
+    if old is not None:
+        _stop(old)
+
+
+def _stop(listener: logging.handlers.QueueListener):
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def stop_queued_logging():
+    """Write out anything still queued, then log straight to the console again"""
+
+    global _listener
+
+    with _lock:
+        listener, _listener = _listener, None
+        if listener is None:
+            return
+        logging.getLogger().handlers = [rich_handler()]
+
+    _stop(listener)
@@ -0,0 +1,267 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from rex.settings.manager import SettingsManager
+from rex.app import hashing, metrics
+from rex.app.main import get_catalog
+from rex.app.reader import expected_digests, iter_backup
+from rex.app.store import CHUNKS_DIR, ChunkStore, load_manifest
+from rex.app.throttle import TokenBucket
+
+settings = SettingsManager()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings["app"]["loglevel"])
+
+
+class Verifier:
+    """
+    Re-hash backups and compare them with the digests recorded at backup time
+
+    Works through the catalog's verification queue in batches, never-verified first,
+    recording each result as it goes so an interrupted sweep resumes where it stopped.
+    Reads are shared between worker threads through one token bucket,
+    so a sweep never takes more than its share of the disk or network.
+
+    De-duplicated backups share most of their chunks. Each chunk is re-hashed
+    against its content address once per sweep, and manifests are checked
+    against those results, so a sweep reads what's stored rather than every backup
+    in full.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        rate_limit_mb: float = None,
+        cancel_event: threading.Event = None,
+        progress=None,
+    ):
+        """
+        Args:
+            cancel_event (threading.Event, optional): Stops the sweep between backups
+            progress (optional): Called with a "verify" event as each backup's done,
+                e.g. ``Job.emit``
+        """
+
+        verify_settings = settings["verify"]
+
+        self.workers = workers or verify_settings["workers"]
+        if rate_limit_mb is None:
+            rate_limit_mb = verify_settings["rate_limit_mb_per_sec"]
+        self.bucket = TokenBucket(rate_limit_mb * 1024 * 1024)
+
+        self.cancel_event = cancel_event or threading.Event()
+        self.progress = progress
+        self.catalog = get_catalog()
+
+        self._stores = dict()
+        # Chunk checks by store and digest, shared so each chunk's only read once a sweep
+        self._chunks = dict()
+        self._chunks_lock = threading.Lock()
+
+    def _check_chunk(self, store_dir: str, digest: str) -> tuple:
+        """``ChunkStore.check_chunk`` the first time a chunk's asked for, then its result"""
+
+        with self._chunks_lock:
+            if store_dir not in self._stores:
+                self._stores[store_dir] = ChunkStore(
+                    os.path.join(store_dir, CHUNKS_DIR)
+                )
+            store = self._stores[store_dir]
+
+            # The same chunk in another store is another file
+            key = (store.root, digest)
+            future = self._chunks.get(key)
+            first = future is None
+            if first:
+                future = self._chunks[key] = Future()
+
+        if first:
+            try:
+                length, stored = store.check_chunk(digest)
+                self.bucket.consume(stored)
+                future.set_result((length, stored))
+                return length, stored
+            except Exception as e:
+                future.set_exception(e)
+                raise
+
+        # Already read, for this or another backup
+        return future.result()[0], 0
+
+    def _verify_manifest(self, backup: dict) -> int:
+        """
+        Check every chunk a manifest lists is stored intact
+
+        Returns:
+            int: Bytes read, only counting chunks not already checked
+
+        Raises:
+            FileNotFoundError: If the manifest or a chunk is gone
+            ValueError: If a chunk is corrupt, or not the length the manifest says
+        """
+
+        store_dir = os.path.dirname(backup["path"])
+        read = 0
+
+        for digest, length in load_manifest(backup["path"])["chunks"]:
+            actual, stored = self._check_chunk(store_dir, digest)
+            if actual != length:
+                raise ValueError(
+                    f"Chunk '{digest}' is {actual} bytes, expected {length}"
+                )
+            read += stored
+
+        return read
+
+    def verify(self, backup: dict) -> dict:
+        """
+        Verify one backup and record the result in the catalog
+
+        Returns:
+            dict: ``id``, ``path``, ``state`` ("ok", "corrupt" or "missing"), ``bytes`` and ``error``
+        """
+
+        result = {
+            "id": backup["id"],
+            "path": backup["path"],
+            "state": "ok",
+            "bytes": 0,
+            "error": None,
+        }
+
+        try:
+
+            if backup["storage"] == "manifest":
+                result["bytes"] = self._verify_manifest(backup)
+                return self._record(result)
+
+            expected = expected_digests(backup)
+            if not expected:
+                logger.warning(f"[yellow]No recorded digests for '{backup['path']}'")
+
+            hasher = hashing.MultiHasher(list(expected) or ["blake2b"])
+            for data in iter_backup(backup, decompress=False):
+                self.bucket.consume(len(data))
+                hasher.update(data)
+
+            result["bytes"] = hasher.bytes_hashed
+            mismatched = [
+                k for k, v in hasher.hexdigests().items() if expected.get(k) != v
+            ]
+            if expected and mismatched:
+                result["state"] = "corrupt"
+                result["error"] = f"Checksum mismatch ({', '.join(mismatched)})"
+
+        except FileNotFoundError as e:
+            result["state"] = "missing"
+            result["error"] = str(e)
+
+        except Exception as e:
+            result["state"] = "corrupt"
+            result["error"] = str(e)
+
+        return self._record(result)
+
+    def _record(self, result: dict) -> dict:
+        self.catalog.set_verification(result["id"], result["state"])
+        metrics.VERIFIED.inc(state=result["state"])
+        metrics.VERIFIED_BYTES.inc(result["bytes"])
+        if self.progress:
+            self.progress(
+                type="verify",
+                backup_id=result["id"],
+                path=result["path"],
+                state=result["state"],
+            )
+        return result
+
+    def run(self, max_seconds: float = None, batch_size: int = 50) -> dict:
+        """
+        Verify due backups until the queue is empty, time runs out or it's cancelled
+
+        Args:
+            max_seconds (float, optional): Stop starting on backups after this long.
+                Defaults to the ``verify.max_minutes_per_run`` setting.
+            batch_size (int, optional): Backups fetched from the queue at a time
+
+        Returns:
+            dict: Report with counts, ``bytes``, ``seconds``, ``mb_per_sec`` and any ``problems``
+        """
+
+        if max_seconds is None:
+            max_seconds = settings["verify"]["max_minutes_per_run"] * 60
+
+        reverify_before = (
+            time.time() - settings["verify"]["reverify_after_days"] * 86400
+        )
+        start = time.perf_counter()
+        deadline = start + max_seconds
+        results = []
+
+        def verify_in_time(backup: dict) -> dict:
+            # Left for the next run, still due
+            if time.perf_counter() >= deadline or self.cancel_event.is_set():
+                return None
+            return self.verify(backup)
+
+        try:
+            with ThreadPoolExecutor(
+                self.workers, thread_name_prefix="rex-verify"
+            ) as pool:
+
+                while time.perf_counter() < deadline and not self.cancel_event.is_set():
+
+                    batch = self.catalog.verification_queue(reverify_before, batch_size)
+                    if not batch:
+                        break
+
+                    results.extend(x for x in pool.map(verify_in_time, batch) if x)
+
+        finally:
+            # A chunk could change before the next sweep, and this would grow unbounded
+            with self._chunks_lock:
+                self._chunks.clear()
+
+        seconds = time.perf_counter() - start
+        total_bytes = sum(x["bytes"] for x in results)
+
+        report = {
+            "checked": len(results),
+            "ok": sum(x["state"] == "ok" for x in results),
+            "corrupt": sum(x["state"] == "corrupt" for x in results),
+            "missing": sum(x["state"] == "missing" for x in results),
+            "bytes": total_bytes,
+            "seconds": round(seconds, 3),
+            "mb_per_sec": round(total_bytes / 1024**2 / seconds, 2) if seconds else 0,
+            "problems": [x for x in results if x["state"] != "ok"],
+        }
+
+        logger.info(
+            f"Verified {report['checked']} backups "
+            f"({report['mb_per_sec']} MB/s): {report['ok']} ok, "
+            f"{report['corrupt']} corrupt, {report['missing']} missing"
+        )
+        for x in report["problems"]:
+            logger.error(f"[red]{x['state'].upper()}: '{x['path']}' - {x['error']}")
+
+        return report
+
+
+_verify_lock = threading.Lock()
+
+
+def run_verification(cancel_event: threading.Event = None, progress=None) -> dict:
+    """Run a verification sweep, unless one is already running. Returns ``None`` if so."""
+
+    if not _verify_lock.acquire(blocking=False):
+        logger.info("Verification already running, skipping")
+        return None
+
+    try:
+        return Verifier(cancel_event=cancel_event, progress=progress).run()
+    finally:
+        _verify_lock.release()
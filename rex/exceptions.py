@@ -0,0 +1,2 @@
+class RestoreError(Exception):
+    """A backup couldn't be found, verified or imported"""
@@ -1,21 +1,20 @@
+import hashlib
+import json
 import logging
 import operator
 import os
 import shutil
+import tempfile
+import threading
+import time
 import webbrowser
 from pathlib import Path
-from functools import reduce
+from functools import lru_cache, reduce
 
-from deepdiff import DeepDiff
 from rich import print
 from rich.prompt import Confirm
-from ruamel.yaml import YAML
-from yaspin import yaspin
-
-from schema import SchemaError
 
 from rex.app.utils import core
-from rex.settings.schema import settings_schema
 
 core.install_rich_tracebacks()
 logger = logging.getLogger(__name__)
@@ -32,6 +31,19 @@ USER_SETTINGS_FILE = os.path.join(
     "user_settings.yml",
 )
 
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "schema.py")
+
+# Validated user settings, keyed by a hash of everything that went into checking them
+SNAPSHOT_FILENAME = ".settings_snapshot.json"
+
+# Checked against the filesystem by the schema, so checked again on a snapshot hit
+PATH_KEYS = (("app", "logfile_path"), ("backup", "static_dir"))
+
+
+@lru_cache(maxsize=None)
+def _split_keys(keys: str) -> tuple:
+    return tuple(keys.split(" "))
+
 
 class Singleton(type):
     _instances = {}
@@ -49,10 +61,26 @@ class SettingsManager(metaclass=Singleton):
         user_settings_file=USER_SETTINGS_FILE,
     ):
 
-        self.yaml = YAML()
         self.default_file = default_settings_file
         self.user_file = user_settings_file
+        self.snapshot_file = os.path.join(
+            os.path.dirname(self.user_file), SNAPSHOT_FILENAME
+        )
         self.user_settings = dict()
+        self.default_settings = None
+
+        self._subscribers = []
+        self._watcher = None
+
+        # Unchanged settings were validated last time, no need to again
+        self._key = self._settings_key()
+        if self._load_snapshot():
+            return
+
+        from ruamel.yaml import YAML
+        from yaspin import yaspin
+
+        self.yaml = YAML()
 
         # Originally had default settings validated against schema too
         # but realised testing a path exists is not a good idea for defaults.
@@ -76,6 +104,9 @@ class SettingsManager(metaclass=Singleton):
 
         self.spinner.ok("✅ ")
 
+        self._key = self._settings_key()
+        self._save_snapshot()
+
     def __len__(self):
 
         return len(self.user_settings)
@@ -83,10 +114,71 @@ class SettingsManager(metaclass=Singleton):
     def __getitem__(self, __items):
 
         if type(__items) == str:
-            __items = __items.split(" ")
+            __items = _split_keys(__items)
 
         return reduce(operator.getitem, __items, self.user_settings)
 
+    def _settings_key(self) -> str:
+        """
+        Hash of the default and user settings files and the schema
+
+        Returns:
+            str: hex digest, or None if the user settings file doesn't exist
+        """
+
+        key = hashlib.blake2b(digest_size=16)
+        for path in (self.default_file, self.user_file, SCHEMA_FILE):
+            try:
+                with open(path, "rb") as file:
+                    key.update(file.read())
+            except FileNotFoundError:
+                return None
+
+        return key.hexdigest()
+
+    def _load_snapshot(self) -> bool:
+        """Load user settings from the snapshot, if it matches the files on disk"""
+
+        if self._key is None:
+            return False
+
+        try:
+            with open(self.snapshot_file) as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            return False
+
+        if snapshot.get("key") != self._key:
+            return False
+
+        # Files unchanged doesn't mean the paths in them still exist
+        try:
+            for keys in PATH_KEYS:
+                path = reduce(operator.getitem, keys, snapshot["settings"])
+                if not os.path.exists(path):
+                    logger.debug(f"'{path}' is gone, validating settings again")
+                    return False
+        except (KeyError, TypeError):
+            return False
+
+        logger.debug(f"Loaded validated settings from {self.snapshot_file}")
+        self.user_settings = snapshot["settings"]
+        return True
+
+    def _save_snapshot(self):
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.snapshot_file), suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as file:
+                json.dump({"key": self._key, "settings": self.user_settings}, file)
+            os.replace(tmp_path, self.snapshot_file)
+
+        except (OSError, TypeError) as e:
+            # Not fatal, we'll just validate again next time
+            logger.debug(f"Couldn't save settings snapshot: {e}")
+
     def _load_default_file(self):
         """Load default settings from yaml"""
 
@@ -164,6 +256,8 @@ class SettingsManager(metaclass=Singleton):
         # We can also use the default option in Schema to add default keys.
         # Then we can get rid of the default_settings.yml file.
 
+        from deepdiff import DeepDiff
+
         diffs = DeepDiff(self.default_settings, self.user_settings)
         logger.debug("[magenta]Diffs:[/]\n")
 
@@ -195,6 +289,9 @@ class SettingsManager(metaclass=Singleton):
     def _validate_schema(self):
         """Validate user settings against schema"""
 
+        from schema import SchemaError
+        from rex.settings.schema import settings_schema
+
         logger.debug(f"Validating user settings against schema")
 
         try:
@@ -213,3 +310,138 @@ class SettingsManager(metaclass=Singleton):
     def update(self, dict_: dict):
         logger.info(f"[yellow]Reconfigured settings:\n{dict_}")
         self.user_settings.update(dict_)
+
+    def reload(self) -> bool:
+        """
+        Re-read and validate the user settings file, then notify subscribers
+
+        Unlike the first load, invalid settings don't exit. They're logged and
+        the current settings are kept.
+
+        Returns:
+            bool: ``True`` if new settings were applied
+        """
+
+        from deepdiff import DeepDiff
+        from ruamel.yaml import YAML
+        from rex.settings.schema import settings_schema
+
+        key = self._settings_key()
+        if key is None or key == self._key:
+            return False
+
+        try:
+
+            yaml = YAML()
+            with open(self.default_file) as file:
+                default_settings = yaml.load(file)
+            with open(self.user_file) as file:
+                user_settings = yaml.load(file)
+
+            missing = DeepDiff(default_settings, user_settings).get(
+                "dictionary_item_removed"
+            )
+            if missing:
+                raise ValueError(f"Missing settings: {', '.join(missing)}")
+
+            settings_schema.validate(user_settings)
+
+        except Exception as e:
+            logger.error(
+                f"[red]Couldn't reload settings, keeping the current ones[/]\n{e}"
+            )
+            return False
+
+        # Plain types, same as a snapshot load
+        user_settings = json.loads(json.dumps(user_settings))
+
+        changed = {
+            x
+            for x in set(user_settings) | set(self.user_settings)
+            if user_settings.get(x) != self.user_settings.get(x)
+        }
+
+        self.user_settings = user_settings
+        self._key = key
+        self._save_snapshot()
+
+        if not changed:
+            return False
+
+        logger.warning(
+            f"[green]Reloaded settings, changed: {', '.join(sorted(changed))}"
+        )
+
+        if "app" in changed:
+            self._apply_loglevel()
+
+        for callback in self._subscribers:
+            try:
+                callback(changed)
+            except Exception:
+                logger.exception(f"[red]Settings subscriber {callback} failed")
+
+        return True
+
+    def _apply_loglevel(self):
+        """Set the level on every Rex logger, as each module does on import"""
+
+        level = self["app"]["loglevel"]
+        for name, x in logging.Logger.manager.loggerDict.items():
+            if name.startswith("rex") and isinstance(x, logging.Logger):
+                x.setLevel(level)
+
+    def subscribe(self, callback):
+        """
+        Call ``callback(changed)`` after settings are reloaded
+
+        Args:
+            callback: Given the set of changed top-level sections, e.g. ``{"schedule"}``.
+                Called from the watcher thread.
+        """
+
+        self._subscribers.append(callback)
+
+    def watch(self, interval: float = 1.0):
+        """
+        Reload settings whenever the user settings file changes
+
+        Polls the file's modification time on a daemon thread, and reloads once
+        it's been unchanged for a poll. Safe to call more than once.
+
+        Args:
+            interval (float): Seconds between checks
+        """
+
+        if self._watcher is not None:
+            return
+
+        def signature():
+            try:
+                stat = os.stat(self.user_file)
+                return stat.st_mtime_ns, stat.st_size
+            except OSError:
+                return None
+
+        def poll():
+
+            last = signature()
+            pending = False
+            while True:
+
+                time.sleep(interval)
+                current = signature()
+
+                # Wait for the file to settle, editors don't always save in one write
+                if current != last:
+                    last = current
+                    pending = True
+                elif pending:
+                    pending = False
+                    self.reload()
+
+        self._watcher = threading.Thread(
+            target=poll, name="rex-settings-watcher", daemon=True
+        )
+        self._watcher.start()
+        logger.debug(f"Watching {self.user_file} for changes")
@@ -2,6 +2,9 @@ import os
 from schema import Schema, And, Optional, Use
 import ipaddress
 
+from rex.app.hashing import ALGORITHMS
+from rex.app.schedules import CronSchedule
+
 settings_schema = Schema(
     {
         "app": {
@@ -9,19 +12,135 @@ settings_schema = Schema(
             in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
             "log_to_file": bool,
             "logfile_path": lambda p: os.path.exists(p),
+            "log_max_mb": And(Use(float), lambda n: n > 0),
+            "log_rotate_hours": And(Use(float), lambda n: n >= 0),
+            "log_backups": And(int, lambda n: n >= 0),
         },
         "schedule": {
-            "frequency_in_minutes": int,
+            "frequency_in_minutes": And(int, lambda n: n >= 0),
             "countdown_warning": int,
+            "projects": [
+                And(
+                    {
+                        "project": str,
+                        Optional("cron"): And(str, lambda c: bool(CronSchedule(c))),
+                        Optional("frequency_in_minutes"): And(int, lambda n: n > 0),
+                        Optional("countdown_warning"): int,
+                    },
+                    lambda x: ("cron" in x) != ("frequency_in_minutes" in x),
+                    error="Project schedules need one of 'cron' or 'frequency_in_minutes'",
+                )
+            ],
+        },
+        "activity": {
+            "enabled": bool,
+            "process_names": [str],
+            "resolve_cpu_percent": And(Use(float), lambda n: 0 <= n <= 100),
+            "resolve_read_mb_per_sec": And(Use(float), lambda n: n >= 0),
+            "min_idle_seconds": And(Use(float), lambda n: n >= 0),
+            "max_delay_minutes": And(Use(float), lambda n: n >= 0),
+            "busy_io_mb_per_sec": And(Use(float), lambda n: n >= 0),
+        },
+        "staging": {
+            "enabled": bool,
+            "dir": str,
+            "max_gb": And(Use(float), lambda n: n > 0),
+            "wait_seconds": And(Use(float), lambda n: n >= 0),
+            "workers": And(int, lambda n: n >= 1),
+            "retries": And(int, lambda n: n >= 0),
+        },
+        "compression": {
+            "enabled": bool,
+            "level": And(int, lambda n: -7 <= n <= 22),
+            "threads": And(int, lambda n: n >= -1),
+            "dictionary": bool,
+            "dictionary_size_kb": And(int, lambda n: n > 0),
+        },
+        "verify": {
+            "enabled": bool,
+            "frequency_in_minutes": And(int, lambda n: n > 0),
+            "max_minutes_per_run": And(int, lambda n: n > 0),
+            "reverify_after_days": And(int, lambda n: n >= 0),
+            "workers": And(int, lambda n: n >= 1),
+            "rate_limit_mb_per_sec": And(Use(float), lambda n: n >= 0),
+        },
+        "databases": {
+            "include": [str],
+            "projects": [str],
+            "frequency_in_minutes": And(int, lambda n: n >= 0),
+            "return_to_current": bool,
+        },
+        "restore": {
+            "staging_dir": str,
+            "keep_staged": bool,
+        },
+        "upload": {
+            "enabled": bool,
+            "cron": And(str, lambda c: bool(CronSchedule(c))),
+            "max_minutes_per_run": And(int, lambda n: n >= 0),
+            "endpoint_url": str,
+            "region": str,
+            "profile": str,
+            "bucket": And(str, len),
+            "prefix": str,
+            "part_size_mb": And(int, lambda n: n >= 5),
+            "workers": And(int, lambda n: n >= 1),
+            "rate_limit_mb_per_sec": And(Use(float), lambda n: n >= 0),
+            "projects": [str],
+            "databases": [str],
+        },
+        "retention": {
+            "enabled": bool,
+            "frequency_in_minutes": And(int, lambda n: n > 0),
+            "max_minutes_per_run": And(int, lambda n: n > 0),
+            "keep_last": And(int, lambda n: n >= 1),
+            "hourly": And(int, lambda n: n >= 0),
+            "daily": And(int, lambda n: n >= 0),
+            "weekly": And(int, lambda n: n >= 0),
+            "monthly": And(int, lambda n: n >= 0),
+            "projects": [
+                {
+                    "project": str,
+                    Optional("database"): str,
+                    Optional("keep_last"): And(int, lambda n: n >= 1),
+                    Optional("hourly"): And(int, lambda n: n >= 0),
+                    Optional("daily"): And(int, lambda n: n >= 0),
+                    Optional("weekly"): And(int, lambda n: n >= 0),
+                    Optional("monthly"): And(int, lambda n: n >= 0),
+                }
+            ],
         },
         "server": {
             "port": int,
+            "scheduler_metrics_port": And(int, lambda n: n >= 0),
             "ip": Use(ipaddress.IPv4Address),
+            "cache": {
+                "max_entries": And(int, lambda n: n > 0),
+                "ttl_seconds": {
+                    str: And(Use(float), lambda n: n >= 0),
+                },
+            },
+        },
+        "catalog": {
+            "path": str,
         },
         "backup": {
             "active_only": bool,
             "in_static_dir": bool,
             "static_dir": lambda p: os.path.exists(p),
+            "deduplicate": bool,
+            "checksum_algorithms": And([lambda a: a in ALGORITHMS], len),
+            "chunk_size_kb": And(int, lambda n: n >= 4),
+            "skip_unchanged": bool,
+            "skip_on_probes": bool,
+            "max_skip_minutes": And(int, lambda n: n >= 0),
+            "index_timelines": bool,
+            "bulk": {
+                "export_workers": And(int, lambda n: n >= 1),
+                "finalize_workers": And(int, lambda n: n >= 1),
+                "retries": And(int, lambda n: n >= 0),
+                "timeout_in_seconds": And(int, lambda n: n > 0),
+            },
         },
     },
     ignore_extra_keys=True,
@@ -0,0 +1,105 @@
+"""
+Setup and fixtures shared by the test suite and the benchmarks
+
+Both run against a ``FakeResolve`` with a throwaway static dir, catalog and
+settings file, so they run on any machine, Resolve or not. A conftest calls
+``isolate_settings`` before anything imports the settings, then imports the
+fixtures and hooks it wants from here. Needs pytest, so only import it from tests.
+
+Usage:
+    WORK_DIR = isolate_settings("rex-test-", "projects=2,size_mb=1")
+
+    from rex.testing import catalog, configure, pytest_sessionfinish  # noqa: F401
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Work dirs made by ``isolate_settings``, removed when the session ends
+_work_dirs = []
+
+
+def isolate_settings(prefix: str, fake_resolve: str) -> str:
+    """
+    Load settings from a throwaway work dir, with backups and the catalog in it
+
+    Settings are loaded once per process, so this has to run first.
+
+    Args:
+        prefix (str): Work dir name prefix
+        fake_resolve (str): ``REX_FAKE_RESOLVE`` spec, unless it's already set
+
+    Returns:
+        str: The work dir. Backups go in its "backups" dir.
+    """
+
+    work_dir = tempfile.mkdtemp(prefix=prefix)
+    _work_dirs.append(work_dir)
+    os.environ.setdefault("REX_FAKE_RESOLVE", fake_resolve)
+
+    from ruamel.yaml import YAML
+    from rex.settings.manager import DEFAULT_SETTINGS_FILE, SettingsManager
+
+    yaml = YAML()
+    with open(DEFAULT_SETTINGS_FILE) as file:
+        user_settings = yaml.load(file)
+
+    static_dir = os.path.join(work_dir, "backups")
+    user_settings["app"]["logfile_path"] = work_dir
+    user_settings["backup"]["static_dir"] = static_dir
+    user_settings["catalog"]["path"] = os.path.join(work_dir, "catalog.db")
+    user_settings["schedule"]["countdown_warning"] = 0
+
+    user_file = os.path.join(work_dir, "user_settings.yml")
+    with open(user_file, "w") as file:
+        yaml.dump(user_settings, file)
+
+    os.makedirs(static_dir)
+    SettingsManager(user_settings_file=user_file)
+    return work_dir
+
+
+def pytest_sessionfinish(session, exitstatus):
+    for work_dir in _work_dirs:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def configure():
+    """
+    Override settings for one test, e.g. ``configure("backup", deduplicate=False)``
+
+    Shared objects built from changed sections are rebuilt, and everything is put
+    back afterwards.
+    """
+
+    from rex.settings.manager import SettingsManager
+    from rex.app.main import _reset_shared
+
+    settings = SettingsManager()
+    saved = []
+
+    def override(section: str, **values):
+        for key, value in values.items():
+            saved.append((section, key, settings[section][key]))
+            settings[section][key] = value
+        _reset_shared({section})
+
+    yield override
+
+    for section, key, value in reversed(saved):
+        settings[section][key] = value
+    _reset_shared({x[0] for x in saved})
+
+
+@pytest.fixture
+def catalog(configure, tmp_path):
+    """A fresh, empty catalog for one test"""
+
+    from rex.app.main import get_catalog
+
+    configure("catalog", path=str(tmp_path / "catalog.db"))
+    return get_catalog()
@@ -0,0 +1,20 @@
+"""
+Shared setup for the test suite
+
+Like the benchmarks, everything runs against a ``FakeResolve`` with a throwaway
+static dir, catalog and settings file. See ``rex.testing``.
+
+Usage:
+    pytest tests/
+"""
+
+# Fixtures and hooks, used by name
+from rex.testing import (  # noqa: F401
+    catalog,
+    configure,
+    isolate_settings,
+    pytest_sessionfinish,
+)
+
+# Before anything imports the settings, which are loaded once per process
+WORK_DIR = isolate_settings("rex-test-", "projects=2,size_mb=1")
@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+from rex.app.activity import ActivityMonitor
+
+
+def _process(pid: int, read_bytes: int):
+    return SimpleNamespace(
+        pid=pid, io_counters=lambda: SimpleNamespace(read_bytes=read_bytes)
+    )
+
+
+def test_a_restarted_resolve_starts_a_new_read_rate():
+
+    monitor = ActivityMonitor()
+    mb = 1024**2
+
+    assert monitor._read_rate(_process(100, 500 * mb), 0) == 0.0
+    assert monitor._read_rate(_process(100, 510 * mb), 2) == 5.0
+
+    # Counting from zero, not 510 MB less than the last sample
+    assert monitor._read_rate(_process(200, 4 * mb), 4) == 0.0
+    assert monitor._read_rate(_process(200, 8 * mb), 6) == 2.0
@@ -0,0 +1,35 @@
+import threading
+
+import pytest
+
+fastapi = pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+
+from rex.app import api
+from rex.app.cache import metadata_cache
+
+
+@pytest.fixture
+def client():
+    metadata_cache.invalidate()
+    return TestClient(api.app)
+
+
+def test_info_waits_for_a_running_job(client):
+    """The Resolve bridge is only ever driven from one thread at a time"""
+
+    started, release = threading.Event(), threading.Event()
+    job = api.jobs.submit("backup", lambda job: started.set() or release.wait(5))
+    assert started.wait(5)
+
+    responses = []
+    request = threading.Thread(target=lambda: responses.append(client.get("/info")))
+    request.start()
+    request.join(0.3)
+    assert not responses
+
+    release.set()
+    request.join(5)
+    assert responses[0].json()["project_count"] == 2
+    assert job.future.result(5)
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+from rex.app.bulk import BulkBackup
+from rex.app.fake_resolve import FakeResolve
+from rex.app.main import Backup
+
+
+def test_abandoned_export_doesnt_share_a_file_with_its_retry(configure, tmp_path):
+    """A timed out export that finishes late is deleted, and never clobbers the retry"""
+
+    static_dir = tmp_path / "backups"
+    static_dir.mkdir()
+    configure("backup", static_dir=str(static_dir), skip_unchanged=False)
+
+    resolve = FakeResolve(projects=1, size_mb=1)
+    manager = resolve.project_manager
+    export = manager.export_project
+    paths = []
+    late = threading.Event()
+
+    def hang_first(project_name, path, stills_and_luts=True):
+        paths.append(path)
+        if len(paths) == 1:
+            # Outlives the timeout, then writes anyway
+            time.sleep(1)
+            result = export(project_name, path, stills_and_luts)
+            late.set()
+            return result
+        return export(project_name, path, stills_and_luts)
+
+    manager.export_project = hang_first
+
+    report = BulkBackup(resolve=resolve, timeout=0.3, retries=1).run()
+    assert report["succeeded"] == 1
+    assert report["results"][0]["attempts"] == 2
+    assert len(set(paths)) == 2
+
+    assert late.wait(5)
+    time.sleep(0.1)
+    assert not os.path.exists(paths[0])
+    assert len([x for x in os.listdir(static_dir) if x.endswith(".drp")]) == 1
+
+
+def test_projects_with_the_same_name_in_different_folders_are_backed_up(
+    configure, tmp_path
+):
+
+    static_dir = tmp_path / "backups"
+    static_dir.mkdir()
+    configure("backup", static_dir=str(static_dir), skip_unchanged=True)
+
+    # Same name, same content
+    resolve = FakeResolve(projects=1, folders=1, size_mb=1, change_rate=0)
+    manager = resolve.project_manager
+    manager._trees["Local"]["folders"]["Folder 1"]["projects"] = ["Project 1"]
+
+    report = BulkBackup(resolve=resolve).run()
+
+    assert [(x["folder"], x["status"]) for x in report["results"]] == [
+        ("", "backup"),
+        ("Folder 1", "backup"),
+    ]
+
+    # Found from the project manager when it isn't given
+    manager.open_folder("Folder 1")
+    backup = Backup("Project 1", resolve=resolve)
+    assert backup.fingerprint_key == "Local/Folder 1/Project 1"
+    assert manager.current_folder == "Folder 1"
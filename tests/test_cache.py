@@ -0,0 +1,52 @@
+import threading
+import time
+
+import pytest
+
+from rex.app.cache import TTLCache
+
+
+def test_key_locks_are_dropped_once_loaded():
+
+    cache = TTLCache()
+
+    def fail():
+        raise RuntimeError("Resolve isn't running")
+
+    cache.get_or_set("cached", lambda: 1, ttl=60)
+    cache.get_or_set("uncached", lambda: 2, ttl=0)
+    with pytest.raises(RuntimeError):
+        cache.get_or_set("failed", fail, ttl=60)
+
+    assert cache._key_locks == {}
+
+
+def test_concurrent_misses_make_one_call():
+
+    cache = TTLCache()
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "projects"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_set("projects", load, ttl=60))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    while not calls:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == ["projects"] * 4
+    assert cache._key_locks == {}
@@ -0,0 +1,38 @@
+import threading
+import time
+
+from rex.app.jobs import Job, JobQueue, call_resolve
+
+
+def test_a_job_cancelled_as_it_starts_still_finishes():
+    """Cancelled too late for its future, so it's the worker that has to finish it"""
+
+    queue = JobQueue()
+    job = Job("export", {})
+    job.cancel_event.set()
+
+    ran = []
+    queue._run(job, ran.append)
+
+    assert not ran
+    assert job.done and job.state == "cancelled"
+    assert job.finished_at is not None
+    assert job.events[-1]["state"] == "cancelled"
+
+
+def test_resolve_calls_wait_for_a_running_job():
+
+    queue = JobQueue()
+    started, release = threading.Event(), threading.Event()
+    queue.submit("backup", lambda job: started.set() or release.wait(5))
+    assert started.wait(5)
+
+    calls = []
+    caller = threading.Thread(target=lambda: calls.append(call_resolve(time.time)))
+    caller.start()
+    caller.join(0.3)
+    assert not calls
+
+    release.set()
+    caller.join(5)
+    assert calls
@@ -0,0 +1,39 @@
+from rex.app.fake_resolve import FakeResolve
+from rex.app.planner import DatabasePlanner
+
+
+def test_unreachable_database_doesnt_stall_the_cycle(configure, catalog):
+    """A database Resolve can't switch to is given up on, not visited forever"""
+
+    configure("backup", skip_unchanged=False)
+    resolve = FakeResolve(databases=3, projects=2, size_mb=1)
+    manager = resolve.project_manager
+
+    set_db = manager.set_db
+    manager.set_db = lambda db_info: db_info["DbName"] != "Local 2" and set_db(db_info)
+
+    for run in range(3):
+        report = DatabasePlanner(resolve=resolve).run()
+
+        visited = {x["database"]: x for x in report["databases"]}
+        assert set(visited) == {"Local", "Local 2", "Local 3"}, f"run {run}"
+        assert visited["Local 2"]["error"]
+        assert report["succeeded"] == 4
+        assert report["remaining"] == []
+
+    cycles = catalog.database_cycles()
+    assert cycles["Local 2"]["error"]
+    assert cycles["Local"]["error"] is None
+
+
+def test_interrupted_cycle_resumes(configure, catalog):
+
+    configure("backup", skip_unchanged=False)
+    resolve = FakeResolve(databases=2, projects=2, size_mb=1)
+    planner = DatabasePlanner(resolve=resolve)
+
+    planner.plan()
+    catalog.finish_database_cycle("Local")
+
+    report = DatabasePlanner(resolve=resolve).run()
+    assert [x["database"] for x in report["databases"]] == ["Local 2"]
@@ -0,0 +1,120 @@
+import os
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from rex.app import store
+from rex.app.fake_resolve import FakeResolve
+from rex.app.hashing import MultiHasher
+from rex.app.main import Backup
+from rex.app.restore import find_backup, restore, restored_name, stage
+from rex.exceptions import RestoreError
+
+
+@pytest.fixture
+def staging(configure, tmp_path):
+    staging_dir = tmp_path / "staging"
+    configure("restore", staging_dir=str(staging_dir), keep_staged=False)
+    return staging_dir
+
+
+def _manifest_backup(catalog, tmp_path, name: str, data: bytes, day: int):
+
+    source = tmp_path / "exports" / name
+    source.parent.mkdir(exist_ok=True)
+    source.write_bytes(data)
+
+    chunk_store = store.ChunkStore(str(tmp_path / store.CHUNKS_DIR), 16 * 1024)
+    manifest = str(tmp_path / f"{name}.manifest")
+    hasher = MultiHasher(["blake2b"])
+    chunk_store.ingest(str(source), manifest, hasher)
+
+    backup_id = catalog.add_backup(
+        "Local",
+        "project",
+        name,
+        manifest,
+        "manifest",
+        digests=hasher.hexdigests(),
+        created_at=datetime(2024, 1, day).timestamp(),
+    )
+    return backup_id, manifest, chunk_store
+
+
+def test_a_checksum_mismatch_aborts_staging(catalog, tmp_path, staging):
+
+    path = tmp_path / "project.drp"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("project.xml", "<Project/>")
+    backup_id = catalog.add_backup(
+        "Local",
+        "project",
+        "project.drp",
+        str(path),
+        "drp",
+        digests={"blake2b": "0" * 64},
+    )
+
+    with pytest.raises(RestoreError, match="checksums"):
+        stage(catalog.get(backup_id))
+
+    assert catalog.get(backup_id)["verify_state"] == "corrupt"
+    assert list(staging.iterdir()) == []
+
+
+def test_a_missing_chunk_falls_back_to_the_previous_backup(catalog, tmp_path, staging):
+
+    old_id, _, _ = _manifest_backup(catalog, tmp_path, "old.drp", b"old" * 50000, 1)
+    new_id, new, chunk_store = _manifest_backup(
+        catalog, tmp_path, "new.drp", os.urandom(200000), 2
+    )
+    digest = store.load_manifest(new)["chunks"][-1][0]
+    os.remove(chunk_store.chunk_path(digest))
+
+    with pytest.raises(RestoreError, match="missing"):
+        stage(find_backup("project"))
+
+    assert catalog.get(new_id)["verify_state"] == "missing"
+    assert list(staging.iterdir()) == []
+
+    backup = find_backup("project")
+    assert backup["id"] == old_id
+    with open(stage(backup)["path"], "rb") as file:
+        assert file.read() == b"old" * 50000
+
+
+def test_restored_names_never_collide():
+
+    backup = {"created_at": datetime(2024, 1, 2, 3, 4, 5).timestamp()}
+    name = "Edit (restored 2024-01-02 03.04.05)"
+
+    assert restored_name("Edit", backup, ["Edit"]) == name
+    assert restored_name("Edit", backup, ["Edit", name]) == f"{name} 2"
+    assert restored_name("Edit", backup, [name, f"{name} 2"]) == f"{name} 3"
+
+
+@pytest.mark.parametrize("deduplicate", [False, True])
+def test_restore_round_trip(catalog, configure, tmp_path, staging, deduplicate):
+
+    static_dir = tmp_path / "backups"
+    static_dir.mkdir()
+    configure("backup", static_dir=str(static_dir), deduplicate=deduplicate)
+
+    resolve = FakeResolve(projects=1, size_mb=1, change_rate=0)
+    project_manager = resolve.project_manager
+    assert Backup("Project 1", resolve=resolve).run()
+
+    first = restore(resolve, "Project 1")
+    second = restore(resolve, "Project 1")
+
+    assert first["verified"] and first["bytes"] > 0
+    assert first["imported_as"].startswith("Project 1 (restored ")
+    assert second["imported_as"] == f"{first['imported_as']} 2"
+    assert project_manager.projects == [
+        "Project 1",
+        first["imported_as"],
+        second["imported_as"],
+    ]
+    # Not kept once imported
+    assert list(staging.iterdir()) == []
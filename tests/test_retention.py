@@ -0,0 +1,167 @@
+import os
+import random
+from datetime import datetime
+
+import pytest
+
+from rex.app import store
+from rex.app.retention import Pruner, select_keep
+
+NOTHING = {"keep_last": 0, "hourly": 0, "daily": 0, "weekly": 0, "monthly": 0}
+
+
+def _backups(*times, verified=()) -> list:
+    """Backups at these local times, newest first as the catalog gives them"""
+
+    backups = [
+        {
+            "id": i,
+            "created_at": datetime(*x).timestamp(),
+            "verify_state": "ok" if i in verified else "unverified",
+        }
+        for i, x in enumerate(times)
+    ]
+    return sorted(backups, key=lambda x: x["created_at"], reverse=True)
+
+
+@pytest.mark.parametrize(
+    "tier, times",
+    [
+        # Either side of midnight
+        ("daily", [(2024, 1, 2, 0, 0), (2024, 1, 1, 23, 59), (2024, 1, 1, 9, 0)]),
+        # Monday, then the Sunday ending the ISO week before
+        ("weekly", [(2024, 1, 8, 0, 0), (2024, 1, 7, 23, 59), (2024, 1, 1, 0, 0)]),
+        ("monthly", [(2024, 2, 1, 0, 0), (2024, 1, 31, 23, 59), (2024, 1, 1, 0, 0)]),
+    ],
+)
+def test_each_tier_keeps_the_latest_backup_per_period(tier, times):
+
+    backups = _backups(*times)
+
+    assert select_keep(backups, {**NOTHING, tier: 1}) == {0}
+    # The second period's latest, not its first
+    assert select_keep(backups, {**NOTHING, tier: 2}) == {0, 1}
+    assert select_keep(backups, {**NOTHING, tier: 5}) == {0, 1}
+
+
+def test_tiers_and_keep_last_add_up():
+
+    backups = _backups(
+        (2024, 3, 10, 12, 0),
+        (2024, 3, 10, 11, 0),
+        (2024, 3, 9, 12, 0),
+        (2024, 3, 1, 12, 0),
+        (2024, 2, 15, 12, 0),
+        (2024, 1, 15, 12, 0),
+    )
+    policy = {**NOTHING, "keep_last": 2, "daily": 2, "monthly": 3}
+
+    # Last two, the 9th's for daily, then February and January for monthly
+    assert select_keep(backups, policy) == {0, 1, 2, 4, 5}
+
+
+def test_the_latest_verified_backup_is_always_kept():
+
+    backups = _backups(
+        (2024, 3, 3), (2024, 3, 2), (2024, 3, 1), (2024, 2, 1), verified={2, 3}
+    )
+
+    assert select_keep(backups, {**NOTHING, "keep_last": 1}) == {0, 2}
+    assert select_keep(_backups((2024, 3, 3), (2024, 3, 2)), NOTHING) == set()
+
+
+def _manifest_backup(catalog, tmp_path, name: str, data: bytes, day: int, **kwargs):
+    """A de-duplicated backup made on a day of January 2024"""
+
+    source = tmp_path / "exports" / name
+    source.parent.mkdir(exist_ok=True)
+    source.write_bytes(data)
+
+    chunk_store = store.ChunkStore(str(tmp_path / store.CHUNKS_DIR), 16 * 1024)
+    manifest = str(tmp_path / f"{name}.manifest")
+    chunk_store.ingest(str(source), manifest)
+
+    chunks = {x for x, _ in store.load_manifest(manifest)["chunks"]}
+    backup_id = catalog.add_backup(
+        "Local",
+        "project",
+        name,
+        manifest,
+        "manifest",
+        created_at=datetime(2024, 1, day).timestamp(),
+        **kwargs,
+    )
+    return backup_id, manifest, chunks, chunk_store
+
+
+@pytest.fixture
+def keep_one(configure):
+    configure("retention", projects=[], **{**NOTHING, "keep_last": 1})
+
+
+def test_chunks_shared_with_a_kept_backup_survive(catalog, tmp_path, keep_one):
+
+    data = random.Random(0).randbytes(256 * 1024)
+    old_id, old, old_chunks, chunk_store = _manifest_backup(
+        catalog, tmp_path, "old.drp", data, 1
+    )
+    new_id, new, new_chunks, _ = _manifest_backup(
+        catalog, tmp_path, "new.drp", data + b"changed", 2
+    )
+    for backup_id, chunks in ((old_id, old_chunks), (new_id, new_chunks)):
+        catalog.add_chunk_refs(backup_id, chunks)
+
+    only_old = old_chunks - new_chunks
+    assert only_old and old_chunks & new_chunks
+
+    report = Pruner().run(max_seconds=60)
+
+    assert report["pruned"] == 1 and report["chunks_deleted"] == len(only_old)
+    assert [x["id"] for x in report["backups"]] == [old_id]
+    assert not os.path.exists(old)
+    assert catalog.get(old_id) is None
+
+    assert not any(os.path.exists(chunk_store.chunk_path(x)) for x in only_old)
+    restored = tmp_path / "restored.drp"
+    chunk_store.restore(new, str(restored))
+    assert restored.read_bytes() == data + b"changed"
+
+
+def test_orphans_of_backups_catalogued_without_chunk_refs_are_removed(
+    catalog, tmp_path, keep_one
+):
+
+    # No chunk references recorded, as for backups from before they were
+    _, _, old_chunks, chunk_store = _manifest_backup(
+        catalog, tmp_path, "old.drp", b"old" * 50000, 1
+    )
+    _, _, new_chunks, _ = _manifest_backup(
+        catalog, tmp_path, "new.drp", b"new" * 50000, 2
+    )
+    assert not old_chunks & new_chunks
+
+    report = Pruner().run(max_seconds=60)
+
+    assert report["chunks_deleted"] == len(old_chunks)
+    assert not any(os.path.exists(chunk_store.chunk_path(x)) for x in old_chunks)
+    assert all(os.path.exists(chunk_store.chunk_path(x)) for x in new_chunks)
+
+
+def test_a_dry_run_deletes_nothing(catalog, tmp_path, keep_one):
+
+    backups = [
+        _manifest_backup(catalog, tmp_path, f"{day}.drp", bytes([day]) * 50000, day)
+        for day in (1, 2, 3)
+    ]
+    for backup_id, _, chunks, _ in backups:
+        catalog.add_chunk_refs(backup_id, chunks)
+    files = sorted(str(x) for x in tmp_path.rglob("*") if x.is_file())
+
+    planned = Pruner(dry_run=True).plan()
+    report = Pruner(dry_run=True).run(max_seconds=60)
+
+    assert [x["id"] for x in planned] == [backups[0][0], backups[1][0]]
+    assert report["planned"] == 2 and report["pruned"] == 0
+    assert [x["id"] for x in report["backups"]] == [x["id"] for x in planned]
+    assert sorted(str(x) for x in tmp_path.rglob("*") if x.is_file()) == files
+    assert all(catalog.get(x[0]) for x in backups)
@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from rex.app import schedules
+from rex.app.schedules import CronSchedule, IntervalSchedule, Scheduler
+
+
+def _next(expression: str, *after) -> datetime:
+    return CronSchedule(expression).next_after(datetime(*after))
+
+
+def test_ranges_steps_and_lists():
+
+    assert CronSchedule("0,30 9-17/4 * * *").hours == [9, 13, 17]
+    assert CronSchedule("5/20 * * * *").minutes == [5, 25, 45]
+    assert CronSchedule("1-3,10 * * * *").minutes == [1, 2, 3, 10]
+
+    assert _next("0,30 9-17/4 * * *", 2024, 1, 1, 8, 59) == datetime(2024, 1, 1, 9, 0)
+    assert _next("0,30 9-17/4 * * *", 2024, 1, 1, 9, 0) == datetime(2024, 1, 1, 9, 30)
+    assert _next("0,30 9-17/4 * * *", 2024, 1, 1, 9, 30) == datetime(2024, 1, 1, 13)
+    assert _next("0,30 9-17/4 * * *", 2024, 1, 1, 17, 30) == datetime(2024, 1, 2, 9)
+
+    assert _next("*/15 * * * *", 2024, 1, 1, 10, 7) == datetime(2024, 1, 1, 10, 15)
+    assert _next("*/15 * * * *", 2024, 1, 1, 10, 45) == datetime(2024, 1, 1, 11, 0)
+    # Seconds into the minute it's due still mean the next one
+    assert _next("*/15 * * * *", 2024, 1, 1, 10, 15, 30) == datetime(2024, 1, 1, 10, 30)
+
+
+def test_either_day_field_matches_when_both_are_restricted():
+
+    # The 13th, or any Friday. October 2024's Fridays are the 4th, 11th, 18th and 25th.
+    assert _next("0 0 13 * 5", 2024, 10, 1) == datetime(2024, 10, 4)
+    assert _next("0 0 13 * 5", 2024, 10, 11) == datetime(2024, 10, 13)
+    assert _next("0 0 13 * 5", 2024, 10, 13) == datetime(2024, 10, 18)
+
+    # Just the one when the other's "*"
+    assert _next("0 0 13 * *", 2024, 10, 1) == datetime(2024, 10, 13)
+    assert _next("0 0 * * 5", 2024, 10, 11) == datetime(2024, 10, 18)
+
+    # Sunday is 0 or 7
+    assert _next("0 0 * * 7", 2024, 10, 1) == _next("0 0 * * 0", 2024, 10, 1)
+    assert _next("0 0 * * 7", 2024, 10, 1) == datetime(2024, 10, 6)
+
+
+def test_month_and_year_rollover():
+
+    # February and April have no 31st
+    assert _next("0 0 31 * *", 2024, 1, 31) == datetime(2024, 3, 31)
+    assert _next("0 0 31 * *", 2024, 3, 31) == datetime(2024, 5, 31)
+
+    assert _next("30 23 * * *", 2024, 12, 31, 23, 45) == datetime(2025, 1, 1, 23, 30)
+    assert _next("0 0 1 1 *", 2024, 6, 1) == datetime(2025, 1, 1)
+    assert _next("0 0 29 2 *", 2024, 3, 1) == datetime(2028, 2, 29)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "* * * *",
+        "60 * * * *",
+        "* 24 * * *",
+        "* * 0 * *",
+        "* * * 13 *",
+        "* * * * 8",
+        "5-1 * * * *",
+        "*/0 * * * *",
+        "a * * * *",
+        "1-2-3 * * * *",
+    ],
+)
+def test_invalid_fields_raise(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_an_expression_that_never_matches_raises():
+    with pytest.raises(ValueError, match="never matches"):
+        _next("0 0 30 2 *", 2024, 1, 1)
+
+
+def test_a_late_tick_doesnt_push_later_runs_back(monkeypatch):
+
+    clock = [datetime(2024, 1, 1, 12, 0)]
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock[0]
+
+    monkeypatch.setattr(schedules, "datetime", FakeDatetime)
+
+    scheduler = Scheduler()
+    runs = []
+    # How late the wake-up for each run is, by run number
+    late = {0: timedelta(minutes=3), 3: timedelta(minutes=25)}
+
+    async def sleep(seconds: float):
+        clock[0] += timedelta(seconds=seconds)
+        if clock[0] >= min(x.next_run for x in scheduler.entries):
+            clock[0] += late.pop(len(runs), timedelta(0))
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(scheduler, "_sleep", sleep)
+
+    async def main():
+
+        task = asyncio.current_task()
+
+        async def tick():
+            runs.append(clock[0])
+            if len(runs) == 5:
+                task.cancel()
+
+        scheduler.add("tick", IntervalSchedule(10), tick)
+        with pytest.raises(asyncio.CancelledError):
+            await scheduler.run()
+
+    asyncio.run(asyncio.wait_for(main(), 10))
+
+    assert runs == [
+        datetime(2024, 1, 1, 12, 13),
+        # Still on the 10 minute grid
+        datetime(2024, 1, 1, 12, 20),
+        datetime(2024, 1, 1, 12, 30),
+        # Overslept past 12:40 and 12:50, which aren't replayed
+        datetime(2024, 1, 1, 13, 5),
+        datetime(2024, 1, 1, 13, 15),
+    ]
@@ -0,0 +1,36 @@
+import json
+
+from rex.app import scheduler
+from rex.settings.manager import SettingsManager
+
+
+def test_a_snapshot_isnt_used_once_a_path_in_it_is_gone(tmp_path, monkeypatch):
+
+    settings = SettingsManager()
+    monkeypatch.setattr(settings, "user_settings", settings.user_settings)
+    monkeypatch.setattr(settings, "snapshot_file", str(tmp_path / "snapshot.json"))
+    monkeypatch.setattr(settings, "_key", "key")
+
+    static_dir = tmp_path / "backups"
+    snapshot = {
+        "app": {"logfile_path": str(tmp_path)},
+        "backup": {"static_dir": str(static_dir)},
+    }
+    with open(settings.snapshot_file, "w") as file:
+        json.dump({"key": "key", "settings": snapshot}, file)
+
+    assert not settings._load_snapshot()
+    static_dir.mkdir()
+    assert settings._load_snapshot()
+
+
+def test_only_timer_changes_rebuild_the_scheduler(configure):
+
+    timers = scheduler.timer_settings()
+
+    configure("upload", rate_limit_mb_per_sec=5, workers=2)
+    configure("verify", workers=3)
+    assert scheduler.timer_settings() == timers
+
+    configure("upload", cron="0 4 * * *")
+    assert scheduler.timer_settings() != timers
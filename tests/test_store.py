@@ -0,0 +1,35 @@
+import io
+import random
+
+import pytest
+
+from rex.app import store
+
+
+@pytest.mark.skipif(store.numpy is None, reason="numpy isn't installed")
+@pytest.mark.parametrize("avg_size", [256, 4096, 64 * 1024])
+def test_vectorised_chunking_cuts_in_the_same_places(monkeypatch, avg_size):
+    """Chunk boundaries must never change, or new backups stop sharing old chunks"""
+
+    rng = random.Random(avg_size)
+    data = (
+        bytes(rng.getrandbits(8) for _ in range(1024**2))
+        + bytes(300000)
+        + b"ab" * 100000
+    )
+    chunker = store.Chunker(avg_size)
+
+    vectorised = list(chunker.chunks(io.BytesIO(data), read_size=256 * 1024))
+    monkeypatch.setattr(store, "numpy", None)
+    rolled = list(chunker.chunks(io.BytesIO(data), read_size=256 * 1024))
+
+    assert vectorised == rolled
+    assert b"".join(vectorised) == data
+
+
+def test_put_reports_nothing_written_for_a_stored_chunk(tmp_path):
+
+    chunk_store = store.ChunkStore(str(tmp_path))
+    digest, written = chunk_store.put(b"chunk")
+    assert written == 5
+    assert chunk_store.put(b"chunk") == (digest, 0)
@@ -0,0 +1,54 @@
+import threading
+import zipfile
+
+from fastapi.testclient import TestClient
+
+from rex.app import api
+
+PROJECT_XML = """<?xml version="1.0"?>
+<Project>
+  <SeqContainer><Name>Edit</Name><Sm2TiTrack><Clip/><Clip/></Sm2TiTrack></SeqContainer>
+  <SmTimeline Name="Edit"><VideoClip/><VideoClip/></SmTimeline>
+</Project>
+"""
+
+
+def _drp_backup(catalog, tmp_path, name: str) -> int:
+
+    path = tmp_path / name
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("project.xml", PROJECT_XML)
+    return catalog.add_backup("Local", "project", name, str(path), "drp")
+
+
+def test_indexing_runs_as_a_cancellable_job(catalog, tmp_path):
+
+    first = _drp_backup(catalog, tmp_path, "project_0.drp")
+    _drp_backup(catalog, tmp_path, "project_1.drp")
+
+    client = TestClient(api.app)
+    response = client.post("/jobs", json={"kind": "index_timelines"})
+    assert response.status_code == 202
+
+    job = api.jobs.get(response.json()["id"])
+    job.future.result(30)
+
+    assert job.state == "succeeded", job.error
+    assert job.result["indexed"] == 2 and job.result["remaining"] == 0
+    assert [x["error"] for x in job.events if x["type"] == "index"] == [None, None]
+    assert (
+        api.timelines.find_timeline("Edit", exact=True)[0]["first_seen"]["backup_id"]
+        == first
+    )
+
+
+def test_a_cancelled_index_starts_nothing_more(catalog, tmp_path):
+
+    for i in range(3):
+        _drp_backup(catalog, tmp_path, f"project_{i}.drp")
+
+    cancel_event = threading.Event()
+    cancel_event.set()
+    report = api.timelines.backfill(cancel_event=cancel_event)
+
+    assert report["indexed"] == 0 and report["remaining"] == 3
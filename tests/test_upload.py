@@ -0,0 +1,166 @@
+import os
+import random
+import threading
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from rex.app import store
+from rex.app.compression import DICTIONARIES_DIR
+from rex.app.upload import Uploader, _ThrottledBody
+
+
+@pytest.fixture
+def s3():
+    """A local stand-in for S3, with one empty bucket"""
+
+    with moto.mock_aws():
+        client = boto3.client(
+            "s3",
+            region_name="us-east-1",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        client.create_bucket(Bucket="rex")
+        yield client
+
+
+def _add_manifest_backup(catalog, tmp_path, name: str, data: bytes) -> set:
+
+    source = tmp_path / "exports" / name
+    source.parent.mkdir(exist_ok=True)
+    source.write_bytes(data)
+
+    chunk_store = store.ChunkStore(str(tmp_path / store.CHUNKS_DIR), 16 * 1024)
+    manifest = str(tmp_path / f"{name}.manifest")
+    chunk_store.ingest(str(source), manifest)
+
+    chunks = {x for x, _ in store.load_manifest(manifest)["chunks"]}
+    catalog.add_backup("Local", "project", name, manifest, "manifest", chunks=chunks)
+    return chunks
+
+
+def test_uploaded_chunks_are_never_looked_up_again(catalog, tmp_path, s3):
+
+    data = random.Random(0).randbytes(256 * 1024)
+    chunks = _add_manifest_backup(catalog, tmp_path, "project_0.drp", data)
+
+    report = Uploader(client=s3, bucket="rex", prefix="backups", rate_limit_mb=0).run()
+    assert report["uploaded"] == 1
+    listed = s3.list_objects_v2(Bucket="rex", Prefix=f"backups/{store.CHUNKS_DIR}/")
+    assert len(listed["Contents"]) == len(chunks)
+
+    # The next backup shares every chunk but one
+    _add_manifest_backup(catalog, tmp_path, "project_1.drp", data + b"new")
+
+    heads = []
+    head_object = s3.head_object
+
+    def counting(**kwargs):
+        heads.append(kwargs["Key"])
+        return head_object(**kwargs)
+
+    s3.head_object = counting
+    report = Uploader(client=s3, bucket="rex", prefix="backups", rate_limit_mb=0).run()
+
+    assert report["uploaded"] == 1
+    assert report["skipped_objects"] >= len(chunks) - 1
+    assert len([x for x in heads if f"/{store.CHUNKS_DIR}/" in x]) <= 2
+
+
+def test_a_multipart_upload_from_a_worker_doesnt_deadlock(catalog, tmp_path, s3):
+    """With one worker busy uploading a big file, its parts still need somewhere to run"""
+
+    _add_manifest_backup(catalog, tmp_path, "project_0.drp", b"project")
+
+    # Big enough to go up in parts, from a pool worker
+    dictionaries = tmp_path / DICTIONARIES_DIR
+    dictionaries.mkdir()
+    (dictionaries / "Local.1.zdict").write_bytes(os.urandom(11 * 1024 * 1024))
+
+    uploader = Uploader(
+        client=s3, bucket="rex", prefix="backups", workers=1, rate_limit_mb=0
+    )
+    uploader.part_size = 5 * 1024 * 1024
+
+    reports = []
+    thread = threading.Thread(target=lambda: reports.append(uploader.run()))
+    thread.daemon = True
+    thread.start()
+    thread.join(60)
+
+    assert not thread.is_alive(), "Upload deadlocked"
+    assert reports[0]["uploaded"] == 1
+    head = s3.head_object(Bucket="rex", Key=f"backups/{DICTIONARIES_DIR}/Local.1.zdict")
+    assert head["ContentLength"] == 11 * 1024 * 1024
+
+
+def test_uploads_run_as_a_job_alongside_backups(catalog, configure, tmp_path, s3):
+
+    from fastapi.testclient import TestClient
+    from rex.app import api
+
+    configure("upload", bucket="rex", region="us-east-1", rate_limit_mb_per_sec=0)
+    _add_manifest_backup(catalog, tmp_path, "project_0.drp", b"project")
+
+    # A backup holding the Resolve bridge
+    release = threading.Event()
+    backup = api.jobs.submit("backup", lambda job: release.wait(10))
+
+    client = TestClient(api.app)
+    response = client.post("/jobs", json={"kind": "upload"})
+    assert response.status_code == 202
+
+    job = api.jobs.get(response.json()["id"])
+    job.future.result(30)
+    release.set()
+    backup.future.result(10)
+
+    assert job.state == "succeeded", job.error
+    assert job.result["uploaded"] == 1
+    uploads = [x for x in job.events if x["type"] == "upload"]
+    assert len(uploads) == 1 and uploads[0]["error"] is None
+
+
+def test_reread_part_bytes_arent_charged_again():
+
+    charged = []
+
+    class Bucket:
+        def consume(self, amount):
+            charged.append(amount)
+
+    body = _ThrottledBody(b"x" * 1000, Bucket())
+    body.read(600)
+    # Checksummed, then retried from the start
+    body.seek(0)
+    body.read()
+    body.seek(0)
+    body.read(300)
+    body.read()
+
+    assert sum(charged) == 1000
+
+
+def test_dictionaries_are_looked_up_once_a_run(catalog, tmp_path, s3):
+
+    for i in range(3):
+        _add_manifest_backup(catalog, tmp_path, f"project_{i}.drp", b"project %d" % i)
+    dictionaries = tmp_path / DICTIONARIES_DIR
+    dictionaries.mkdir()
+    (dictionaries / "Local.1.zdict").write_bytes(b"dictionary")
+
+    heads = []
+    head_object = s3.head_object
+
+    def counting(**kwargs):
+        heads.append(kwargs["Key"])
+        return head_object(**kwargs)
+
+    s3.head_object = counting
+    report = Uploader(client=s3, bucket="rex", prefix="backups", rate_limit_mb=0).run()
+
+    assert report["uploaded"] == 3
+    assert heads.count(f"backups/{DICTIONARIES_DIR}/Local.1.zdict") == 1
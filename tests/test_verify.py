@@ -0,0 +1,115 @@
+import os
+import random
+import threading
+
+from rex.app import store
+from rex.app.verify import Verifier
+
+
+def _manifest_backups(catalog, tmp_path, count=3):
+    """``count`` de-duplicated backups of the same file, sharing all their chunks"""
+
+    data = random.Random(0).randbytes(512 * 1024)
+    source = tmp_path / "project.drp"
+    source.write_bytes(data)
+
+    chunk_store = store.ChunkStore(str(tmp_path / store.CHUNKS_DIR), 16 * 1024)
+    for i in range(count):
+        manifest = str(tmp_path / f"project_{i}.drp.manifest")
+        chunk_store.ingest(str(source), manifest)
+        catalog.add_backup("Local", "project", f"project_{i}.drp", manifest, "manifest")
+
+    return chunk_store
+
+
+def test_shared_chunks_are_read_once_per_sweep(catalog, tmp_path, monkeypatch):
+
+    chunk_store = _manifest_backups(catalog, tmp_path)
+    stored = sum(len(files) for _, _, files in os.walk(chunk_store.root))
+
+    checked = []
+    check_chunk = store.ChunkStore.check_chunk
+
+    def counting(self, digest):
+        checked.append(digest)
+        return check_chunk(self, digest)
+
+    monkeypatch.setattr(store.ChunkStore, "check_chunk", counting)
+
+    report = Verifier(workers=3, rate_limit_mb=0).run(max_seconds=60)
+    assert report["checked"] == 3
+    assert report["ok"] == 3
+    assert len(checked) == len(set(checked)) == stored
+
+
+def test_a_corrupt_chunk_fails_every_backup_using_it(catalog, tmp_path):
+
+    chunk_store = _manifest_backups(catalog, tmp_path)
+    manifest = store.load_manifest(str(tmp_path / "project_0.drp.manifest"))
+    digest = manifest["chunks"][0][0]
+    with open(chunk_store.chunk_path(digest), "r+b") as file:
+        file.write(b"x")
+
+    report = Verifier(workers=3, rate_limit_mb=0).run(max_seconds=60)
+    assert report["corrupt"] == 3
+    assert all(digest in x["error"] for x in report["problems"])
+
+
+def test_nothing_is_started_after_the_deadline(catalog, tmp_path):
+
+    _manifest_backups(catalog, tmp_path)
+
+    report = Verifier(workers=1, rate_limit_mb=0).run(max_seconds=0)
+    assert report["checked"] == 0
+    assert len(catalog.verification_queue(0)) == 3
+
+
+def test_a_cancelled_sweep_starts_nothing_more(catalog, tmp_path):
+
+    _manifest_backups(catalog, tmp_path)
+
+    cancel_event = threading.Event()
+    events = []
+
+    def progress(**event):
+        events.append(event)
+        cancel_event.set()
+
+    verifier = Verifier(
+        workers=1, rate_limit_mb=0, cancel_event=cancel_event, progress=progress
+    )
+    report = verifier.run(max_seconds=60)
+
+    assert report["checked"] == 1
+    assert [x["type"] for x in events] == ["verify"]
+    assert len(catalog.verification_queue(0)) == 2
+
+
+def test_the_same_chunk_in_another_store_is_checked_on_its_own(catalog, tmp_path):
+
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+    _manifest_backups(catalog, tmp_path / "a", count=1)
+    other = _manifest_backups(catalog, tmp_path / "b", count=1)
+
+    manifest = store.load_manifest(str(tmp_path / "b" / "project_0.drp.manifest"))
+    with open(other.chunk_path(manifest["chunks"][0][0]), "r+b") as file:
+        file.write(b"x")
+
+    report = Verifier(workers=1, rate_limit_mb=0).run(max_seconds=60)
+    assert report["ok"] == 1 and report["corrupt"] == 1
+    assert report["problems"][0]["path"].startswith(str(tmp_path / "b"))
+
+
+def test_chunks_are_read_again_by_the_next_sweep(catalog, configure, tmp_path):
+
+    configure("verify", reverify_after_days=0)
+    chunk_store = _manifest_backups(catalog, tmp_path, count=1)
+    verifier = Verifier(workers=1, rate_limit_mb=0)
+    assert verifier.run(max_seconds=60)["ok"] == 1
+
+    manifest = store.load_manifest(str(tmp_path / "project_0.drp.manifest"))
+    with open(chunk_store.chunk_path(manifest["chunks"][0][0]), "r+b") as file:
+        file.write(b"x")
+
+    assert verifier.run(max_seconds=60)["corrupt"] == 1